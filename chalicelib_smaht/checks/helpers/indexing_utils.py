@@ -0,0 +1,247 @@
+import json
+import re
+from datetime import datetime, timedelta
+
+from dcicutils import es_utils, ff_utils
+
+from .utils import iter_concurrently, DEFAULT_MAX_WORKERS
+
+# Rolling history of item_counts_by_type samples kept by indexing_progress
+HISTORY_WINDOW = timedelta(hours=3)
+MAX_HISTORY_SAMPLES = 36
+# Consecutive latest samples with a zero fitted indexing rate to flag a stall
+STALL_SAMPLES = 3
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+# Seconds to wait on the portal counts endpoint when probing ES directly
+PORTAL_COUNTS_TIMEOUT = 60
+
+
+def parse_timestamp(timestamp):
+    """Parse check uuid timestamps, with or without microseconds."""
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    except ValueError:
+        return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S")
+
+
+def counts_result_to_sample(counts_result):
+    """Make a history sample from an item_counts_by_type result.
+
+    :returns: {"timestamp": ..., "counts": {item type: {"DB": .., "ES": ..}}}
+        or None if the result has no counts
+    """
+    counts = (counts_result or {}).get("full_output")
+    if not isinstance(counts, dict) or "ALL" not in counts:
+        return None
+    return {"timestamp": counts_result["uuid"], "counts": counts}
+
+
+def add_sample(history, sample, window=HISTORY_WINDOW, max_samples=MAX_HISTORY_SAMPLES):
+    """Add a sample to a history, keeping samples sorted by time, unique by
+    timestamp and within the window of the latest one.
+    """
+    samples = {previous["timestamp"]: previous for previous in history}
+    if sample is not None:
+        samples[sample["timestamp"]] = sample
+    ordered = sorted(samples.values(), key=lambda each: parse_timestamp(each["timestamp"]))
+    if not ordered:
+        return []
+    latest_time = parse_timestamp(ordered[-1]["timestamp"])
+    recent = [
+        each for each in ordered
+        if latest_time - parse_timestamp(each["timestamp"]) <= window
+    ]
+    return recent[-max_samples:]
+
+
+def fit_rate(points):
+    """Least-squares slope of (minutes, value) points, or None if there
+    are fewer than two distinct times.
+    """
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def summarize_item_type(history, item_type, stall_samples=STALL_SAMPLES):
+    """Indexing throughput, backlog growth and catch-up ETA for an item
+    type over the history.
+
+    Samples without a DB count (taken while the counts endpoint was
+    slow) count toward throughput but not the backlog.
+
+    :returns: dict with "backlog" (DB - ES count), "throughput" (ES items
+        per minute), "backlog_growth" (per minute), "eta_minutes" (None if
+        the backlog is not shrinking) and "stalled"
+    """
+    start_time = parse_timestamp(history[0]["timestamp"])
+    es_points = []
+    backlog_points = []
+    for sample in history:
+        counts = sample["counts"].get(item_type)
+        if not counts:
+            continue
+        minutes = (parse_timestamp(sample["timestamp"]) - start_time).total_seconds() / 60
+        es_points.append((minutes, counts["ES"]))
+        if counts.get("DB") is not None:
+            backlog_points.append((minutes, counts["DB"] - counts["ES"]))
+    if not backlog_points:
+        return None
+    backlog = backlog_points[-1][1]
+    throughput = fit_rate(es_points)
+    backlog_growth = fit_rate(backlog_points)
+    if backlog <= 0:
+        eta_minutes = 0
+    elif backlog_growth is not None and backlog_growth < 0:
+        eta_minutes = round(backlog / -backlog_growth, 1)
+    else:
+        eta_minutes = None
+    recent_rate = fit_rate(es_points[-stall_samples:]) if len(es_points) >= stall_samples else None
+    return {
+        "backlog": backlog,
+        "throughput": None if throughput is None else round(throughput, 2),
+        "backlog_growth": None if backlog_growth is None else round(backlog_growth, 2),
+        "eta_minutes": eta_minutes,
+        "stalled": backlog > 0 and recent_rate == 0,
+    }
+
+
+def summarize_indexing(history, stall_samples=STALL_SAMPLES):
+    """Summaries by item type (including "ALL") over the history."""
+    item_types = set()
+    for sample in history:
+        item_types.update(sample["counts"])
+    summaries = {}
+    for item_type in sorted(item_types):
+        summary = summarize_item_type(history, item_type, stall_samples=stall_samples)
+        if summary is not None:
+            summaries[item_type] = summary
+    return summaries
+
+
+def process_counts(count_str):
+    """Parse a "DB: <n> ES: <n>" counts endpoint string."""
+    # specifically formatted for FF health page
+    ret = {}
+    split_str = count_str.split()
+    ret[split_str[0].strip(":")] = int(split_str[1])
+    ret[split_str[2].strip(":")] = int(split_str[3])
+    return ret
+
+
+def get_portal_item_counts(connection, timeout=None):
+    """DB and ES counts by item type, with "ALL" totals, from the portal
+    counts endpoint.
+
+    :raises Exception: On a bad status code
+    """
+    req_location = "".join([connection.ff_server, "/counts?format=json"])
+    request_kwargs = {"timeout": timeout} if timeout else {}
+    counts_res = ff_utils.authorized_request(req_location, auth=connection.ff_keys, **request_kwargs)
+    if counts_res.status_code >= 400:
+        raise Exception(
+            "Error (bad status code %s) connecting to the counts endpoint at: %s."
+            % (counts_res.status_code, req_location)
+        )
+    counts_json = json.loads(counts_res.text)
+    item_counts = {
+        index: process_counts(counts) for index, counts in counts_json["db_es_compare"].items()
+    }
+    # add ALL for total counts
+    item_counts["ALL"] = process_counts(counts_json["db_es_total"])
+    return item_counts
+
+
+def to_index_name(namespace, item_type):
+    """ES index of an item type, e.g. FileSet --> <namespace>file_set."""
+    return namespace + re.sub(r"(?<!^)(?=[A-Z])", "_", item_type).lower()
+
+
+def get_es_counts(es_client, namespace, item_types, max_workers=DEFAULT_MAX_WORKERS):
+    """Count documents of each item type's index with concurrent _count
+    requests.
+
+    :raises Exception: If any count fails, including on a missing index
+    """
+    es_counts = {}
+    for item_type, response, error in iter_concurrently(
+        lambda item_type: es_client.count(index=to_index_name(namespace, item_type)),
+        item_types,
+        max_workers=max_workers,
+    ):
+        if error:
+            if getattr(error, "status_code", None) == 404:
+                raise Exception(
+                    "ES index %s of %s is missing" % (to_index_name(namespace, item_type), item_type)
+                )
+            raise error
+        es_counts[item_type] = response.get("count", 0)
+    return es_counts
+
+
+def probe_item_counts(connection, item_types, portal_timeout=PORTAL_COUNTS_TIMEOUT):
+    """DB and ES counts by item type, with "ALL" totals, in the format of
+    get_portal_item_counts.
+
+    ES indices of item_types are counted directly while the portal counts
+    endpoint is queried in parallel. Counts are returned as soon as the
+    portal answers, with ES counts taken from direct counts that finished
+    first. If the portal fails or does not answer within portal_timeout,
+    the direct ES counts are returned with a DB count of None. If ES
+    cannot be counted (e.g. no permission), only the portal is used.
+
+    :returns: (item counts, ES counts by item type or None, error
+        messages by source: "portal" or "es")
+    :raises Exception: If neither the portal nor ES counts are available
+    """
+    if not item_types:
+        return get_portal_item_counts(connection), None, {}
+
+    def probe(source):
+        if source == "portal":
+            return get_portal_item_counts(connection)
+        es_client = es_utils.create_es_client(connection.ff_es, True)
+        return get_es_counts(es_client, connection.ff_env, item_types)
+
+    results = {}
+    errors = {}
+    for source, result, error in iter_concurrently(
+        probe, ["portal", "es"], max_workers=2, task_timeout=portal_timeout
+    ):
+        if error:
+            errors[source] = str(error)
+            continue
+        results[source] = result
+        if source == "portal":
+            break  # ES counts still running are abandoned
+    portal_counts = results.get("portal")
+    es_counts = results.get("es")
+    if portal_counts is None and es_counts is None:
+        raise Exception("Could not get item counts: %s" % errors)
+    if es_counts is None:
+        return portal_counts, None, errors
+    if portal_counts is None:
+        item_counts = {
+            item_type: {"DB": None, "ES": count} for item_type, count in es_counts.items()
+        }
+        item_counts["ALL"] = {"DB": None, "ES": sum(es_counts.values())}
+        return item_counts, es_counts, errors
+    item_counts = {}
+    for item_type in sorted(set(portal_counts) | set(es_counts)):
+        if item_type == "ALL":
+            continue
+        portal_type_counts = portal_counts.get(item_type, {})
+        item_counts[item_type] = {
+            "DB": portal_type_counts.get("DB", 0),
+            "ES": es_counts.get(item_type, portal_type_counts.get("ES", 0)),
+        }
+    item_counts["ALL"] = {
+        "DB": sum(counts["DB"] for counts in item_counts.values()),
+        "ES": sum(counts["ES"] for counts in item_counts.values()),
+    }
+    return item_counts, es_counts, errors
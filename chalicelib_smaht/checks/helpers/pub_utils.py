@@ -0,0 +1,843 @@
+"""Fetching of publication metadata from CrossRef, bioRxiv/medRxiv and
+NCBI E-utilities for prepare_pub_metadata.
+
+All sources of all DOIs are fetched concurrently over one pooled session
+per service, each throttled to the service's published rate limit.
+Responses are kept in a persistent cache in the foursight S3 bucket (or a
+local directory), so re-runs over the same DOIs skip the services.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import boto3
+import requests
+from botocore.exceptions import ClientError
+from requests.adapters import HTTPAdapter
+
+from . import constants
+from .utils import iter_concurrently
+
+# Max requests per second to each service; NCBI allows 3/s without an API key
+SERVICE_RATE_LIMITS = {
+    "crossref": 10,
+    "rxiv": 5,
+    "ncbi": 3,
+}
+REQUEST_TIMEOUT = 10
+# Max concurrent external requests, across all services
+MAX_FETCH_WORKERS = 16
+# Calls per request when throttled (429) or unavailable (503)
+FETCH_ATTEMPTS = 3
+# Longest Retry-After honored; past it the request is given up
+MAX_RETRY_AFTER = 30
+RETRY_STATUS_CODES = (429, 503)
+# DOIs combined into one ESearch term, PMIDs per EFetch
+ESEARCH_BATCH_SIZE = 50
+EFETCH_BATCH_SIZE = 200
+# ESearch retmax per DOI, allowing for errata and comments sharing a DOI
+ESEARCH_RETMAX_PER_DOI = 5
+
+DAY = 24 * 60 * 60
+# Seconds cached responses are used, by source; preprint versions and new
+# PubMed records for DOIs show up sooner than published metadata changes
+SOURCE_TTLS = {
+    "crossref": 7 * DAY,
+    "rxiv": DAY,
+    "pmid": DAY,
+    "pubmed_article": 7 * DAY,
+}
+DEFAULT_TTL = DAY
+# Seconds a miss (no record for the DOI/PMID) is cached
+NEGATIVE_TTL = 6 * 60 * 60
+MAX_CACHE_BYTES = 50 * 1024 * 1024
+CACHE_PREFIX = "pub_metadata_cache/"
+INDEX_NAME = "index.json"
+# Directory for the response cache when running locally instead of against S3
+LOCAL_CACHE_DIR_ENV = "FOURSIGHT_PUB_CACHE_DIR"
+# Records of an input file processed per prepare_pub_metadata run
+RECORD_CHUNK_SIZE = 200
+# Most recent check and action results looked through for an input_file cursor
+CURSOR_LOOKBACK = 100
+
+
+def is_rxiv_doi(doi: str) -> bool:
+    """Check DOI prefix for Rxiv servers."""
+    return any(doi.startswith(prefix) for prefix in constants.RXIV_PREFIXES)
+
+
+def get_retry_after(response: requests.Response, default: float) -> float:
+    """Seconds to wait from a Retry-After header (seconds or HTTP date)."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class ServiceThrottle:
+    """Spaces requests to a service at least 1/rate seconds apart across
+    threads, and holds all of them back after a Retry-After.
+    """
+
+    def __init__(self, rate: float, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / rate
+        self.clock = clock
+        self.sleep = sleep
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until this caller's request slot."""
+        with self._lock:
+            now = self.clock()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            self.sleep(slot - now)
+
+    def defer(self, seconds: float) -> None:
+        """Start no request before seconds from now."""
+        with self._lock:
+            self._next_slot = max(self._next_slot, self.clock() + seconds)
+
+
+class ExternalFetcher:
+    """GETs to external metadata services over pooled keep-alive sessions,
+    throttled per service, retrying 429/503 responses after Retry-After.
+    """
+
+    def __init__(
+        self, rate_limits=None, max_workers=MAX_FETCH_WORKERS, timeout=REQUEST_TIMEOUT,
+        attempts=FETCH_ATTEMPTS, sleep=time.sleep
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.attempts = attempts
+        self.sleep = sleep
+        self.throttles = {
+            service: ServiceThrottle(rate, sleep=sleep)
+            for service, rate in (rate_limits or SERVICE_RATE_LIMITS).items()
+        }
+        self.sessions = {}
+        for service in self.throttles:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self.sessions[service] = session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        for session in self.sessions.values():
+            session.close()
+
+    def get(self, service: str, url: str, **kwargs) -> requests.Response:
+        """GET url from service, waiting for its throttle.
+
+        :raises requests.HTTPError: On a bad status, once retries are spent
+        """
+        throttle = self.throttles[service]
+        for attempt in range(self.attempts):
+            throttle.wait()
+            response = self.sessions[service].get(url, timeout=self.timeout, **kwargs)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.attempts - 1:
+                break
+            delay = get_retry_after(response, default=2 ** attempt)
+            if delay > MAX_RETRY_AFTER:
+                break
+            throttle.defer(delay)
+        response.raise_for_status()
+        return response
+
+
+def is_not_found(error: Exception) -> bool:
+    """Whether a request error is a 404 from the service."""
+    response = getattr(error, "response", None)
+    return isinstance(error, requests.HTTPError) and getattr(response, "status_code", None) == 404
+
+
+def get_pmid_from_doi(doi: str, fetcher: ExternalFetcher) -> Optional[str]:
+    """Look up PMID using DOI; None unless there is exactly one match."""
+    eutil = f"{constants.EUTIL_ESEARCH}db=pubmed&term={doi}[DOI]&retmode=json"
+    pmid = fetcher.get("ncbi", eutil).json().get("esearchresult", {}).get("idlist", [])
+    if pmid and len(pmid) == 1:
+        return pmid[0]
+    return None
+
+
+def get_crossref_metadata(doi: str, fetcher: ExternalFetcher) -> Optional[Dict[str, Any]]:
+    """Retrieve metadata from Crossref using doi; None if not registered."""
+    try:
+        return fetcher.get("crossref", f"{constants.CROSSREF_API}{doi}").json()["message"]
+    except requests.HTTPError as e:
+        if is_not_found(e):
+            return None
+        raise
+
+
+def get_rxiv_metadata(
+    doi: str, fetcher: ExternalFetcher
+) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Retrieve metadata from bioRxiv/medRxiv; (None, None) if not found."""
+    servers = constants.RXIV_PREFIXES.get(doi.split("/")[0], [])
+    for server in servers:
+        try:
+            data = fetcher.get("rxiv", f"{constants.RXIV_API}/{server}/{doi}").json()
+        except requests.HTTPError as e:
+            if is_not_found(e):
+                continue
+            raise
+        if data.get("collection") and len(data["collection"]) > 0:
+            return server, data["collection"][0]
+    return None, None
+
+
+_MONTH_NAMES: Dict[str, str] = {
+    # abbreviated
+    "jan": "01", "feb": "02", "mar": "03", "apr": "04",
+    "may": "05", "jun": "06", "jul": "07", "aug": "08",
+    "sep": "09", "oct": "10", "nov": "11", "dec": "12",
+    # full
+    "january": "01", "february": "02", "march": "03",  "april": "04",
+    "june":    "06", "july":     "07", "august": "08",
+    "september": "09", "october": "10", "november": "11", "december": "12",
+}
+
+
+def _normalize_month(month_str: str) -> Optional[str]:
+    """
+    Convert a month string to a zero-padded two-digit numeric string.
+
+    Accepts:
+        - Numeric strings: "1" -> "01", "12" -> "12"
+        - Abbreviated names: "Jan" -> "01"
+        - Full names: "January" -> "01"
+
+    Returns None if the value cannot be interpreted as a valid month.
+    """
+    if not month_str:
+        return None
+    lower = month_str.lower().strip()
+    if lower in _MONTH_NAMES:
+        return _MONTH_NAMES[lower]
+    try:
+        month_int = int(month_str)
+        if 1 <= month_int <= 12:
+            return str(month_int).zfill(2)
+    except ValueError:
+        pass
+    return None
+
+
+def normalize_date(date_value: Any) -> Optional[str]:
+    """
+    Normalize a date value from any publication source into a
+    standardized string format.
+
+    Returns:
+        'YYYY-MM-DD'  if year, month, and day are all present and valid
+        'YYYY-MM'     if year and month are present and valid
+        'YYYY'        if only year is present and valid
+        None          if the value cannot be interpreted as a date
+
+    Accepts:
+        - ISO-like strings:       "2023-01-15", "2023-1-5"
+        - Month-name strings:     "2023-Jan-15", "2023-January-5"
+        - Partial strings:        "2023-01", "2023-Jan", "2023"
+        - datetime objects
+        - None or empty string    -> None
+
+    Sources and example inputs:
+        CrossRef   : "2023-1-5"     (numeric, may lack zero-padding)
+        PubMed XML : "2023-Jan-05"  (month as 3-letter abbreviation)
+        bioRxiv    : "2023-01-15"   (typically already ISO format)
+    """
+    if date_value is None:
+        return None
+
+    # datetime object — format directly
+    if isinstance(date_value, datetime):
+        return date_value.strftime("%Y-%m-%d")
+
+    if not isinstance(date_value, str):
+        return None
+
+    date_str = date_value.strip()
+    if not date_str:
+        return None
+
+    # Split on hyphens or forward slashes
+    parts = re.split(r"[-/]", date_str)
+
+    # --- Year ---
+    try:
+        year_int = int(parts[0])
+        if not (1000 <= year_int <= 9999):
+            return None
+        year_str = str(year_int)
+    except (ValueError, IndexError):
+        return None
+
+    if len(parts) == 1:
+        return year_str
+
+    # --- Month ---
+    month_str = _normalize_month(parts[1])
+    if not month_str:
+        # month unparseable — return year only rather than malformed string
+        return year_str
+
+    if len(parts) == 2:
+        return f"{year_str}-{month_str}"
+
+    # --- Day ---
+    try:
+        day_int = int(parts[2])
+        if 1 <= day_int <= 31:
+            return f"{year_str}-{month_str}-{str(day_int).zfill(2)}"
+    except (ValueError, IndexError):
+        pass
+
+    # day unparseable — return year-month
+    return f"{year_str}-{month_str}"
+
+
+def parse_pubmed_article(article: ET.Element) -> Dict[str, Any]:
+    """Extract metadata from a PubmedArticle element."""
+    result = {
+        "title": None,
+        "abstract": None,
+        "authors": [],
+        "journal": None,
+        "date_published": None,
+    }
+
+    # Extract title
+    title_elem = article.find(".//ArticleTitle")
+    if title_elem is not None and title_elem.text:
+        result["title"] = title_elem.text
+
+    # Extract abstract
+    abstract_elem = article.find(".//AbstractText")
+    if abstract_elem is not None and abstract_elem.text:
+        result["abstract"] = abstract_elem.text
+
+    # Extract authors
+    authors = []
+    for author in article.findall(".//Author"):
+        last_name = author.find("LastName")
+        fore_name = author.find("ForeName")
+        if last_name is not None and fore_name is not None:
+            authors.append({"first_name": fore_name.text, "last_name": last_name.text})
+        elif last_name is not None:
+            authors.append({"last_name": last_name.text})
+    result["authors"] = authors
+
+    # Extract journal
+    journal_elem = article.find(".//Journal/Title")
+    if journal_elem is not None and journal_elem.text:
+        result["journal"] = journal_elem.text
+
+    # Extract publication date
+    pub_date = article.find(".//PubDate")
+    if pub_date is not None:
+        year = pub_date.find("Year")
+        month = pub_date.find("Month")
+        day = pub_date.find("Day")
+        if year is not None:
+            date_str = year.text
+            if month is not None:
+                date_str += f"-{month.text}"
+            if day is not None:
+                date_str += f"-{day.text}"
+            result["date_published"] = normalize_date(date_str)
+
+    return result
+
+
+def get_article_doi(article: ET.Element) -> Optional[str]:
+    """DOI of a PubmedArticle element, if listed."""
+    for path in (".//ArticleIdList/ArticleId[@IdType='doi']", ".//ELocationID[@EIdType='doi']"):
+        doi_elem = article.find(path)
+        if doi_elem is not None and doi_elem.text:
+            return doi_elem.text.strip()
+    return None
+
+
+def search_pmids(dois: List[str], fetcher: ExternalFetcher) -> List[str]:
+    """PMIDs of articles matching any of the DOIs, from one ESearch."""
+    params = {
+        "db": "pubmed",
+        "term": " OR ".join(f"{doi}[DOI]" for doi in dois),
+        "retmode": "json",
+        "retmax": ESEARCH_RETMAX_PER_DOI * len(dois),
+    }
+    response = fetcher.get("ncbi", constants.EUTIL_ESEARCH, params=params)
+    return response.json().get("esearchresult", {}).get("idlist", [])
+
+
+def iter_pubmed_articles(
+    pmids: List[str], fetcher: ExternalFetcher, batch_size: int = EFETCH_BATCH_SIZE
+) -> Iterator[Tuple[str, Optional[str], Dict[str, Any]]]:
+    """Stream (PMID, DOI, metadata) of PubMed articles, with one EFetch per
+    batch of PMIDs.
+
+    The multi-article XML is parsed incrementally from the response and
+    each article element is cleared once parsed, so memory use does not
+    grow with the number of articles.
+    """
+    for start in range(0, len(pmids), batch_size):
+        params = {"db": "pubmed", "id": ",".join(pmids[start:start + batch_size]), "retmode": "xml"}
+        response = fetcher.get("ncbi", constants.EUTIL_EFETCH, params=params, stream=True)
+        try:
+            response.raw.decode_content = True
+            for _, elem in ET.iterparse(response.raw, events=("end",)):
+                if elem.tag != "PubmedArticle":
+                    continue
+                pmid = elem.findtext("MedlineCitation/PMID")
+                yield pmid, get_article_doi(elem), parse_pubmed_article(elem)
+                elem.clear()
+        finally:
+            response.close()
+
+
+class S3CacheStore:
+    """Cached responses as objects in an S3 bucket."""
+
+    def __init__(self, s3_client, bucket, prefix=CACHE_PREFIX, encryption=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        # KMS key ID to encrypt cached responses with, as foursight's S3Connection does
+        self.encryption = encryption
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.prefix + name)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return response["Body"].read()
+
+    def put(self, name: str, body: bytes) -> None:
+        encryption_args = {}
+        if self.encryption:
+            encryption_args = {"ServerSideEncryption": "aws:kms", "SSEKMSKeyId": self.encryption}
+        self.s3_client.put_object(
+            Bucket=self.bucket, Key=self.prefix + name, Body=body, **encryption_args
+        )
+
+    def delete(self, name: str) -> None:
+        self.s3_client.delete_object(Bucket=self.bucket, Key=self.prefix + name)
+
+
+class LocalCacheStore:
+    """Cached responses as files in a local directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, name: str, body: bytes) -> None:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+
+    def delete(self, name: str) -> None:
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+
+class ResponseCache:
+    """Cache of external metadata responses by source and DOI/PMID, with
+    per-source TTLs, negative entries for misses and LRU eviction past
+    max_bytes.
+
+    An index of entries (size, last access, expiry) is read once and
+    written back by flush(), merged with any index written meanwhile, so
+    lookups of uncached or missing values need no store requests. Store
+    errors are treated as cache misses.
+    """
+
+    def __init__(
+        self, store, ttls=None, negative_ttl=NEGATIVE_TTL, max_bytes=MAX_CACHE_BYTES,
+        clock=time.time
+    ):
+        self.store = store
+        self.ttls = ttls or SOURCE_TTLS
+        self.negative_ttl = negative_ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_name(source: str, key: str) -> str:
+        return f"{source}/{quote(str(key), safe='')}.json"
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            body = self.store.get(INDEX_NAME)
+            return json.loads(body) if body else {}
+        except Exception as e:
+            print(f"Error reading response cache index: {e}")
+            return {}
+
+    @property
+    def index(self) -> Dict[str, Dict[str, Any]]:
+        if self._index is None:
+            self._index = self._read_index()
+        return self._index
+
+    def get(self, source: str, key: str) -> Tuple[bool, Any]:
+        """Get (whether cached, value); value is None for cached misses."""
+        name = self.make_name(source, key)
+        now = self.clock()
+        with self._lock:
+            entry = self.index.get(name)
+            if not entry or entry["expires"] <= now:
+                self.misses += 1
+                return False, None
+            entry["accessed"] = now
+            if entry.get("miss"):
+                self.hits += 1
+                return True, None
+        try:
+            body = self.store.get(name)
+        except Exception:
+            body = None
+        with self._lock:
+            if body is None:
+                self.index.pop(name, None)
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        return True, json.loads(body)
+
+    def put(self, source: str, key: str, value: Any) -> None:
+        """Cache a value, or a miss if value is None."""
+        name = self.make_name(source, key)
+        now = self.clock()
+        size = 0
+        if value is not None:
+            body = json.dumps(value).encode()
+            try:
+                self.store.put(name, body)
+            except Exception as e:
+                print(f"Error writing response cache entry {name}: {e}")
+                return
+            size = len(body)
+        ttl = self.negative_ttl if value is None else self.ttls.get(source, DEFAULT_TTL)
+        with self._lock:
+            self.index[name] = {
+                "size": size, "accessed": now, "expires": now + ttl, "miss": value is None
+            }
+
+    def flush(self) -> None:
+        """Drop expired entries, evict least recently used entries past
+        max_bytes and write the index.
+        """
+        if self._index is None:
+            return
+        with self._lock:
+            merged = self._read_index()
+            for name, entry in self._index.items():
+                if name not in merged or merged[name]["accessed"] <= entry["accessed"]:
+                    merged[name] = entry
+            now = self.clock()
+            evicted = [name for name, entry in merged.items() if entry["expires"] <= now]
+            live = sorted(
+                (name for name, entry in merged.items() if entry["expires"] > now),
+                key=lambda name: merged[name]["accessed"],
+            )
+            total = sum(merged[name]["size"] for name in live)
+            for name in live:
+                if total <= self.max_bytes:
+                    break
+                total -= merged[name]["size"]
+                evicted.append(name)
+            for name in evicted:
+                if merged.pop(name)["size"]:
+                    try:
+                        self.store.delete(name)
+                    except Exception as e:
+                        print(f"Error evicting response cache entry {name}: {e}")
+            try:
+                self.store.put(INDEX_NAME, json.dumps(merged).encode())
+            except Exception as e:
+                print(f"Error writing response cache index: {e}")
+            self._index = merged
+
+
+def get_response_cache(connection, **kwargs) -> ResponseCache:
+    """Response cache in the foursight S3 bucket of the connection, or in
+    a local directory if FOURSIGHT_PUB_CACHE_DIR is set or the connection
+    has no S3 bucket.
+    """
+    local_dir = os.environ.get(LOCAL_CACHE_DIR_ENV)
+    s3_connection = getattr(connection, "connections", {}).get("s3")
+    if local_dir or s3_connection is None:
+        store = LocalCacheStore(
+            local_dir or os.path.join(tempfile.gettempdir(), "foursight_pub_cache")
+        )
+    else:
+        store = S3CacheStore(
+            s3_connection.client,
+            s3_connection.bucket,
+            encryption=getattr(s3_connection, "encryption", None)
+            or os.environ.get("S3_ENCRYPT_KEY_ID"),
+        )
+    return ResponseCache(store, **kwargs)
+
+
+def fetch_pubmed_batch(
+    dois: List[str], fetcher: ExternalFetcher, cache: Optional[ResponseCache] = None
+) -> Dict[str, Tuple[Optional[str], Optional[Dict[str, Any]]]]:
+    """PMID and PubMed metadata of DOIs, from one ESearch of all DOIs not
+    cached and EFetches of all PMIDs whose metadata is not cached.
+
+    Articles are mapped back to DOIs by the DOI they list; DOIs left
+    unmapped while some found PMIDs are too fall back to single ESearches.
+
+    :returns: {doi: (PMID or None, metadata or None)}
+    """
+    results = {}
+    to_search = []
+    known_pmids = {}
+    for doi in dois:
+        cached, pmid = cache.get("pmid", doi) if cache is not None else (False, None)
+        if not cached:
+            to_search.append(doi)
+        elif not pmid:
+            results[doi] = (None, None)
+        else:
+            cached, metadata = cache.get("pubmed_article", pmid)
+            if cached:
+                results[doi] = (pmid, metadata)
+            else:
+                known_pmids[doi] = pmid
+    found_pmids = search_pmids(to_search, fetcher) if to_search else []
+    metadata_by_pmid = {}
+    pmids_by_doi = defaultdict(list)
+    for pmid, article_doi, metadata in iter_pubmed_articles(
+        list(dict.fromkeys(found_pmids + list(known_pmids.values()))), fetcher
+    ):
+        metadata_by_pmid[pmid] = metadata
+        if article_doi:
+            pmids_by_doi[article_doi.lower()].append(pmid)
+    unmatched_pmids = set(found_pmids) - {
+        pmid for pmids in pmids_by_doi.values() for pmid in pmids
+    }
+    for doi in to_search:
+        matches = pmids_by_doi.get(doi.lower(), [])
+        pmid = matches[0] if len(matches) == 1 else None
+        if not matches and unmatched_pmids:
+            pmid = get_pmid_from_doi(doi, fetcher)
+        if pmid and pmid not in metadata_by_pmid:
+            metadata_by_pmid.update(
+                (found, metadata) for found, _, metadata in iter_pubmed_articles([pmid], fetcher)
+            )
+        if cache is not None:
+            cache.put("pmid", doi, pmid)
+        known_pmids[doi] = pmid
+    for doi, pmid in known_pmids.items():
+        results[doi] = (pmid, metadata_by_pmid.get(pmid)) if pmid else (None, None)
+    if cache is not None:
+        for pmid, metadata in metadata_by_pmid.items():
+            cache.put("pubmed_article", pmid, metadata)
+    return results
+
+
+def fetch_external_metadata(
+    dois: Iterable[str],
+    fetcher: Optional[ExternalFetcher] = None,
+    cache: Optional[ResponseCache] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Fetch CrossRef, Rxiv and PubMed metadata of each distinct DOI, with
+    all sources of all DOIs in flight concurrently and PubMed lookups
+    batched. Responses (and misses) are looked up in and added to the
+    cache, if given.
+
+    :returns: {doi: {"crossref": dict, "rxiv": (server, data),
+        "pmid": str or None, "pubmed": metadata dict or None}}
+    """
+    dois = list(dict.fromkeys(dois))
+    own_fetcher = fetcher is None
+    fetcher = fetcher or ExternalFetcher()
+
+    def lookup(source, key, fetch):
+        if cache is not None:
+            cached, value = cache.get(source, key)
+            if cached:
+                return value
+        value = fetch()
+        if cache is not None:
+            cache.put(source, key, value)
+        return value
+
+    def fetch_rxiv(doi):
+        server, data = get_rxiv_metadata(doi, fetcher)
+        return [server, data] if server else None
+
+    def fetch_task(task):
+        key, source = task
+        if source == "crossref":
+            return lookup("crossref", key, lambda: get_crossref_metadata(key, fetcher))
+        if source == "rxiv":
+            return lookup("rxiv", key, lambda: fetch_rxiv(key))
+        return fetch_pubmed_batch(list(key), fetcher, cache)
+
+    tasks = []
+    for doi in dois:
+        tasks.append((doi, "crossref"))
+        if is_rxiv_doi(doi):
+            tasks.append((doi, "rxiv"))
+    for start in range(0, len(dois), ESEARCH_BATCH_SIZE):
+        tasks.append((tuple(dois[start:start + ESEARCH_BATCH_SIZE]), "pubmed"))
+    results = {
+        doi: {"crossref": {}, "rxiv": (None, None), "pmid": None, "pubmed": None} for doi in dois
+    }
+    try:
+        for (key, source), result, error in iter_concurrently(
+            fetch_task, tasks, max_workers=fetcher.max_workers
+        ):
+            if error:
+                print(f"Error fetching {source} metadata for {key}: {error}")
+            elif source == "pubmed":
+                for doi, (pmid, metadata) in result.items():
+                    results[doi]["pmid"], results[doi]["pubmed"] = pmid, metadata
+            elif source == "rxiv":
+                results[key]["rxiv"] = tuple(result) if result else (None, None)
+            else:
+                results[key]["crossref"] = result or {}
+    finally:
+        if own_fetcher:
+            fetcher.close()
+        if cache is not None:
+            cache.flush()
+    return results
+
+
+def _split_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Lines of a byte stream, keeping line endings."""
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line + b"\n"
+    if pending:
+        yield pending
+
+
+def is_cursor_of(cursor: Any, input_file: str) -> bool:
+    """Whether cursor is an input cursor of input_file."""
+    return isinstance(cursor, dict) and cursor.get("input_file") == input_file
+
+
+def find_committed_input_cursor(
+    check_results: Iterable[Dict[str, Any]],
+    action_results: Iterable[Dict[str, Any]],
+    input_file: str,
+) -> Optional[Dict[str, Any]]:
+    """Find the committed cursor of input_file to resume reading from.
+
+    Check results without a cursor of input_file (e.g. doi_acc_list runs,
+    or runs on another input) are passed over. Of the most recent one
+    with such a cursor, the pending cursor is taken if update_pub_metadata
+    committed it by echoing it in its output, and its committed
+    input_cursor otherwise.
+
+    :param check_results: prepare_pub_metadata results, newest first
+    :param action_results: update_pub_metadata results, newest first; only
+        read if a pending cursor of input_file is found
+    :returns: The committed cursor, or None to start from the beginning
+    """
+    committed_cursors = None
+    for check_result in check_results:
+        full_output = check_result.get("full_output")
+        if not isinstance(full_output, dict):
+            continue
+        pending_cursor = full_output.get("pending_input_cursor")
+        if is_cursor_of(pending_cursor, input_file):
+            if committed_cursors is None:
+                committed_cursors = [
+                    action_result["output"].get("input_cursor")
+                    for action_result in action_results
+                    if isinstance(action_result.get("output"), dict)
+                ]
+            if pending_cursor in committed_cursors:
+                return pending_cursor
+        cursor = full_output.get("input_cursor")
+        if is_cursor_of(cursor, input_file):
+            return cursor
+    return None
+
+
+def iter_input_lines(location: str, offset: int = 0, s3_client=None) -> Iterator[Tuple[str, int]]:
+    """Stream (line, byte offset after the line) from an s3://bucket/key
+    object or a local file, starting at a byte offset.
+
+    S3 objects are read with a ranged GET from the offset, so resuming
+    a large input does not re-read what was already processed.
+    """
+    if location.startswith("s3://"):
+        bucket, _, key = location[len("s3://"):].partition("/")
+        range_kwargs = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            body = (s3_client or boto3.client("s3")).get_object(
+                Bucket=bucket, Key=key, **range_kwargs
+            )["Body"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                return  # offset is at the end of the object
+            raise
+        try:
+            for line in _split_lines(body.iter_chunks()):
+                offset += len(line)
+                yield line.decode("utf-8").strip(), offset
+        finally:
+            body.close()
+        return
+    with open(location, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            yield line.decode("utf-8").strip(), offset
@@ -0,0 +1,199 @@
+"""Token-bucket rate limiting of portal load shared across concurrent
+check invocations.
+
+Bucket state lives in the foursight S3 bucket (or a local directory, for
+local runs) and is updated with conditional writes, so Lambdas running
+at the same time draw from the same budget instead of each sleeping a
+random interval. Budgets are drawn per logical request rather than per
+page: a PortalClient given a RateLimiter takes one search token per
+search, or one batch of tokens for a set of concurrent searches, so the
+bucket state is not read and written on every page request.
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+# Per-endpoint budgets: (tokens refilled per second, bucket capacity)
+ENDPOINT_BUDGETS = {
+    "search": (1.0, 5),
+    "counts": (0.2, 2),
+    "default": (2.0, 10),
+}
+# Never wait longer than the random stagger this replaces; past it, proceed
+DEFAULT_MAX_WAIT = 20
+STATE_PREFIX = "rate_limits/"
+# Directory for bucket state when running locally instead of against S3
+LOCAL_STATE_DIR_ENV = "FOURSIGHT_RATE_LIMIT_DIR"
+
+
+class S3BucketStore:
+    """Token bucket states as JSON objects in an S3 bucket.
+
+    Writes are conditional on the ETag read (or on the object not existing
+    yet), so only one of several concurrent writers succeeds.
+    """
+
+    CONFLICT_CODES = ("PreconditionFailed", "ConditionalRequestConflict", "412", "409")
+
+    def __init__(self, s3_client, bucket, prefix=STATE_PREFIX, encryption=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        # KMS key ID to encrypt state objects with, as foursight's S3Connection does
+        self.encryption = encryption
+
+    def read(self, name):
+        """Get (state, version) of a bucket, or (None, None) if unset."""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.prefix + name)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None, None
+            raise
+        return json.loads(response["Body"].read()), response["ETag"]
+
+    def write(self, name, state, version):
+        """Write state if the bucket is still at version; return whether
+        it was written.
+        """
+        condition = {"IfMatch": version} if version else {"IfNoneMatch": "*"}
+        if self.encryption:
+            condition.update(ServerSideEncryption="aws:kms", SSEKMSKeyId=self.encryption)
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket, Key=self.prefix + name, Body=json.dumps(state), **condition
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in self.CONFLICT_CODES:
+                return False
+            raise
+        return True
+
+
+class LocalFileStore:
+    """Token bucket states as JSON files in a local directory.
+
+    Compare-and-swap is done under an exclusive file lock, so separate
+    processes on the same host share budgets.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + ".json")
+
+    def read(self, name):
+        """Get (state, version) of a bucket, or (None, None) if unset."""
+        try:
+            with open(self._path(name)) as f:
+                content = json.load(f)
+        except FileNotFoundError:
+            return None, None
+        return content["state"], content["version"]
+
+    def write(self, name, state, version):
+        """Write state if the bucket is still at version; return whether
+        it was written.
+        """
+        with self._lock, open(self._path(name) + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            _, current_version = self.read(name)
+            if current_version != version:
+                return False
+            temp_path = self._path(name) + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"state": state, "version": (version or 0) + 1}, f)
+            os.replace(temp_path, self._path(name))
+        return True
+
+
+class RateLimiter:
+    """Token buckets per endpoint, refilled continuously at the budgeted
+    rate up to the budgeted capacity.
+
+    Acquiring fails open: if the store errors, or the wait would exceed
+    max_wait, the caller proceeds without tokens rather than failing.
+    Threads sharing a RateLimiter acquire one at a time, so they do not
+    race each other's conditional writes.
+    """
+
+    def __init__(
+        self, store, budgets=None, max_wait=DEFAULT_MAX_WAIT, clock=time.time, sleep=time.sleep
+    ):
+        self.store = store
+        self.budgets = budgets or ENDPOINT_BUDGETS
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+
+    def acquire(self, endpoint, tokens=1):
+        """Take tokens from the endpoint's bucket, waiting for refill.
+
+        :param endpoint: Budget name, e.g. "search"
+        :type endpoint: str
+        :param tokens: Tokens to take
+        :type tokens: int
+        :returns: Seconds waited
+        :rtype: float
+        """
+        with self._lock:
+            return self._acquire(endpoint, tokens)
+
+    def _acquire(self, endpoint, tokens):
+        rate, capacity = self.budgets.get(endpoint, self.budgets["default"])
+        tokens = min(tokens, capacity)
+        waited = 0
+        while True:
+            try:
+                state, version = self.store.read(endpoint)
+            except Exception:
+                return waited
+            now = self.clock()
+            if state is None:
+                available = capacity
+            else:
+                elapsed = max(0, now - state["updated"])
+                available = min(capacity, state["tokens"] + elapsed * rate)
+            if available >= tokens:
+                new_state = {"tokens": available - tokens, "updated": now}
+                try:
+                    if self.store.write(endpoint, new_state, version):
+                        return waited
+                except Exception:
+                    return waited
+                continue  # Another invocation took tokens first; re-read
+            delay = (tokens - available) / rate
+            if waited + delay > self.max_wait:
+                return waited
+            self.sleep(delay)
+            waited += delay
+
+
+def get_rate_limiter(connection, **kwargs):
+    """Rate limiter backed by the foursight S3 bucket of the connection,
+    or by a local directory if FOURSIGHT_RATE_LIMIT_DIR is set or the
+    connection has no S3 bucket.
+    """
+    local_dir = os.environ.get(LOCAL_STATE_DIR_ENV)
+    s3_connection = getattr(connection, "connections", {}).get("s3")
+    if local_dir or s3_connection is None:
+        store = LocalFileStore(
+            local_dir or os.path.join(tempfile.gettempdir(), "foursight_rate_limits")
+        )
+    else:
+        store = S3BucketStore(
+            s3_connection.client,
+            s3_connection.bucket,
+            encryption=getattr(s3_connection, "encryption", None)
+            or os.environ.get("S3_ENCRYPT_KEY_ID"),
+        )
+    return RateLimiter(store, **kwargs)
@@ -1,11 +1,55 @@
 import json
+import re
+import threading
+import time
+import uuid as uuid_lib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from urllib.parse import parse_qs, urlencode, urlparse
 
+import requests
+from botocore.exceptions import ClientError
+from requests.adapters import HTTPAdapter
 from dcicutils import ff_utils
 
 from . import constants
 from .confchecks import CheckResult, ActionResult
 
+# Max concurrent requests a single check/action issues to the portal
+DEFAULT_MAX_WORKERS = 10
+
+# Seconds a Lambda invocation may run before it is killed, and seconds of
+# that kept free to save the check/action result
+LAMBDA_TIMEOUT = 900
+RESULT_SAVE_MARGIN = 30
+
+S3ObjectInfo = namedtuple("S3ObjectInfo", ["bucket", "size", "storage_class"])
+
+# Identifier values per multi-valued search request
+SEARCH_CHUNK_SIZE = 50
+PORTAL_ACCESSION_PATTERN = re.compile(r"^SMA[A-Z]{2}[A-Z0-9]{7}$")
+
+# /embed chunk sizes: /embed rejects more than 5 IDs with a 400 (as of
+# 20220601 -drr), so start at and never exceed that
+EMBED_CHUNK_SIZE = 5
+EMBED_MAX_CHUNK_SIZE = 5
+# Seconds per /embed response above which chunks shrink
+EMBED_TARGET_LATENCY = 10
+
+# Most recent results iter_results and get_last_result look through by default
+RESULT_LOOKBACK = 20
+
+# Key in an associated check's full_output holding a continued action's ledger
+ACTION_CHECKPOINT = "action_checkpoint"
+# Sub-prefix of a check's results under which continuation checkpoints are
+# stored; not a timestamp, so they stay out of the check's history
+ACTION_CHECKPOINT_PREFIX = "action_checkpoints"
+# Max times an action re-enqueues itself to finish work past the time limit
+MAX_ACTION_CONTINUATIONS = 20
+# Runner-managed action kwargs not carried over to continuations
+RUNNER_ACTION_KWARGS = ("uuid", "check_name", "called_by", "runtime_seconds")
+
 
 def initialize_check(check_name, connection):
     """Create a CheckResult with default attributes.
@@ -53,27 +97,115 @@ def format_kwarg_list(kwarg_input):
     return result
 
 
-def validate_items_existence(item_identifiers, connection):
-    """Get raw view of items from database and keep track of which
-    identifiers could not be retrieved.
+def validate_items_existence(
+    item_identifiers,
+    connection,
+    item_type="Item",
+    fields=None,
+    chunk_size=SEARCH_CHUNK_SIZE,
+    rate_limiter=None,
+    from_database=False,
+    cache=None,
+):
+    """Get items and keep track of which identifiers could not be
+    retrieved.
+
+    UUIDs and accessions, given directly or as the last segment of an
+    @id, are resolved with chunked multi-valued searches of item_type,
+    projected to the requested fields. Only identifiers the searches do
+    not return (other @ids, aliases, items not yet indexed or hidden from
+    search) are retrieved with concurrent GETs (object view).
+
+    :param item_type: Item type to search
+    :type item_type: str
+    :param fields: Fields to return; if None, found items are retrieved
+        whole with GETs
+    :type fields: list(str) or None
+    :param rate_limiter: Shared budget the searches draw from, if any
+    :type rate_limiter: RateLimiter or None
+    :param from_database: Whether to retrieve all items from the database
+        rather than the search index, for callers needing current values
+    :type from_database: bool
+    :param cache: Cache of search and GET responses, if any
+    :type cache: PortalCache or None
+    :returns: Items found and identifiers not found, in input order
+    :rtype: tuple(list(dict), list(str))
     """
     found = []
     not_found = []
     if isinstance(item_identifiers, str):
         item_identifiers = [item_identifiers]
+    identifiers_by_value = {"uuid": {}, "accession": {}}
     for item_identifier in item_identifiers:
-        try:
-            item = ff_utils.get_metadata(
-                item_identifier,
-                key=connection.ff_keys,
-                add_on="frame=raw",
-            )
-            found.append(item)
-        except Exception:
+        kind, value = classify_identifier(item_identifier)
+        if kind:
+            identifiers_by_value[kind].setdefault(value, []).append(item_identifier)
+    search_fields = ["uuid", "accession"]
+    if fields is not None and not from_database:
+        search_fields += [field for field in fields if field not in search_fields]
+    query_base = "/search/?type=" + item_type + "".join(
+        "&field=" + field for field in search_fields
+    )
+    queries = [
+        query_base + "".join(f"&{kind}={value}" for value in value_chunk)
+        for kind, identifiers in identifiers_by_value.items()
+        for value_chunk in chunk_ids(list(identifiers), chunk_size=chunk_size)
+    ]
+    use_search_results = fields is not None and not from_database
+    items = {}
+    uuids = {}
+    with PortalClient(connection, rate_limiter=rate_limiter, cache=cache) as portal_client:
+        for _, search_results, error in portal_client.search_concurrently(queries):
+            for item in search_results or []:  # Failed searches fall back to GETs
+                for kind, identifiers in identifiers_by_value.items():
+                    for item_identifier in identifiers.get(item.get(kind), []):
+                        if use_search_results:
+                            items[item_identifier] = item
+                        else:
+                            uuids[item_identifier] = item.get("uuid")
+        # Identifiers resolved by search are read by UUID, the rest as given
+        to_get = {
+            item_identifier: uuids.get(item_identifier, item_identifier)
+            for item_identifier in item_identifiers
+            if item_identifier not in items
+        }
+        add_on = "frame=object&datastore=database" if from_database else "frame=object"
+        got_items = {}
+        for identifier, item, error in portal_client.as_completed(
+            lambda identifier: portal_client.get_metadata(identifier, add_on=add_on),
+            list(dict.fromkeys(to_get.values())),
+        ):
+            if not error:
+                got_items[identifier] = item
+        for item_identifier, identifier in to_get.items():
+            if identifier in got_items:
+                items[item_identifier] = got_items[identifier]
+    for item_identifier in item_identifiers:
+        item = items.get(item_identifier)
+        if item is None:
             not_found.append(item_identifier)
+        else:
+            found.append(item)
     return found, not_found
 
 
+def classify_identifier(identifier):
+    """Classify a portal identifier for searching.
+
+    :returns: ("uuid", UUID), ("accession", accession) or (None,
+        identifier) if the identifier can only be retrieved directly
+    :rtype: tuple
+    """
+    value = identifier
+    if identifier.startswith("/"):  # @id
+        value = identifier.rstrip("/").rsplit("/", 1)[-1]
+    if is_uuid(value):
+        return "uuid", value
+    if PORTAL_ACCESSION_PATTERN.match(value):
+        return "accession", value
+    return None, identifier
+
+
 def add_to_dict_as_list(dictionary, key, value):
     """Add key, value pair to dictionary, with values for key stored in
     list.
@@ -85,26 +217,207 @@ def add_to_dict_as_list(dictionary, key, value):
         dictionary[key] = [value]
 
 
-def make_embed_request(ids, fields, connection):
+def make_embed_request(
+    ids,
+    fields,
+    connection,
+    stream=False,
+    chunk_size=EMBED_CHUNK_SIZE,
+    max_chunk_size=EMBED_MAX_CHUNK_SIZE,
+    target_latency=EMBED_TARGET_LATENCY,
+):
     """POST to /embed API to get desired fields for all given
     identifiers.
+
+    Chunks of identifiers are POSTed concurrently over a pooled session,
+    with chunk size adapted to the server's accepted maximum and observed
+    latency (see AdaptiveChunkSize). Results are in input order.
+
+    :param stream: If True, return a generator yielding embeds as soon as
+        all preceding chunks have completed
+    :type stream: bool
+    :returns: Embeds, or a single embed if only one was found, or a
+        generator of embeds if streaming
+    """
+    embeds = iter_embed_request(
+        ids,
+        fields,
+        connection,
+        chunk_size=chunk_size,
+        max_chunk_size=max_chunk_size,
+        target_latency=target_latency,
+    )
+    if stream:
+        return embeds
+    result = list(embeds)
+    if len(result) == 1:
+        result = result[0]
+    return result
+
+
+def iter_embed_request(
+    ids,
+    fields,
+    connection,
+    chunk_size=EMBED_CHUNK_SIZE,
+    max_chunk_size=EMBED_MAX_CHUNK_SIZE,
+    target_latency=EMBED_TARGET_LATENCY,
+):
+    """Yield embeds for all given identifiers in input order.
+
+    A chunk the server rejects as too large (400) is split to the
+    adjusted maximum and retried, without ff_utils' retries of the
+    rejected request; transient errors are retried with backoff, and
+    any other error, or a rejection of a single identifier, is raised.
     """
-    result = []
     if isinstance(ids, str):
         ids = [ids]
     if isinstance(fields, str):
         fields = [fields]
-    id_chunks = chunk_ids(ids, chunk_size=5)  # Max 5 IDs to /embed as of 20220601 -drr
-    for id_chunk in id_chunks:
-        post_body = {"ids": id_chunk, "fields": fields}
-        endpoint = connection.ff_server + "/embed"
-        embed_response = ff_utils.authorized_request(
-            endpoint, verb="POST", auth=connection.ff_keys, data=json.dumps(post_body)
-        ).json()
-        result += embed_response
-    if len(result) == 1:
-        result = result[0]
-    return result
+    chunk_sizer = AdaptiveChunkSize(
+        chunk_size, max_size=max_chunk_size, target_latency=target_latency
+    )
+
+    def iter_chunks():
+        start = 0
+        while start < len(ids):
+            end = start + chunk_sizer.size
+            yield start, ids[start:end]
+            start = end
+
+    with PortalClient(connection) as portal_client:
+
+        def post_chunk(id_chunk):
+            post_body = {"ids": id_chunk, "fields": fields}
+            request_start = time.monotonic()
+            try:
+                response = retry_with_backoff(
+                    portal_client.request,
+                    "embed",
+                    verb="POST",
+                    retry=False,
+                    data=json.dumps(post_body),
+                ).json()
+            except PortalRequestError as error:
+                if error.status_code != 400 or len(id_chunk) == 1:
+                    raise
+                sub_chunk_size = chunk_sizer.reject(len(id_chunk))
+                return [
+                    embed
+                    for sub_chunk in chunk_ids(id_chunk, chunk_size=sub_chunk_size)
+                    for embed in post_chunk(sub_chunk)
+                ]
+            chunk_sizer.accept(len(id_chunk), time.monotonic() - request_start)
+            return response
+
+        completed = {}
+        next_start = 0
+        for (start, id_chunk), embeds, error in portal_client.as_completed(
+            lambda chunk: post_chunk(chunk[1]), iter_chunks()
+        ):
+            if error:
+                raise error
+            completed[start] = (len(id_chunk), embeds)
+            while next_start in completed:
+                chunk_length, embeds = completed.pop(next_start)
+                yield from embeds
+                next_start += chunk_length
+
+
+class AdaptiveChunkSize:
+    """Thread-safe chunk size for batched requests.
+
+    Grows by one after each response faster than half the target
+    latency and halves after slower ones (additive increase,
+    multiplicative decrease), never exceeding the largest size the
+    server has not rejected.
+    """
+
+    def __init__(self, size, max_size, target_latency):
+        self.max_size = max(1, max_size)
+        self.size = max(1, min(size, self.max_size))
+        self.target_latency = target_latency
+        self.largest_accepted = 0
+        self._lock = threading.Lock()
+
+    def accept(self, chunk_size, latency):
+        """Record a chunk of chunk_size accepted in latency seconds."""
+        with self._lock:
+            self.largest_accepted = max(self.largest_accepted, chunk_size)
+            if latency > self.target_latency:
+                self.size = max(1, self.size // 2)
+            elif latency < self.target_latency / 2:
+                self.size = min(self.max_size, self.size + 1)
+
+    def reject(self, chunk_size):
+        """Record a chunk of chunk_size rejected and return the size to
+        split it into.
+        """
+        with self._lock:
+            self.max_size = max(
+                1, min(chunk_size - 1, max(self.largest_accepted, chunk_size // 2))
+            )
+            self.size = min(self.size, self.max_size)
+            return self.max_size
+
+
+def is_uuid(identifier):
+    """Determine if identifier is a UUID string."""
+    try:
+        uuid_lib.UUID(identifier)
+    except (TypeError, ValueError, AttributeError):
+        return False
+    return True
+
+
+def is_transient_error(error):
+    """Determine if a request error is worth retrying: timeouts,
+    connection errors and 429/5xx status codes.
+
+    Status codes are only known for requests made without ff_utils'
+    retries (PortalClient.request with retry=False); errors ff_utils
+    raises after its own retries are not retried again.
+    """
+    if isinstance(error, (requests.Timeout, requests.ConnectionError, TimeoutError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+def is_unprocessed_error(error):
+    """Determine if a failed request was certainly not processed by the
+    server (429 or a connection that was never made), so that retrying
+    a non-idempotent request such as a POST cannot duplicate it.
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    return getattr(error, "status_code", None) == 429
+
+
+def retry_with_backoff(
+    func, *args, attempts=3, base_delay=1, is_retryable=is_transient_error, **kwargs
+):
+    """Call func, retrying retryable errors with exponential backoff.
+
+    For portal requests, func should make a single request (e.g.
+    PortalClient methods with retry=False), so that retries are not
+    stacked on top of ff_utils' own.
+
+    :param attempts: Max calls to make
+    :type attempts: int
+    :param base_delay: Seconds to wait before the first retry, doubled
+        for each retry after
+    :type base_delay: float
+    :param is_retryable: Function of an error returning whether to retry
+    :type is_retryable: callable
+    """
+    for attempt in range(attempts):
+        try:
+            return func(*args, **kwargs)
+        except Exception as error:
+            if attempt == attempts - 1 or not is_retryable(error):
+                raise
+            time.sleep(base_delay * 2 ** attempt)
 
 
 def chunk_ids(ids, chunk_size=5):
@@ -128,3 +441,780 @@ def is_past_time_limit(start, limit):
     if (now - start).seconds > limit:
         result = True
     return result
+
+
+def iter_results(run_result, skip_statuses=(constants.CHECK_ERROR,), limit=RESULT_LOOKBACK):
+    """Yield the most recent results of a check or action, newest
+    first, skipping those whose status is in skip_statuses.
+
+    Results are read one at a time, so callers that stop at the first
+    result they need only read that far back.
+
+    :param run_result: CheckResult or ActionResult
+    :param limit: Number of most recent results to look through
+    """
+    history, _ = run_result.get_result_history(0, limit)
+    for status, _, result_kwargs, _ in history:
+        if status in skip_statuses or not result_kwargs.get("uuid"):
+            continue
+        result = run_result.get_result_by_uuid(result_kwargs["uuid"])
+        if result and result.get("status") not in skip_statuses:
+            yield result
+
+
+def get_last_result(run_result, skip_statuses=(constants.CHECK_ERROR,), limit=RESULT_LOOKBACK):
+    """Get the most recent result of a check or action whose status is
+    not in skip_statuses, e.g. to carry state over from the last run
+    that did not fail with a traceback as its full_output.
+
+    :param run_result: CheckResult or ActionResult
+    :param limit: Number of most recent results to look through
+    :returns: The result, or None if none of the last limit qualify
+    :rtype: dict
+    """
+    return next(iter_results(run_result, skip_statuses=skip_statuses, limit=limit), None)
+
+
+def get_action_checkpoint(check_result):
+    """Get the checkpoint a continued action resumes from.
+
+    :param check_result: Associated check full_output, as given by
+        initialize_action
+    :type check_result: dict
+    :returns: Checkpoint with "remaining" work items and "cursor" (count
+        of work items already processed), or empty dict if the action
+        is not a continuation
+    :rtype: dict
+    """
+    return check_result.get(ACTION_CHECKPOINT) or {}
+
+
+def continue_action(
+    connection, action, kwargs, remaining, processed,
+    max_continuations=MAX_ACTION_CONTINUATIONS
+):
+    """Re-enqueue an action to work through remaining items.
+
+    The ledger of remaining items is persisted with a copy of the
+    associated check result under a dedicated checkpoint key
+    (<check_name>/action_checkpoints/<uuid>), stored in S3 only. The
+    continuation is called by "action_checkpoints/<uuid>", so it reads
+    the checkpoint as its associated check result and the runner does
+    not skip it as an already-run action. Checkpoints are not check
+    runs: they are outside the check's history, and latest and primary
+    results are left untouched.
+
+    :param action: Action result being run
+    :type action: ActionResult
+    :param kwargs: Kwargs the action was run with
+    :type kwargs: dict
+    :param remaining: Work items not yet processed
+    :type remaining: list
+    :param processed: Count of work items processed by this run
+    :type processed: int
+    :returns: Checkpoint of the continuation, or None if nothing remains
+        or the continuation limit is reached
+    :rtype: dict or None
+    :raises Exception: If the checkpoint could not be stored, in which
+        case the continuation is not queued
+    """
+    check = CheckResult(connection, kwargs["check_name"])
+    check_record = check.get_result_by_uuid(kwargs["called_by"])
+    if not remaining or not check_record:
+        return None
+    full_output = check_record.get("full_output", {})
+    previous_checkpoint = get_action_checkpoint(full_output)
+    continuation = previous_checkpoint.get("continuation", 0) + 1
+    if continuation > max_continuations:
+        return None
+    called_by = "/".join([ACTION_CHECKPOINT_PREFIX, datetime.utcnow().isoformat()])
+    checkpoint = {
+        "continuation": continuation,
+        "origin": previous_checkpoint.get("origin", kwargs["called_by"]),
+        "cursor": previous_checkpoint.get("cursor", 0) + processed,
+        "remaining": list(remaining),
+    }
+    full_output[ACTION_CHECKPOINT] = checkpoint
+    check_record["full_output"] = full_output
+    check_record.pop("id_alias", None)
+    checkpoint_key = "".join([check.name, "/", called_by, check.extension])
+    # Not through the check, which would also index the record in ES. The
+    # S3 connection logs errors and returns None rather than raising
+    if not connection.connections["s3"].put_object(checkpoint_key, check.dumps_json(check_record)):
+        raise Exception(
+            "Could not store checkpoint %s, so the action is not continued" % checkpoint_key
+        )
+
+    # Imported here as the app requires its environment at import
+    from ...app_utils import app_utils_obj
+
+    params = {
+        key: value for key, value in kwargs.items()
+        if key not in RUNNER_ACTION_KWARGS and not key.startswith("_")
+    }
+    params.update({"check_name": check.name, "called_by": called_by})
+    app_utils_obj.queue_action(connection.fs_env, action.name, params=params)
+    return checkpoint
+
+
+def iter_concurrently(
+    func,
+    items,
+    max_workers=DEFAULT_MAX_WORKERS,
+    should_stop=None,
+    task_timeout=None,
+    deadline=None,
+):
+    """Call func on every item on a bounded thread pool, yielding
+    (item, result, error) tuples as calls complete.
+
+    Items are submitted lazily so that at most max_workers calls are in
+    flight. Once should_stop() returns True, no further items are
+    submitted but calls already in flight are allowed to finish.
+
+    Calls past task_timeout or the deadline are abandoned, not cancelled:
+    they are reported with a TimeoutError and no longer waited on, but
+    their threads cannot be interrupted and keep running (and holding a
+    worker) until func returns, so any side effects still happen.
+
+    :param func: Function of a single item
+    :type func: callable
+    :param items: Items to process
+    :type items: iterable
+    :param max_workers: Max number of concurrent calls
+    :type max_workers: int
+    :param should_stop: Optional function called before each submission
+    :type should_stop: callable or None
+    :param task_timeout: Seconds after which a call is reported with a
+        TimeoutError and no longer waited on
+    :type task_timeout: int or None
+    :param deadline: time.monotonic() value past which no further items
+        are submitted and all calls in flight are abandoned
+    :type deadline: float or None
+    """
+    items = iter(items)
+    in_flight = {}
+    submitted_at = {}
+    timed_out = []  # Still occupy a worker thread until they return
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        exhausted = False
+        while True:
+            timed_out = [future for future in timed_out if not future.done()]
+            while not exhausted and len(in_flight) + len(timed_out) < max_workers:
+                if (should_stop is not None and should_stop()) or (
+                    deadline is not None and time.monotonic() >= deadline
+                ):
+                    exhausted = True
+                    break
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = executor.submit(func, item)
+                in_flight[future] = item
+                submitted_at[future] = time.monotonic()
+            if not in_flight:
+                break
+            wait_until = deadline
+            if task_timeout is not None:
+                next_timeout = min(submitted_at.values()) + task_timeout
+                wait_until = next_timeout if deadline is None else min(next_timeout, deadline)
+            wait_timeout = None
+            if wait_until is not None:
+                wait_timeout = max(0, wait_until - time.monotonic())
+            done, _ = wait(in_flight, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = in_flight.pop(future)
+                submitted_at.pop(future)
+                error = future.exception()
+                result = None if error else future.result()
+                yield item, result, error
+            if wait_until is not None:
+                now = time.monotonic()
+                for future in list(in_flight):
+                    if deadline is not None and now >= deadline:
+                        error = TimeoutError("Abandoned at the Lambda time limit")
+                    elif task_timeout is not None and now - submitted_at[future] >= task_timeout:
+                        error = TimeoutError("Timed out after %s seconds" % task_timeout)
+                    else:
+                        continue
+                    item = in_flight.pop(future)
+                    submitted_at.pop(future)
+                    timed_out.append(future)
+                    yield item, None, error
+    finally:
+        executor.shutdown(wait=False)
+
+
+def run_concurrently(
+    func,
+    items,
+    start=None,
+    time_limit=None,
+    max_workers=DEFAULT_MAX_WORKERS,
+    task_timeout=None,
+):
+    """Run func on all items on a bounded thread pool until the time
+    limit is reached.
+
+    Past the time limit no new items are started, but items already
+    running are allowed to finish. Given a start, items still running
+    when the Lambda is about to be killed (LAMBDA_TIMEOUT less
+    RESULT_SAVE_MARGIN after start) are abandoned and reported as
+    errors, so waiting on them never outlives the invocation; see
+    iter_concurrently.
+
+    :param func: Function of a single item
+    :type func: callable
+    :param items: Hashable items to process, e.g. UUIDs
+    :type items: list
+    :param start: Start time of the check/action
+    :type start: datetime or None
+    :param time_limit: Seconds after start to stop starting new items
+    :type time_limit: int or None
+    :param max_workers: Max number of concurrent calls
+    :type max_workers: int
+    :param task_timeout: Max seconds to wait on a single item; items are
+        abandoned rather than cancelled once it passes
+    :type task_timeout: int or None
+    :returns: Results and error messages keyed by item, both in input
+        order, and items not started before the time limit
+    :rtype: tuple(dict, dict, list)
+    """
+    should_stop = None
+    deadline = None
+    if start is not None:
+        if time_limit is not None:
+            should_stop = lambda: is_past_time_limit(start, time_limit)
+        remaining = (
+            LAMBDA_TIMEOUT - RESULT_SAVE_MARGIN - (datetime.utcnow() - start).total_seconds()
+        )
+        deadline = time.monotonic() + max(0, remaining)
+    results = {}
+    errors = {}
+    for item, result, error in iter_concurrently(
+        func,
+        items,
+        max_workers=max_workers,
+        should_stop=should_stop,
+        task_timeout=task_timeout,
+        deadline=deadline,
+    ):
+        if error:
+            errors[item] = str(error)
+        else:
+            results[item] = result
+    ordered_results = {item: results[item] for item in items if item in results}
+    ordered_errors = {item: errors[item] for item in items if item in errors}
+    not_started = [
+        item for item in items if item not in results and item not in errors
+    ]
+    return ordered_results, ordered_errors, not_started
+
+
+class PortalCache:
+    """Thread-safe LRU cache of portal item and search responses.
+
+    Entries are keyed by normalized URL and frame, stored serialized so
+    each hit returns a fresh copy, bounded by entry count and total
+    bytes, and expire after ttl seconds. Writes through a PortalClient
+    invalidate cached responses for the same item and all searches.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=50 * 1024 * 1024, ttl=600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.size_bytes = 0
+        self._entries = OrderedDict()  # key --> (expires, serialized, item tokens)
+        self._keys_by_token = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(url):
+        """Normalize URL to (URL with sorted params and without frame,
+        frame).
+        """
+        parsed = urlparse(url)
+        params = parse_qs(parsed.query, keep_blank_values=True)
+        frame = params.pop("frame", [""])[0]
+        normalized_url = "%s://%s%s" % (
+            parsed.scheme, parsed.netloc.lower(), parsed.path.rstrip("/")
+        )
+        if params:
+            normalized_url += "?" + urlencode(sorted(params.items()), doseq=True)
+        return normalized_url, frame
+
+    @staticmethod
+    def get_item_tokens(item):
+        """Identifiers an item or item identifier may be requested by."""
+        if isinstance(item, str):
+            identifiers = [item]
+        else:
+            identifiers = [item.get("uuid"), item.get("accession"), item.get("@id")]
+        return {
+            identifier.rstrip("/").rsplit("/", 1)[-1]
+            for identifier in identifiers
+            if isinstance(identifier, str) and identifier.strip("/")
+        }
+
+    @staticmethod
+    def is_search_key(key):
+        return "/search" in urlparse(key[0]).path
+
+    def get(self, key):
+        """Cached response for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._pop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            serialized = entry[1]
+        return json.loads(serialized)
+
+    def put(self, key, value):
+        """Cache response value for key, evicting least recently used
+        entries past the bounds.
+        """
+        serialized = json.dumps(value, default=str)
+        if len(serialized) > self.max_bytes:
+            return
+        if self.is_search_key(key):
+            items = value if isinstance(value, list) else []
+            tokens = {"/search"}
+        else:
+            items = [value] if isinstance(value, dict) else []
+            tokens = self.get_item_tokens(urlparse(key[0]).path)
+        for item in items:
+            if isinstance(item, dict):
+                tokens |= self.get_item_tokens(item)
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, serialized, tokens)
+            self.size_bytes += len(serialized)
+            for token in tokens:
+                self._keys_by_token.setdefault(token, set()).add(key)
+            while self._entries and (
+                len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes
+            ):
+                self._pop(next(iter(self._entries)))
+
+    def invalidate_item(self, item):
+        """Drop cached responses containing the item, given as its
+        properties or an identifier.
+        """
+        with self._lock:
+            for token in self.get_item_tokens(item):
+                for key in list(self._keys_by_token.get(token, [])):
+                    self._pop(key)
+
+    def invalidate_searches(self):
+        """Drop all cached search responses."""
+        with self._lock:
+            for key in list(self._keys_by_token.get("/search", [])):
+                self._pop(key)
+
+    def for_run(self):
+        """Handle on this cache counting the hits and misses of one
+        check or action run.
+        """
+        return PortalCacheRun(self)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_token.clear()
+            self.size_bytes = 0
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size_bytes -= len(entry[1])
+        for token in entry[2]:
+            keys = self._keys_by_token.get(token)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_token[token]
+
+
+class PortalCacheRun:
+    """PortalCache handle with hit/miss counters of its own, so that a
+    check or action can report its use of the shared cache.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+    def get(self, key):
+        result = self.cache.get(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def stats(self):
+        """Hits and misses of this run."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# Shared by checks and actions running in the same warm Lambda
+PORTAL_CACHE = PortalCache()
+
+
+
+class PortalRequestError(Exception):
+    """Portal response with an error status code."""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class PortalClient:
+    """Client for portal requests sharing a pool of keep-alive HTTP
+    connections, with helpers to fan requests out on a bounded thread
+    pool.
+
+    Requests are made through ff_utils.authorized_request so that
+    authentication and retries match the rest of the checks. Given a
+    RateLimiter, each logical search (not each page of it) first takes a
+    token from the shared search budget; other requests are not budgeted
+    here. Given a PortalCache (or a
+    run's handle on one), item GETs and searches are memoized and writes
+    invalidate cached responses of the written item and all searches.
+    """
+
+    SEARCH_PAGE_LIMIT = 50
+
+    def __init__(
+        self, connection, max_workers=DEFAULT_MAX_WORKERS, rate_limiter=None, cache=None
+    ):
+        self.key = connection.ff_keys
+        self.server = (self.key.get("server") or connection.ff_server).rstrip("/")
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def make_url(self, path):
+        """Portal URL for the given path, which may already be a URL."""
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return self.server + "/" + path.lstrip("/")
+
+    def request(self, path, verb="GET", retry=True, **kwargs):
+        """Make an authorized request with the pooled session.
+
+        :param path: Portal path or full URL
+        :type path: str
+        :param verb: HTTP verb
+        :type verb: str
+        :param retry: Whether to use ff_utils' retries; if False, a single
+            request is made and an error status raises PortalRequestError
+        :type retry: bool
+        :returns: Response with status code under 400
+        :rtype: requests.Response
+        """
+        url = self.make_url(path)
+        session_method = getattr(self.session, verb.lower())
+        if not retry:
+
+            def session_retry_fxn(request_fxn, url, auth, verb, **request_kwargs):
+                response = session_method(url, auth=auth, **request_kwargs)
+                if response.status_code >= 400:
+                    raise PortalRequestError(
+                        "Bad status code for %s request for %s: %s"
+                        % (verb.upper(), url, response.status_code),
+                        response.status_code,
+                    )
+                return response
+
+        else:
+            if "/search/" in url:
+                retry_fxn = ff_utils.search_request_with_retries
+            else:
+                retry_fxn = ff_utils.standard_request_with_retries
+
+            def session_retry_fxn(request_fxn, *args, **retry_kwargs):
+                return retry_fxn(session_method, *args, **retry_kwargs)
+
+        kwargs.setdefault(
+            "headers", {"content-type": "application/json", "accept": "application/json"}
+        )
+        return ff_utils.authorized_request(
+            url, auth=self.key, verb=verb, retry_fxn=session_retry_fxn, **kwargs
+        )
+
+    def acquire(self, endpoint, tokens=1):
+        """Take tokens from the rate limiter's budget for endpoint, if a
+        rate limiter is set.
+        """
+        if self.rate_limiter is not None and tokens > 0:
+            self.rate_limiter.acquire(endpoint, tokens=tokens)
+
+    def get_metadata(self, obj_id, add_on="", retry=True):
+        """GET an item, from the cache if one is set."""
+        path = obj_id.lstrip("/") + ff_utils.process_add_on(add_on)
+        return self._cached(
+            path, lambda: ff_utils.get_response_json(self.request(path, retry=retry))
+        )
+
+    def patch_metadata(self, patch_body, obj_id, add_on="", retry=True):
+        """PATCH an item."""
+        path = obj_id.lstrip("/") + ff_utils.process_add_on(add_on)
+        try:
+            response = self.request(path, verb="PATCH", retry=retry, data=json.dumps(patch_body))
+            result = ff_utils.get_response_json(response)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate_item(obj_id)
+                self.cache.invalidate_searches()
+        if self.cache is not None:
+            for item in result.get("@graph", []):
+                self.cache.invalidate_item(item)
+        return result
+
+    def post_metadata(self, post_body, schema_name, add_on="", retry=True):
+        """POST an item."""
+        path = schema_name + ff_utils.process_add_on(add_on)
+        try:
+            response = self.request(path, verb="POST", retry=retry, data=json.dumps(post_body))
+            result = ff_utils.get_response_json(response)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate_searches()
+        if self.cache is not None:
+            for item in result.get("@graph", []):
+                self.cache.invalidate_item(item)
+        return result
+
+    def _cached(self, path, fetch):
+        """Get response for path from the cache, or fetch and cache it.
+
+        Reads from the database (datastore=database) are never cached, as
+        callers ask for them to get current values.
+        """
+        if self.cache is None or "datastore=database" in path:
+            return fetch()
+        cache_key = self.cache.make_key(self.make_url(path))
+        result = self.cache.get(cache_key)
+        if result is None:
+            result = fetch()
+            self.cache.put(cache_key, result)
+        return result
+
+    def iter_search_pages(self, query, page_limit=SEARCH_PAGE_LIMIT, charge=True):
+        """Yield pages of search results, following the same
+        pagination as ff_utils.get_search_generator.
+
+        One search token is taken before the first page if charge is set;
+        callers that already took tokens for the search pass charge=False.
+        """
+        if charge:
+            self.acquire("search")
+        search_url = self.make_url(query)
+        url_params = ff_utils.get_url_params(search_url)
+        current_from = int(url_params.get("from", ["0"])[0])
+        initial_from = current_from
+        search_limit = url_params.get("limit", ["all"])[0]
+        if search_limit != "all":
+            search_limit = int(search_limit)
+        url_params["limit"] = [str(page_limit)]
+        if not url_params.get("sort"):
+            url_params["sort"] = ["-date_created"]
+        last_total = None
+        while last_total is None or last_total == page_limit:
+            if search_limit != "all" and current_from - initial_from >= search_limit:
+                break
+            url_params["from"] = [str(current_from)]
+            page_url = ff_utils.update_url_params_and_unparse(search_url, url_params)
+            page = ff_utils.get_response_json(self.request(page_url)).get("@graph", [])
+            last_total = len(page)
+            current_from += last_total
+            if search_limit != "all" and current_from - initial_from > search_limit:
+                page = page[: -(current_from - initial_from - search_limit)]
+            yield page
+
+    def iter_search(self, query, page_limit=SEARCH_PAGE_LIMIT, charge=True):
+        """Yield search results one at a time, skipping items already
+        seen on a previous page.
+        """
+        items_seen = set()
+        for page in self.iter_search_pages(query, page_limit=page_limit, charge=charge):
+            for item in page:
+                item_uuid = item.get("uuid") if isinstance(item, dict) else None
+                if item_uuid:
+                    if item_uuid in items_seen:
+                        continue
+                    items_seen.add(item_uuid)
+                yield item
+
+    def search_metadata(self, query, page_limit=SEARCH_PAGE_LIMIT, charge=True):
+        """Get all search results as a list, from the cache if one is
+        set.
+        """
+        return self._cached(
+            query, lambda: list(self.iter_search(query, page_limit=page_limit, charge=charge))
+        )
+
+    def search_concurrently(self, queries, page_limit=SEARCH_PAGE_LIMIT):
+        """Run searches on the client's thread pool, yielding (query,
+        results, error) as searches complete.
+
+        Tokens for all the searches are taken in one batch up front (up to
+        the budget's capacity), so worker threads do not each contend for
+        the shared budget.
+        """
+        queries = list(queries)
+        self.acquire("search", tokens=len(queries))
+        return self.as_completed(
+            lambda query: self.search_metadata(query, page_limit=page_limit, charge=False),
+            queries,
+        )
+
+    def as_completed(self, func, items, should_stop=None):
+        """Run func over items on the client's thread pool, yielding
+        (item, result, error) as calls complete.
+        """
+        return iter_concurrently(
+            func, items, max_workers=self.max_workers, should_stop=should_stop
+        )
+
+    def map(self, func, items):
+        """Run func over items on the client's thread pool and return
+        results in input order.
+
+        Raises the first error encountered, if any.
+        """
+        items = list(items)
+        results = {}
+        for item_idx, result, error in self.as_completed(
+            lambda idx: func(items[idx]), range(len(items))
+        ):
+            if error:
+                raise error
+            results[item_idx] = result
+        return [results[idx] for idx in range(len(items))]
+
+
+def find_s3_objects(s3_client, keys, buckets, max_workers=DEFAULT_MAX_WORKERS):
+    """Find which keys exist in the given S3 buckets with as few
+    requests as possible.
+
+    Keys are grouped by their `<uuid>/` prefix and each group is resolved
+    with a single (paginated) ListObjectsV2 of the prefix, which also
+    covers extra files stored under the same prefix. Keys without a
+    prefix are resolved with HEAD requests. All requests for a bucket run
+    concurrently. Buckets are tried in the given order, and only keys not
+    found in earlier buckets are looked up in later ones.
+
+    Only keys S3 reports as not found are treated as missing; any other
+    S3 error (e.g. access denied, throttling, missing bucket) is raised
+    so that a failed lookup is not mistaken for a missing file.
+
+    :param s3_client: boto3 S3 client
+    :param keys: Object keys to find
+    :type keys: iterable(str)
+    :param buckets: Buckets to search, in priority order
+    :type buckets: list(str)
+    :param max_workers: Max number of concurrent S3 requests
+    :type max_workers: int
+    :returns: Found keys mapped to their location, size and storage class
+    :rtype: dict(str, S3ObjectInfo)
+    :raises ClientError: If any S3 request fails for a reason other than
+        the object not existing
+    """
+    found = {}
+    remaining = set(keys)
+    for bucket in buckets:
+        if not remaining:
+            break
+        keys_by_prefix = {}
+        unprefixed_keys = []
+        for key in remaining:
+            if "/" in key:
+                prefix = key.split("/", 1)[0] + "/"
+                keys_by_prefix.setdefault(prefix, set()).add(key)
+            else:
+                unprefixed_keys.append(key)
+        tasks = list(keys_by_prefix.items()) + [(None, key) for key in unprefixed_keys]
+
+        def resolve(task):
+            prefix, requested = task
+            if prefix is None:
+                return _head_s3_object(s3_client, bucket, requested)
+            return _list_s3_objects(s3_client, bucket, prefix, requested)
+
+        for _, objects_found, error in iter_concurrently(resolve, tasks, max_workers=max_workers):
+            if error:
+                raise error
+            found.update(objects_found)
+        remaining.difference_update(found)
+    return found
+
+
+def _list_s3_objects(s3_client, bucket, prefix, keys):
+    """List objects under prefix, keeping only those in keys."""
+    found = {}
+    list_kwargs = {"Bucket": bucket, "Prefix": prefix}
+    while True:
+        response = s3_client.list_objects_v2(**list_kwargs)
+        for s3_object in response.get("Contents", []):
+            if s3_object["Key"] in keys:
+                found[s3_object["Key"]] = S3ObjectInfo(
+                    bucket, s3_object.get("Size"), s3_object.get("StorageClass", "STANDARD")
+                )
+        if len(found) == len(keys) or not response.get("IsTruncated"):
+            break
+        list_kwargs["ContinuationToken"] = response["NextContinuationToken"]
+    return found
+
+
+def _head_s3_object(s3_client, bucket, key):
+    """HEAD a single object; missing objects give an empty result."""
+    try:
+        head_info = s3_client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return {}
+        raise
+    return {
+        key: S3ObjectInfo(
+            bucket, head_info.get("ContentLength"), head_info.get("StorageClass", "STANDARD")
+        )
+    }
@@ -1,19 +1,276 @@
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 from dcicutils import ff_utils
 from dcicutils.s3_utils import s3Utils
 from packaging import version
 
+from .utils import iter_concurrently, DEFAULT_MAX_WORKERS
+
+# Timestamp format of check watermarks
+WATERMARK_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+# Search results streamed per page by collectors
+SEARCH_PAGE_LIMIT = 500
+# Leading job ID characters Tibanna output bucket listings are grouped by
+LOG_PREFIX_LENGTH = 1
 
 def get_md5_mwfrs_for_file(my_auth, file_uuid):
     query = f"/search/?type=MetaWorkflowRun&meta_workflow.name=md5&input.files.file.uuid={file_uuid}"
     return ff_utils.search_metadata(query, key=my_auth)
 
 
-def get_latest_md5_mwf(my_auth):
+def get_md5_mwfrs_for_files(my_auth, file_uuids, chunk_size=50):
+    """Get md5 MetaWorkflowRuns for many files with a few multi-valued
+    searches.
+
+    Returns a dict of input file UUID to list of md5 MetaWorkflowRuns;
+    every requested UUID is present, mapped to an empty list if no run
+    was found.
+    """
+    file_uuids = list(dict.fromkeys(file_uuids))
+    mwfrs_by_file = {file_uuid: [] for file_uuid in file_uuids}
+    query_base = (
+        "/search/?type=MetaWorkflowRun&meta_workflow.name=md5"
+        "&field=uuid&field=final_status&field=input.files.file.uuid"
+    )
+    for file_uuid_chunk in paginate_list(file_uuids, chunk_size):
+        query = query_base + "".join(
+            f"&input.files.file.uuid={file_uuid}" for file_uuid in file_uuid_chunk
+        )
+        for mwfr in ff_utils.search_metadata(query, key=my_auth):
+            for input_file_uuid in get_mwfr_input_file_uuids(mwfr):
+                if input_file_uuid in mwfrs_by_file:
+                    mwfrs_by_file[input_file_uuid].append(mwfr)
+    return mwfrs_by_file
+
+
+def get_mwfr_input_file_uuids(mwfr):
+    """Unique UUIDs of the input files of a MetaWorkflowRun."""
+    file_uuids = []
+    for mwfr_input in mwfr.get("input", []):
+        for input_file in mwfr_input.get("files", []):
+            file_item = input_file.get("file")
+            if isinstance(file_item, dict):
+                file_item = file_item.get("uuid")
+            if file_item and file_item not in file_uuids:
+                file_uuids.append(file_item)
+    return file_uuids
+
+
+def get_job_ids_with_new_logs(s3_client, log_bucket, job_ids, since, max_workers=DEFAULT_MAX_WORKERS):
+    """Find Tibanna jobs with objects (logs, postrun json, etc.) in the
+    output bucket written after the given time.
+
+    Tibanna names all objects of a job with the job ID as prefix. Jobs are
+    grouped by the first LOG_PREFIX_LENGTH characters of their IDs and
+    each group is found with one paginated listing of its prefix, bounded
+    by the group's first and last job IDs, so the number of listings does
+    not grow with the number of running jobs. Listings run concurrently.
+
+    :param since: Naive UTC datetime
+    :returns: Job IDs with new objects
+    :rtype: set(str)
+    """
+    job_ids_by_prefix = {}
+    for job_id in job_ids:
+        job_ids_by_prefix.setdefault(job_id[:LOG_PREFIX_LENGTH], set()).add(job_id)
+
+    def list_changed_job_ids(prefix):
+        group = job_ids_by_prefix[prefix]
+        # keys are listed in order; objects of the last job start with "<job_id>."
+        last_key = max(group) + ".\uffff"
+        list_kwargs = {"Bucket": log_bucket, "Prefix": prefix, "StartAfter": min(group)}
+        changed_in_group = set()
+        while True:
+            response = s3_client.list_objects_v2(**list_kwargs)
+            for s3_object in response.get("Contents", []):
+                if s3_object["Key"] > last_key:
+                    return changed_in_group
+                job_id = s3_object["Key"].split(".", 1)[0]
+                if job_id in group and s3_object["LastModified"].replace(tzinfo=None) > since:
+                    changed_in_group.add(job_id)
+            if not response.get("IsTruncated"):
+                return changed_in_group
+            list_kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+    changed = set()
+    for prefix, changed_in_group, error in iter_concurrently(
+        list_changed_job_ids, list(job_ids_by_prefix), max_workers=max_workers
+    ):
+        # Err on the side of checking the jobs
+        changed |= job_ids_by_prefix[prefix] if error else changed_in_group
+    return changed
+
+
+def get_job_ids_modified_since(my_auth, since):
+    """Job IDs of WorkflowRuns modified in the portal after the given
+    naive UTC datetime.
+
+    The portal's date range filters take dates (YYYY-MM-DD), so the search
+    covers the whole day of since and modification times are compared here.
+    """
+    query = (
+        "/search/?type=WorkflowRun&field=job_id&field=last_modified.date_modified"
+        "&last_modified.date_modified.from=" + since.strftime("%Y-%m-%d")
+    )
+    job_ids = set()
+    for result in ff_utils.search_metadata(query, key=my_auth):
+        date_modified = result.get("last_modified", {}).get("date_modified")
+        if result.get("job_id") and (
+            not date_modified or parse_date_modified(date_modified) > since
+        ):
+            job_ids.add(result["job_id"])
+    return job_ids
+
+
+def parse_date_modified(date_modified):
+    """Naive UTC datetime of a portal last_modified.date_modified value."""
+    modified = datetime.fromisoformat(date_modified)
+    if modified.tzinfo:
+        modified = modified.astimezone(timezone.utc).replace(tzinfo=None)
+    return modified
+
+
+def select_changed_meta_workflow_runs(meta_workflow_runs, changed_job_ids):
+    """Select MetaWorkflowRuns whose running WorkflowRuns have changed.
+
+    MetaWorkflowRuns without running WorkflowRuns are always selected,
+    since their final status has to be updated.
+
+    :param meta_workflow_runs: MetaWorkflowRuns with workflow_runs.job_id
+        and workflow_runs.status
+    :type meta_workflow_runs: list(dict)
+    :param changed_job_ids: Job IDs of WorkflowRuns that changed
+    :type changed_job_ids: set(str)
+    :rtype: list(dict)
+    """
+    selected = []
+    for meta_workflow_run in meta_workflow_runs:
+        running_job_ids = [
+            workflow_run.get("job_id")
+            for workflow_run in meta_workflow_run.get("workflow_runs", [])
+            if workflow_run.get("status") == "running"
+        ]
+        if not running_job_ids or any(
+            job_id is None or job_id in changed_job_ids for job_id in running_job_ids
+        ):
+            selected.append(meta_workflow_run)
+    return selected
+
+
+def get_latest_watermarks(*outputs):
+    """Get the latest committed watermark and full sweep timestamps
+    among check/action outputs.
+
+    Outputs that are not dicts (e.g. tracebacks of failed runs) or that
+    lack a value are ignored.
+
+    :returns: Latest watermark and last full sweep, or None if none set
+    :rtype: tuple(str or None, str or None)
+    """
+    outputs = [output for output in outputs if isinstance(output, dict)]
+    # Fixed-width timestamps, so string order is time order
+    watermarks = [output["watermark"] for output in outputs if output.get("watermark")]
+    full_sweeps = [
+        output["last_full_sweep"] for output in outputs if output.get("last_full_sweep")
+    ]
+    return max(watermarks, default=None), max(full_sweeps, default=None)
+
+
+def get_running_job_ids(meta_workflow_runs):
+    """Job IDs of running WorkflowRuns on the MetaWorkflowRuns."""
+    return {
+        workflow_run["job_id"]
+        for meta_workflow_run in meta_workflow_runs
+        for workflow_run in meta_workflow_run.get("workflow_runs", [])
+        if workflow_run.get("status") == "running" and workflow_run.get("job_id")
+    }
+
+
+def get_workflow_run_descriptions(my_auth, job_ids, chunk_size=50):
+    """Get WorkflowRun descriptions for many job IDs with a few
+    multi-valued searches.
+
+    Returns a dict of job ID to list of descriptions, one per WorkflowRun
+    found for the job ID.
+    """
+    job_ids = list(dict.fromkeys(job_ids))
+    descriptions = {job_id: [] for job_id in job_ids}
+    query_base = "/search/?type=WorkflowRun&field=job_id&field=description"
+    for job_id_chunk in paginate_list(job_ids, chunk_size):
+        query = query_base + "".join(f"&job_id={job_id}" for job_id in job_id_chunk)
+        for workflow_run in ff_utils.search_metadata(query, key=my_auth):
+            job_id = workflow_run.get("job_id")
+            if job_id in descriptions:
+                descriptions[job_id].append(workflow_run.get("description") or "")
+    return descriptions
+
+
+def get_failed_job_ids(meta_workflow_run):
+    """Job IDs of failed WorkflowRuns on a MetaWorkflowRun."""
+    return [
+        workflow_run.get("job_id")
+        for workflow_run in meta_workflow_run.get("workflow_runs", [])
+        if workflow_run.get("status") == "failed"
+    ]
+
+
+def get_spot_failed_shards(
+    meta_workflow_run, descriptions, spot_failure_job_ids, spot_failure_descriptions
+):
+    """Names of shards on a MetaWorkflowRun that failed from spot
+    interruptions.
+
+    :param meta_workflow_run: MetaWorkflowRun raw properties
+    :type meta_workflow_run: dict
+    :param descriptions: WorkflowRun descriptions by job ID, as given by
+        get_workflow_run_descriptions
+    :type descriptions: dict
+    :param spot_failure_job_ids: Job IDs with a spot failure marker in
+        the Tibanna output bucket
+    :type spot_failure_job_ids: set(str)
+    :param spot_failure_descriptions: Descriptions of spot failures
+    :type spot_failure_descriptions: list(str)
+    :raises Exception: If a failed job ID does not match exactly one
+        WorkflowRun
+    """
+    shards_to_reset = []
+    for workflow_run in meta_workflow_run.get("workflow_runs", []):
+        if workflow_run.get("status") != "failed":
+            continue
+        workflow_run_jobid = workflow_run.get("job_id")
+        workflow_run_descriptions = descriptions.get(workflow_run_jobid, [])
+        if len(workflow_run_descriptions) > 1:
+            raise Exception("Multiple WorkflowRun found for job ID: %s" % workflow_run_jobid)
+        elif not workflow_run_descriptions:
+            raise Exception("No WorkflowRun found for job ID: %s" % workflow_run_jobid)
+        workflow_run_description = workflow_run_descriptions[0]
+        if workflow_run_jobid in spot_failure_job_ids or any(
+            spot_description in workflow_run_description
+            for spot_description in spot_failure_descriptions
+        ):
+            shard_name = workflow_run.get("name") + ":" + str(workflow_run.get("shard"))
+            shards_to_reset.append(shard_name)
+    return shards_to_reset
+
+
+def get_meta_workflow_runs_query(meta_workflow_uuids, final_status):
+    """Search query for MetaWorkflowRuns of any of the MetaWorkflows
+    with any of the final status values.
+    """
+    query = "/search/?type=MetaWorkflowRun"
+    query += "".join("&meta_workflow.uuid=" + uuid for uuid in meta_workflow_uuids)
+    query += "".join("&final_status=" + status for status in final_status)
+    return query
+
+
+def get_latest_md5_mwf(my_auth, portal_client=None):
     # We assume that md5 MetaWorkflows have name "md5". We have a similar strong assumption in Tibanna.
+    # Searched through portal_client if given, e.g. to use its cache
     query = f"/search/?type=MetaWorkflow&name=md5"
-    search_results = ff_utils.search_metadata(query, key=my_auth)
+    if portal_client is not None:
+        search_results = portal_client.search_metadata(query)
+    else:
+        search_results = ff_utils.search_metadata(query, key=my_auth)
     
     if len(search_results) == 0:
         return None
@@ -28,7 +285,6 @@ def get_latest_md5_mwf(my_auth):
             latest_md5_item = search_result
     return latest_md5_item
 
-# Unused right now - maybe useful later
 def paginate_list(list, page_size):
     """ 
     Paginate a list. Example:
@@ -43,3 +299,107 @@ def string_to_list(string):
         values = string.replace(a_sep, ",")
     values = [i.strip() for i in values.split(',') if i]
     return values
+
+
+def add_search_fields(query, fields):
+    """Project a search query to the given fields, keeping any fields
+    already requested.
+    """
+    requested = set(ff_utils.get_url_params(query).get("field", []))
+    return query + "".join(
+        "&field=" + field for field in fields if field not in requested
+    )
+
+
+class MetaWorkflowRunsFound:
+    """Helper class to hold MetaWorkflowRuns' information.
+
+    Search results are streamed page by page with only UUIDs and titles
+    requested, and MetaWorkflowRuns are de-duplicated by UUID in a dict
+    of UUID to title, kept in order found.
+    """
+
+    __slots__ = ("key", "page_limit", "_titles_by_uuid")
+
+    FIELDS = ("uuid", "title")
+
+    def __init__(self, connection, page_limit=SEARCH_PAGE_LIMIT):
+        self.key = connection.ff_keys
+        self.page_limit = page_limit
+        self._titles_by_uuid = {}
+
+    def __len__(self):
+        return len(self._titles_by_uuid)
+
+    def __bool__(self):
+        return bool(self._titles_by_uuid)
+
+    def __contains__(self, uuid):
+        return uuid in self._titles_by_uuid
+
+    def __iter__(self):
+        """Lazily yield (UUID, title) of MetaWorkflowRuns in order found."""
+        return iter(self._titles_by_uuid.items())
+
+    @property
+    def uuids(self):
+        return list(self._titles_by_uuid)
+
+    @property
+    def titles(self):
+        return list(self._titles_by_uuid.values())
+
+    def iter_uuids(self):
+        """Lazily yield UUIDs of MetaWorkflowRuns in order found."""
+        return iter(self._titles_by_uuid)
+
+    def add_item(self, meta_workflow_run):
+        """Add a MetaWorkflowRun if not already present.
+
+        Items without a UUID are skipped.
+
+        :param meta_workflow_run: MetaWorkflowRun properties
+        :type meta_workflow_run: dict
+        :returns: Whether the MetaWorkflowRun was added
+        :rtype: bool
+        """
+        uuid = meta_workflow_run.get("uuid")
+        if not uuid or not isinstance(uuid, str) or uuid in self._titles_by_uuid:
+            return False
+        self._titles_by_uuid[uuid] = meta_workflow_run.get("title")
+        return True
+
+    def add_items(self, meta_workflow_runs):
+        """Grab UUIDs and titles and update attributes.
+
+        :param meta_workflow_runs: MetaWorkflowRuns' properties
+        :type meta_workflow_runs: iterable(dict)
+        """
+        for meta_workflow_run in meta_workflow_runs:
+            self.add_item(meta_workflow_run)
+
+    def search_final_status(self, final_status):
+        """Find MetaWorkflowRuns matching final status values and
+        update attributes
+
+        :param final_status: Valid final_status values
+        :type final_status: list(str)
+        """
+        query = "/search/?type=MetaWorkflowRun"
+        query += "".join("&final_status=" + status for status in final_status)
+        self.search_query(query)
+
+    def search_query(self, query):
+        """Stream MetaWorkflowRuns matching the query and update
+        attributes.
+
+        :param query: Search query
+        :type query: str
+        """
+        search_results = ff_utils.search_metadata(
+            add_search_fields(query, self.FIELDS),
+            key=self.key,
+            page_limit=self.page_limit,
+            is_generator=True,
+        )
+        self.add_items(search_results)
@@ -1,8 +1,24 @@
 import json
 from datetime import datetime
-# from dcicutils import ff_utils
+from urllib.parse import quote
+from dcicutils import ff_utils
 # from dcicutils.s3_utils import s3Utils
 # from packaging import version
+from .utils import PortalClient, chunk_ids, is_uuid, validate_items_existence, SEARCH_CHUNK_SIZE
+
+# Donor properties needed to select and tag donors with released files
+DONOR_FIELDS = [
+    "uuid", "tags", "study", "external_id", "accession", "@id", "protected_donor.uuid",
+    "last_modified.date_modified",
+]
+# Publication properties compared with external metadata by prepare_pub_metadata
+PUBLICATION_FIELDS = [
+    "uuid", "accession", "doi", "consortia", "pubmed_id", "is_preprint", "journal",
+    "journal_url", "repository_urls", "title", "abstract", "authors", "date_published",
+    "preprint_version",
+]
+# Max terms the portal returns for a facet; a facet this full may be truncated
+FACET_TERMS_LIMIT = 100
 
 
 def item_has_property_with_value(item, property_name, property_value=None, compare_lists=False):
@@ -62,3 +78,161 @@ def include_items_with_properties(items, properties={}):
         ):
             ok_items.append(item)
     return ok_items
+
+
+def get_linked_uuid(item, property_name):
+    """UUID of a linked item, whether embedded or given as a UUID."""
+    linked_item = item.get(property_name)
+    if isinstance(linked_item, dict):
+        return linked_item.get("uuid")
+    return linked_item
+
+
+def get_donors_with_protected_donors(donor_uuids, connection, rate_limiter=None, cache=None):
+    """Get compact donor records and their protected donors with
+    field-projected multi-UUID searches.
+
+    Returns (donors, dict of protected donor UUID to protected donor).
+    """
+    donors, _ = validate_items_existence(
+        donor_uuids, connection, item_type="Donor", fields=DONOR_FIELDS,
+        rate_limiter=rate_limiter, cache=cache,
+    )
+    protected_donor_uuids = list(dict.fromkeys(
+        get_linked_uuid(donor, "protected_donor")
+        for donor in donors if donor.get("protected_donor")
+    ))
+    protected_donors, _ = validate_items_existence(
+        protected_donor_uuids, connection, item_type="ProtectedDonor", fields=DONOR_FIELDS,
+        rate_limiter=rate_limiter, cache=cache,
+    )
+    return donors, {donor.get("uuid"): donor for donor in protected_donors}
+
+
+def get_facet_terms(search_response, field, terms_limit=FACET_TERMS_LIMIT):
+    """Terms of a search response facet on field.
+
+    Returns None if the facet is missing, reports terms left out or has
+    as many terms as the portal returns at most, as the facet cannot
+    then be relied on for the full set of values.
+    """
+    for facet in search_response.get("facets", []):
+        if facet.get("field") != field:
+            continue
+        terms = facet.get("terms", [])
+        if facet.get("other_doc_count") or len(terms) >= terms_limit:
+            return None
+        return terms
+    return None
+
+
+def get_linked_uuids(query, linked_field, connection, rate_limiter=None):
+    """Distinct UUIDs of items linked to through linked_field by items
+    matching the search query.
+
+    Asks the portal for a facet on "<linked_field>.uuid" so that only the
+    distinct values are returned; falls back to fetching the matching
+    items projected to that field if the facet is unavailable or may be
+    truncated.
+    """
+    uuid_field = linked_field + ".uuid"
+    facet_query = query + "&limit=0&additional_facet=" + uuid_field
+    with PortalClient(connection, rate_limiter=rate_limiter) as portal_client:
+        portal_client.acquire("search")
+        try:
+            search_response = ff_utils.get_response_json(portal_client.request(facet_query))
+            terms = get_facet_terms(search_response, uuid_field)
+        except Exception:
+            terms = None
+        if terms is not None:
+            return [
+                term["key"] for term in terms
+                if term.get("doc_count") and is_uuid(term.get("key"))
+            ]
+        items = portal_client.iter_search(query + "&field=" + uuid_field)
+        return list(dict.fromkeys(
+            linked_item["uuid"]
+            for item in items
+            for linked_item in item.get(linked_field, [])
+            if "uuid" in linked_item
+        ))
+
+
+def get_date_modified(item):
+    """Last modification timestamp of an item, if any."""
+    return (item.get("last_modified") or {}).get("date_modified")
+
+
+def get_modified_item_uuids(item_uuids, dates_modified, connection, chunk_size=SEARCH_CHUNK_SIZE):
+    """UUIDs of items modified since the recorded timestamps, as read
+    from multi-UUID searches projected to last_modified.date_modified.
+
+    Items without a recorded timestamp, not returned by the searches, or
+    in a search that failed are treated as modified; no items are
+    retrieved individually.
+
+    :param dates_modified: Recorded last_modified.date_modified by UUID
+    :type dates_modified: dict
+    """
+    queries = [
+        "/search/?type=Item&field=uuid&field=last_modified.date_modified"
+        + "".join("&uuid=" + item_uuid for item_uuid in uuid_chunk)
+        for uuid_chunk in chunk_ids(
+            [item_uuid for item_uuid in dict.fromkeys(item_uuids) if dates_modified.get(item_uuid)],
+            chunk_size=chunk_size,
+        )
+    ]
+    current = {}
+    with PortalClient(connection) as portal_client:
+        for _, search_results, error in portal_client.search_concurrently(queries):
+            for item in search_results or []:
+                current[item.get("uuid")] = get_date_modified(item)
+    return [
+        item_uuid for item_uuid in item_uuids
+        if not dates_modified.get(item_uuid)
+        or current.get(item_uuid) != dates_modified[item_uuid]
+    ]
+
+
+def get_publications(
+    dois, accessions, connection, chunk_size=SEARCH_CHUNK_SIZE, rate_limiter=None
+):
+    """Existing publications with the given DOIs or accessions, from
+    field-projected multi-valued searches.
+
+    Accessions of publications not found by DOI are searched separately.
+
+    Returns (dict of lowercased DOI to list of publications, dict of
+    accession to publication).
+    """
+    fields = "".join("&field=" + field for field in PUBLICATION_FIELDS)
+    queries = [
+        "/search/?type=Publication" + fields + "".join(
+            "&doi=" + quote(doi, safe="") for doi in doi_chunk
+        )
+        for doi_chunk in chunk_ids(list(dict.fromkeys(dois)), chunk_size=chunk_size)
+    ]
+    publications = []
+    with PortalClient(connection, rate_limiter=rate_limiter) as portal_client:
+        for query, search_results, error in portal_client.search_concurrently(queries):
+            if error:
+                raise error
+            publications.extend(search_results)
+    found_accessions = {publication.get("accession") for publication in publications}
+    missing_accessions = [
+        accession for accession in dict.fromkeys(accessions)
+        if accession not in found_accessions
+    ]
+    if missing_accessions:
+        by_accession, _ = validate_items_existence(
+            missing_accessions, connection, item_type="Publication", fields=PUBLICATION_FIELDS,
+            rate_limiter=rate_limiter,
+        )
+        publications.extend(by_accession)
+    publications_by_doi = {}
+    for publication in publications:
+        if publication.get("doi"):
+            publications_by_doi.setdefault(publication["doi"].lower(), []).append(publication)
+    return publications_by_doi, {
+        publication.get("accession"): publication for publication in publications
+    }
@@ -2,6 +2,7 @@ import datetime
 from dcicutils import ff_utils
 from dcicutils.s3_utils import s3Utils
 from .helpers import lifecycle_utils
+from .helpers.utils import find_s3_objects, get_action_checkpoint, continue_action
 from .helpers.wfrset_utils import LAMBDA_LIMIT
 
 # Use confchecks to import decorators object and its methods for each check module
@@ -70,8 +71,11 @@ def patch_file_lifecycle_status(connection, **kwargs):
     action_logs["logs"] = []
     action_logs["error"] = []
 
+    # A continuation only resumes tagging the files remaining from the previous run
+    checkpoint = get_action_checkpoint(check_output)
+
     # update the last_checked property of files that do not require lifecycle update
-    files_without_update = check_output.get("files_without_update", [])
+    files_without_update = [] if checkpoint else check_output.get("files_without_update", [])
     for file_uuid in files_without_update:
         today = datetime.date.today().strftime("%Y-%m-%d")
         patch_dict = {
@@ -80,11 +84,27 @@ def patch_file_lifecycle_status(connection, **kwargs):
         ff_utils.patch_metadata(patch_dict, file_uuid, key=my_auth)
 
 
-    files = check_output.get("files_to_update", [])
-    for file in files:
+    files = checkpoint.get("remaining", []) if checkpoint else check_output.get("files_to_update", [])
+    # Before tagging the files, we need to verify that they actually exist on S3. However, the correct
+    # bucket cannot be easily inferred from the file meta data currently. Most files will be
+    # in the out_bucket, so resolve all locations up front in bulk.
+    s3_objects = find_s3_objects(
+        my_s3_util.s3, [file["upload_key"] for file in files], [out_bucket, raw_bucket]
+    )
+    for idx, file in enumerate(files):
         now = lifecycle_utils.get_datetime_utcnow()
         if (now-start).seconds > LAMBDA_LIMIT:
             action_logs["logs"].append('Did not complete action due to time limitations')
+            try:
+                continuation = continue_action(connection, action, kwargs, files[idx:], idx)
+            except Exception as e:
+                action_logs["error"].append(str(e))
+                break
+            if continuation:
+                action_logs["logs"].append(
+                    f'Continuing action on {len(files) - idx} remaining files '
+                    f'(continuation {continuation["continuation"]})'
+                )
             break
 
         uuid = file["uuid"]
@@ -93,16 +113,9 @@ def patch_file_lifecycle_status(connection, **kwargs):
         new_lifecycle_status = file["new_lifecycle_status"]
         is_extra_file = file["is_extra_file"]
 
-        # Before tagging the file, we need to verify that it actually exists on S3. However, the correct
-        # bucket cannot be easily inferred from the file meta data currently. Most files will be
-        # in the out_bucket.
         file_bucket = None
-        if my_s3_util.does_key_exist(upload_key, bucket=out_bucket, print_error=False):
-            file_bucket = out_bucket
-        elif my_s3_util.does_key_exist(
-            upload_key, bucket=raw_bucket, print_error=False
-        ):
-            file_bucket = raw_bucket
+        if upload_key in s3_objects:
+            file_bucket = s3_objects[upload_key].bucket
 
         try:
             s3_tag = lifecycle_utils.lifecycle_status_to_s3_tag(new_lifecycle_status)
@@ -18,6 +18,7 @@ from dcicutils import (
 # individually - they're now part of class Decorators in foursight-core::decorators
 # that requires initialization with foursight prefix.
 from .helpers.confchecks import *
+from .helpers import indexing_utils
 
 
 @check_function()
@@ -151,34 +152,50 @@ def status_of_elasticsearch_indices(connection, **kwargs):
 @check_function()
 def indexing_progress(connection, **kwargs):
     check = CheckResult(connection, 'indexing_progress')
-    # get latest and db/es counts closest to 10 mins ago
     counts_check = CheckResult(connection, 'item_counts_by_type')
-    latest = counts_check.get_primary_result()
-    prior = counts_check.get_closest_result(diff_mins=30)
-    if not latest.get('full_output') or not prior.get('full_output'):
+    latest_sample = indexing_utils.counts_result_to_sample(counts_check.get_primary_result())
+    if latest_sample is None:
         check.status = 'ERROR'
         check.description = 'There are no item_counts_by_type results to run this check with.'
         return check
-    latest_unindexed = latest['full_output']['ALL']['DB'] - latest['full_output']['ALL']['ES']
-    prior_unindexed = prior['full_output']['ALL']['DB'] - prior['full_output']['ALL']['ES']
-    diff_unindexed = latest_unindexed - prior_unindexed
-    if diff_unindexed == 0 and latest_unindexed != 0:
+    # rolling history of db/es counts is carried over from the previous run of this check,
+    # or seeded with the counts closest to thirty minutes ago
+    previous_output = (check.get_latest_result() or {}).get('full_output')
+    history = previous_output.get('history', []) if isinstance(previous_output, dict) else []
+    if not history:
+        try:
+            prior = counts_check.get_closest_result(diff_mins=30)
+        except Exception:
+            prior = None
+        history = indexing_utils.add_sample([], indexing_utils.counts_result_to_sample(prior))
+    history = indexing_utils.add_sample(history, latest_sample)
+    summaries = indexing_utils.summarize_indexing(history)
+    total = summaries['ALL']
+    check.full_output = {'summary': summaries, 'history': history}
+    stalled_types = [item_type for item_type, summary in summaries.items()
+                     if summary['stalled'] and item_type != 'ALL']
+    if stalled_types:
+        check.brief_output = {'stalled': stalled_types}
+    throughput = '%s items/min' % total['throughput'] if total['throughput'] is not None else 'unknown'
+    if total['stalled']:
         check.status = 'FAIL'
         check.summary = 'Indexing is not progressing'
-        check.description = ' '.join(['Total number of unindexed items is',
-            str(latest_unindexed), 'and has not changed in the past thirty minutes.',
-            'The indexer may be malfunctioning.'])
-    elif diff_unindexed > 0:
+        check.description = ' '.join(['Total number of unindexed items is', str(total['backlog']),
+            'and no items were indexed over the last', str(indexing_utils.STALL_SAMPLES),
+            'counts samples. The indexer may be malfunctioning.'])
+    elif total['backlog_growth'] is not None and total['backlog_growth'] > 0:
         check.status = 'PASS'
         check.summary = 'Indexing load has increased'
-        check.description = ' '.join(['Total number of unindexed items has increased by',
-            str(diff_unindexed), 'in the past thirty minutes. Remaining items to index:',
-            str(latest_unindexed)])
+        check.description = ' '.join(['Total number of unindexed items is growing by',
+            str(total['backlog_growth']), 'items/min, indexing at', throughput + '.',
+            'Remaining items to index:', str(total['backlog'])])
     else:
+        eta = total['eta_minutes']
         check.status = 'PASS'
         check.summary = 'Indexing seems healthy'
-        check.description = ' '.join(['Indexing seems healthy. There are', str(latest_unindexed),
-        'remaining items to index, a change of', str(diff_unindexed), 'from thirty minutes ago.'])
+        check.description = ' '.join(['Indexing seems healthy. There are', str(total['backlog']),
+            'remaining items to index, indexing at', throughput + '.',
+            'Estimated time to catch up:', 'unknown' if eta is None else '%s minutes' % eta])
     return check
 
 
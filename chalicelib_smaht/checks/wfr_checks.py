@@ -1,6 +1,6 @@
 import random
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from dcicutils import ff_utils
 from dcicutils.s3_utils import s3Utils
@@ -13,9 +13,21 @@ from magma_smaht import reset_metawfr, run_metawfr, status_metawfr, create_metaw
 from .helpers import constants
 from .helpers.wfr_utils import (
     get_latest_md5_mwf,
-    get_md5_mwfrs_for_file
+    get_md5_mwfrs_for_files,
+    get_job_ids_with_new_logs,
+    get_job_ids_modified_since,
+    get_running_job_ids,
+    get_latest_watermarks,
+    select_changed_meta_workflow_runs,
+    get_workflow_run_descriptions,
+    get_failed_job_ids,
+    get_spot_failed_shards,
+    MetaWorkflowRunsFound,
+    get_meta_workflow_runs_query,
+    paginate_list,
+    WATERMARK_FORMAT,
 )
-from .helpers.confchecks import action_function, check_function
+from .helpers.confchecks import ActionResult, action_function, check_function
 from .helpers.utils import (
     initialize_check,
     initialize_action,
@@ -25,6 +37,13 @@ from .helpers.utils import (
     make_embed_request,
     get_step_function_name,
     is_past_time_limit,
+    PortalClient,
+    PORTAL_CACHE,
+    find_s3_objects,
+    run_concurrently,
+    get_action_checkpoint,
+    continue_action,
+    DEFAULT_MAX_WORKERS,
 )
 from .helpers.wfrset_utils import LAMBDA_LIMIT
 
@@ -46,48 +65,10 @@ FINAL_STATUS_TO_KILL = [
     constants.MWFR_FAILED,
 ]
 SPOT_FAILURE_DESCRIPTIONS = ["EC2 unintended termination", "EC2 Idle error"]
-
-
-class MetaWorkflowRunsFound:
-    """Helper class to hold MetaWorkflowRuns' information."""
-
-    def __init__(self, connection):
-        self.key = connection.ff_keys
-        self.uuids = []
-        self.titles = []
-
-    def add_items(self, meta_workflow_runs):
-        """Grab UUIDs and titles and update attributes.
-
-        :param meta_workflow_runs: MetaWorkflowRuns' properties
-        :type meta_workflow_runs: list(dict)
-        """
-        for meta_workflow_run in meta_workflow_runs:
-            uuid = meta_workflow_run.get("uuid")
-            self.uuids.append(uuid)
-            title = meta_workflow_run.get("title")
-            self.titles.append(title)
-
-    def search_final_status(self, final_status):
-        """Find MetaWorkflowRuns matching final status values and
-        update attributes
-
-        :param final_status: Valid final_status values
-        :type final_status: list(str)
-        """
-        query = "/search/?type=MetaWorkflowRun&field=uuid&field=title"
-        query += "".join("&final_status=" + status for status in final_status)
-        self.search_query(query)
-
-    def search_query(self, query):
-        """Find MetaWorkflowRuns matching the query and update
-        attributes.
-
-        :param query: Search query
-        :type query: str
-        """
-        search_response = ff_utils.search_metadata(query, key=self.key)
-        self.add_items(search_response)
+# Max seconds to wait on a single MetaWorkflowRun in the actions below
+MWFR_TASK_TIMEOUT = 300
+# Overlap between status check windows, to allow for indexing lag
+WATERMARK_OVERLAP = timedelta(minutes=5)
 
 
 @check_function(file_type="File", start_date=None, max_files=300, action="md5run_start")
@@ -138,29 +119,49 @@ def md5run_status(connection, file_type="", start_date=None, max_files=50, **kwa
     my_s3_util = s3Utils(env=env)
     raw_bucket = my_s3_util.raw_file_bucket
     out_bucket = my_s3_util.outfile_bucket
-    md5_mwf = get_latest_md5_mwf(my_auth)
+    # the md5 MetaWorkflow rarely changes, so it is read through the cache shared in a warm Lambda
+    portal_cache = PORTAL_CACHE.for_run()
+    with PortalClient(connection, cache=portal_cache) as portal_client:
+        md5_mwf = get_latest_md5_mwf(my_auth, portal_client=portal_client)
+    check.full_output["portal_cache"] = portal_cache.stats()
     if not md5_mwf:
         check.status = constants.CHECK_FAIL
         check.summary = "Unable to identify suitable MD5 MetaWorkflow. Has the pipeline been deployed?"
         check.allow_action = False
         return check
+    # Carried to the action so it does not need to search for it again
+    check.full_output["md5_meta_workflow"] = {
+        "uuid": md5_mwf["uuid"],
+        "version": md5_mwf.get("version"),
+    }
 
+    md5_mwfrs_by_file = get_md5_mwfrs_for_files(my_auth, [a_file["uuid"] for a_file in res])
+    # find bucket
+    upload_keys_by_bucket = {}
+    for a_file in res:
+        if "OutputFile" in a_file["@type"]:
+            my_bucket = out_bucket
+        else:  # covers cases of SubmittedFile, ReferenceFile
+            my_bucket = raw_bucket
+        upload_keys_by_bucket.setdefault(my_bucket, []).append(a_file["upload_key"])
+    # check which files are in s3
+    s3_objects_by_bucket = {
+        bucket: find_s3_objects(my_s3_util.s3, upload_keys, [bucket])
+        for bucket, upload_keys in upload_keys_by_bucket.items()
+    }
     for a_file in res:
         if is_past_time_limit(start, LAMBDA_LIMIT):
             check.brief_output.append("Did not complete due to time limitations")
             break
-        # find bucket
         if "OutputFile" in a_file["@type"]:
             my_bucket = out_bucket
-        else:  # covers cases of SubmittedFile, ReferenceFile
+        else:
             my_bucket = raw_bucket
-        # check if file is in s3
         file_id = a_file["uuid"]
-        head_info = my_s3_util.does_key_exist(a_file["upload_key"], my_bucket)
-        if not head_info:
+        if a_file["upload_key"] not in s3_objects_by_bucket[my_bucket]:
             no_s3_file.append(file_id)
             continue
-        md5_mwfrs_for_file = get_md5_mwfrs_for_file(my_auth, a_file["uuid"])
+        md5_mwfrs_for_file = md5_mwfrs_by_file.get(file_id, [])
         if len(md5_mwfrs_for_file) == 0:
             missing_md5.append(file_id)
         elif len(md5_mwfrs_for_file) == 1:
@@ -209,8 +210,14 @@ def md5run_status(connection, file_type="", start_date=None, max_files=50, **kwa
     return check
 
 
-@action_function(start_missing=True, start_not_switched=True)
-def md5run_start(connection, start_missing=True, start_not_switched=True, **kwargs):
+@action_function(start_missing=True, start_not_switched=True, concurrency=DEFAULT_MAX_WORKERS)
+def md5run_start(
+    connection,
+    start_missing=True,
+    start_not_switched=True,
+    concurrency=DEFAULT_MAX_WORKERS,
+    **kwargs
+):
     """Start MD5 checksums on Files or update File MD5 checksum status"""
     start = datetime.utcnow()
     action, check_result = initialize_action("md5run_start", connection, kwargs)
@@ -218,21 +225,25 @@ def md5run_start(connection, start_missing=True, start_not_switched=True, **kwar
     targets = []
     runs_started = {}
     runs_failed = {}
-    if start_missing:
-        targets.extend(check_result.get("files_without_md5run", []))
-    if start_not_switched:
-        targets.extend(check_result.get("files_with_run_and_wrong_status", []))
+    checkpoint = get_action_checkpoint(check_result)
+    if checkpoint:
+        targets.extend(checkpoint.get("remaining", []))
+    else:
+        if start_missing:
+            targets.extend(check_result.get("files_without_md5run", []))
+        if start_not_switched:
+            targets.extend(check_result.get("files_with_run_and_wrong_status", []))
     action.output["targets"] = targets
-    md5_mwf = get_latest_md5_mwf(my_auth) # We already checked the existence of this in the check
-    md5_mwf_uuid = md5_mwf["uuid"]
+    md5_mwf_uuid = check_result.get("md5_meta_workflow", {}).get("uuid")
+    if not md5_mwf_uuid:  # Check results from before the MetaWorkflow was stored
+        with PortalClient(connection, cache=PORTAL_CACHE) as portal_client:
+            md5_mwf_uuid = get_latest_md5_mwf(my_auth, portal_client=portal_client)["uuid"]
     action.output["md5_workflow_uuid"] = md5_mwf_uuid
-    
-    for target_file in targets:
-        if is_past_time_limit(start, LAMBDA_LIMIT):
-            action.description = "Did not complete action due to time limitations"
-            break
 
-        input_arg = "input_files"
+    input_arg = "input_files"
+    portal_client = PortalClient(connection, max_workers=concurrency)
+
+    def start_md5_run(target_file):
         input = [{
             'argument_name': input_arg,
             'argument_type': "file",
@@ -241,17 +252,47 @@ def md5run_start(connection, start_missing=True, start_not_switched=True, **kwar
                 'dimension': "0"
             }]
         }]
-        
+        mwfr = create_metawfr.mwfr_from_input(md5_mwf_uuid, input, input_arg, my_auth)
+        post_response = portal_client.post_metadata(mwfr, "MetaWorkflowRun")
+        return post_response["@graph"][0]["accession"]
+
+    submission_start = datetime.utcnow()
+    with portal_client:
+        for target_file, accession, error in portal_client.as_completed(
+            start_md5_run,
+            targets,
+            should_stop=lambda: is_past_time_limit(start, LAMBDA_LIMIT),
+        ):
+            if error:
+                runs_failed[target_file] = str(error)  # Failure is error message
+            else:
+                runs_started[target_file] = accession  # Success is MWFR accession
+    elapsed = (datetime.utcnow() - submission_start).total_seconds()
+    remaining = [
+        target for target in targets
+        if target not in runs_started and target not in runs_failed
+    ]
+    if remaining:
+        action.description = "Did not complete action due to time limitations"
         try:
-            mwfr = create_metawfr.mwfr_from_input(md5_mwf_uuid, input, input_arg, my_auth)
-            post_response = ff_utils.post_metadata(mwfr, "MetaWorkflowRun", my_auth)
-            runs_started[target_file] = post_response["@graph"][0]["accession"] # Success is MWFR accession
+            continuation = continue_action(
+                connection,
+                action,
+                dict(kwargs, concurrency=concurrency),
+                remaining,
+                len(targets) - len(remaining),
+            )
         except Exception as e:
-            runs_failed[target_file] = str(e) # Failure is error message
-        
+            continuation = None
+            action.output["continuation_error"] = str(e)
+        if continuation:
+            action.description = "Continuing action on %s remaining File(s)" % len(remaining)
+            action.output["continuation"] = continuation["continuation"]
+
     action.output["runs_started"] = runs_started
     action.output["runs_failed"] = runs_failed
-    if not runs_failed:
+    action.output["runs_per_second"] = round(len(runs_started) / elapsed, 2) if elapsed else 0
+    if not runs_failed and "continuation_error" not in action.output:
         action.status = constants.ACTION_PASS
     return action
 
@@ -266,7 +307,7 @@ def metawfrs_to_run(connection, **kwargs):
     meta_workflow_runs = MetaWorkflowRunsFound(connection)
     meta_workflow_runs.search_final_status(FINAL_STATUS_TO_RUN)
     msg = "%s MetaWorkflowRun(s) may have WorkflowRuns to kick" % len(
-        meta_workflow_runs.uuids
+        meta_workflow_runs
     )
     check.summary = msg
     check.brief_output.append(msg)
@@ -274,100 +315,177 @@ def metawfrs_to_run(connection, **kwargs):
         "uuids": meta_workflow_runs.uuids,
         "titles": meta_workflow_runs.titles,
     }
-    if not meta_workflow_runs.uuids:
+    if not meta_workflow_runs:
         check.allow_action = False
         check.status = constants.CHECK_PASS
     return check
 
 
-@action_function()
-def run_metawfrs(connection, **kwargs):
+@action_function(concurrency=DEFAULT_MAX_WORKERS, task_timeout=MWFR_TASK_TIMEOUT)
+def run_metawfrs(
+    connection, concurrency=DEFAULT_MAX_WORKERS, task_timeout=MWFR_TASK_TIMEOUT, **kwargs
+):
     """Kick WorkflowRuns on MetaWorkflowRuns."""
     start = datetime.utcnow()
     action, check_result = initialize_action("run_metawfrs", connection, kwargs)
     action.description = "Start WorkflowRuns for MetaWorkflowRuns"
 
-    success = []
-    error = {}
     env = connection.fs_env
     step_function_name = get_step_function_name(connection)
     meta_workflow_runs = check_result.get("meta_workflow_runs", {})
     meta_workflow_run_uuids = meta_workflow_runs.get("uuids", [])
     random.shuffle(meta_workflow_run_uuids)  # Ensure later ones hit within time limits
-    for meta_workflow_run_uuid in meta_workflow_run_uuids:
-        if is_past_time_limit(start, LAMBDA_LIMIT):
-            action.description = "Did not complete action due to time limitations"
-            break
-        try:
-            run_metawfr.run_metawfr(
-                meta_workflow_run_uuid,
-                connection.ff_keys,
-                sfn=step_function_name,
-                env=env,
-                valid_status=FINAL_STATUS_TO_RUN,
-            )
-            success.append(meta_workflow_run_uuid)
-        except Exception as e:
-            error[meta_workflow_run_uuid] = str(e)
-    action.output["success"] = success
+
+    def run_meta_workflow_run(meta_workflow_run_uuid):
+        run_metawfr.run_metawfr(
+            meta_workflow_run_uuid,
+            connection.ff_keys,
+            sfn=step_function_name,
+            env=env,
+            valid_status=FINAL_STATUS_TO_RUN,
+        )
+
+    success, error, not_started = run_concurrently(
+        run_meta_workflow_run,
+        meta_workflow_run_uuids,
+        start=start,
+        time_limit=LAMBDA_LIMIT,
+        max_workers=concurrency,
+        task_timeout=task_timeout,
+    )
+    if not_started:
+        action.description = "Did not complete action due to time limitations"
+    action.output["success"] = list(success)
     action.output["error"] = error
     if not error:
         action.status = constants.ACTION_PASS
     return action
 
 
-@check_function(action="checkstatus_metawfrs")
-def metawfrs_to_checkstatus(connection, **kwargs):
-    """Find MetaWorkflowRuns that may require a status check."""
+@check_function(full_sweep_hours=6, action="checkstatus_metawfrs")
+def metawfrs_to_checkstatus(connection, full_sweep_hours=6, **kwargs):
+    """Find MetaWorkflowRuns that may require a status check.
+
+    Only MetaWorkflowRuns with running WorkflowRuns that changed since
+    the last check (new objects in the Tibanna output bucket or portal
+    updates) are selected, except for a full sweep of all running
+    MetaWorkflowRuns every full_sweep_hours.
+
+    The watermark (and full sweep time) only advances once the selected
+    MetaWorkflowRuns are handled: immediately if none are selected,
+    otherwise when checkstatus_metawfrs processes all of them without
+    errors. Until then, later checks select again from the previous
+    watermark.
+
+    kwargs:
+        full_sweep_hours -- hours between checks of all running
+            MetaWorkflowRuns
+    """
+    check_start = datetime.utcnow()
     check = initialize_check("metawfrs_to_checkstatus", connection)
     check.action = "checkstatus_metawfrs"
     check.description = "Find MetaWorkflowRuns with WorkflowRuns to status check."
 
+    previous_output = (check.get_latest_result() or {}).get("full_output")
+    previous_action = ActionResult(connection, "checkstatus_metawfrs").get_latest_result() or {}
+    watermark, last_full_sweep = get_latest_watermarks(
+        previous_output, previous_action.get("output")
+    )
+    full_sweep = (
+        not watermark
+        or not last_full_sweep
+        or check_start - datetime.strptime(last_full_sweep, WATERMARK_FORMAT)
+        > timedelta(hours=full_sweep_hours)
+    )
+    query = (
+        "/search/?type=MetaWorkflowRun&field=uuid&field=title"
+        "&field=workflow_runs.job_id&field=workflow_runs.status"
+    )
+    query += "".join("&final_status=" + status for status in FINAL_STATUS_TO_CHECK)
+    running_meta_workflow_runs = ff_utils.search_metadata(query, key=connection.ff_keys)
+    if full_sweep:
+        changed_meta_workflow_runs = running_meta_workflow_runs
+    else:
+        since = datetime.strptime(watermark, WATERMARK_FORMAT) - WATERMARK_OVERLAP
+        s3_utils = s3Utils(env=connection.fs_env)
+        changed_job_ids = get_job_ids_with_new_logs(
+            s3_utils.s3,
+            s3_utils.tibanna_output_bucket,
+            get_running_job_ids(running_meta_workflow_runs),
+            since,
+        )
+        changed_job_ids |= get_job_ids_modified_since(connection.ff_keys, since)
+        changed_meta_workflow_runs = select_changed_meta_workflow_runs(
+            running_meta_workflow_runs, changed_job_ids
+        )
     meta_workflow_runs = MetaWorkflowRunsFound(connection)
-    meta_workflow_runs.search_final_status(FINAL_STATUS_TO_CHECK)
+    meta_workflow_runs.add_items(changed_meta_workflow_runs)
     msg = "%s MetaWorkflowRun(s) may have WorkflowRuns to status check" % len(
-        meta_workflow_runs.uuids
+        meta_workflow_runs
     )
     check.summary = msg
     check.brief_output.append(msg)
+    check.brief_output.append(
+        "%s running MetaWorkflowRun(s) in total%s"
+        % (len(running_meta_workflow_runs), " (full sweep)" if full_sweep else "")
+    )
     check.full_output["meta_workflow_runs"] = {
         "uuids": meta_workflow_runs.uuids,
         "titles": meta_workflow_runs.titles,
     }
-    if not meta_workflow_runs.uuids:
+    # Committed by the action once all selected MetaWorkflowRuns are handled
+    pending_watermarks = {
+        "watermark": check_start.strftime(WATERMARK_FORMAT),
+        "last_full_sweep": (
+            check_start.strftime(WATERMARK_FORMAT) if full_sweep else last_full_sweep
+        ),
+    }
+    check.full_output["pending_watermarks"] = pending_watermarks
+    check.full_output["watermark"] = watermark
+    check.full_output["last_full_sweep"] = last_full_sweep
+    if not meta_workflow_runs:
+        check.full_output.update(pending_watermarks)
         check.allow_action = False
         check.status = constants.CHECK_PASS
     return check
 
 
-@action_function()
-def checkstatus_metawfrs(connection, **kwargs):
+@action_function(concurrency=DEFAULT_MAX_WORKERS, task_timeout=MWFR_TASK_TIMEOUT)
+def checkstatus_metawfrs(
+    connection, concurrency=DEFAULT_MAX_WORKERS, task_timeout=MWFR_TASK_TIMEOUT, **kwargs
+):
     """Check WorkflowRuns' status on MetaWorkflowRuns."""
     start = datetime.utcnow()
     action, check_result = initialize_action("checkstatus_metawfrs", connection, kwargs)
     action.description = "Update WorkflowRuns' status on MetaWorkflowRuns"
 
-    success = []
-    error = {}
     meta_workflow_runs = check_result.get("meta_workflow_runs", {})
     meta_workflow_run_uuids = meta_workflow_runs.get("uuids", [])
     random.shuffle(meta_workflow_run_uuids)  # Ensure later ones hit within time limits
-    for meta_workflow_run_uuid in meta_workflow_run_uuids:
-        if is_past_time_limit(start, LAMBDA_LIMIT):
-            action.description = "Did not complete action due to time limitations"
-            break
-        try:
-            status_metawfr.status_metawfr(
-                meta_workflow_run_uuid,
-                connection.ff_keys,
-                env=connection.fs_env,
-                valid_status=FINAL_STATUS_TO_CHECK,
-            )
-            success.append(meta_workflow_run_uuid)
-        except Exception as e:
-            error[meta_workflow_run_uuid] = str(e)
-    action.output["success"] = success
+
+    def status_meta_workflow_run(meta_workflow_run_uuid):
+        status_metawfr.status_metawfr(
+            meta_workflow_run_uuid,
+            connection.ff_keys,
+            env=connection.fs_env,
+            valid_status=FINAL_STATUS_TO_CHECK,
+        )
+
+    success, error, not_started = run_concurrently(
+        status_meta_workflow_run,
+        meta_workflow_run_uuids,
+        start=start,
+        time_limit=LAMBDA_LIMIT,
+        max_workers=concurrency,
+        task_timeout=task_timeout,
+    )
+    if not_started:
+        action.description = "Did not complete action due to time limitations"
+    action.output["success"] = list(success)
     action.output["error"] = error
+    if not error and not not_started:
+        # All selected MetaWorkflowRuns handled, so the check may move on
+        action.output.update(check_result.get("pending_watermarks", {}))
     if not error:
         action.status = constants.ACTION_PASS
     return action
@@ -387,7 +505,7 @@ def spot_failed_metawfrs(connection, **kwargs):
     meta_workflow_runs = MetaWorkflowRunsFound(connection)
     meta_workflow_runs.search_final_status(FINAL_STATUS_TO_RESET)
     msg = "%s MetaWorkflowRun(s) may have spot-failed WorkflowRuns to reset" % len(
-        meta_workflow_runs.uuids
+        meta_workflow_runs
     )
     check.summary = msg
     check.brief_output.append(msg)
@@ -395,14 +513,16 @@ def spot_failed_metawfrs(connection, **kwargs):
         "uuids": meta_workflow_runs.uuids,
         "titles": meta_workflow_runs.titles,
     }
-    if not meta_workflow_runs.uuids:
+    if not meta_workflow_runs:
         check.allow_action = False
         check.status = constants.CHECK_PASS
     return check
 
 
-@action_function()
-def reset_spot_failed_metawfrs(connection, **kwargs):
+@action_function(concurrency=DEFAULT_MAX_WORKERS, task_timeout=MWFR_TASK_TIMEOUT)
+def reset_spot_failed_metawfrs(
+    connection, concurrency=DEFAULT_MAX_WORKERS, task_timeout=MWFR_TASK_TIMEOUT, **kwargs
+):
     """Reset spot-failed WorkflowRuns on MetaWorkflowRuns."""
     start = datetime.utcnow()
     action, check_result = initialize_action(
@@ -410,80 +530,78 @@ def reset_spot_failed_metawfrs(connection, **kwargs):
     )
     action.description = "Reset spot-failed WorkflowRuns on MetaWorkflowRuns"
 
-    success = {}
-    error = {}
     s3_utils = s3Utils(env=connection.fs_env)
     log_bucket = s3_utils.tibanna_output_bucket
     meta_workflow_runs = check_result.get("meta_workflow_runs", {})
     meta_workflow_run_uuids = meta_workflow_runs.get("uuids", [])
     random.shuffle(meta_workflow_run_uuids)  # Ensure later ones hit within time limits
-    for meta_workflow_run_uuid in meta_workflow_run_uuids:
-        if is_past_time_limit(start, LAMBDA_LIMIT):
-            action.description = "Did not complete action due to time limitations"
-            break
-        try:
-            shards_to_reset = []
-            meta_workflow_run = ff_utils.get_metadata(
+
+    # Gather failed WorkflowRuns on all MetaWorkflowRuns first, then look up
+    # their descriptions and spot failure markers in bulk
+    with PortalClient(connection, max_workers=concurrency) as portal_client:
+        meta_workflow_runs_found, error, not_fetched = run_concurrently(
+            lambda uuid: portal_client.get_metadata(
+                uuid, add_on="frame=raw&datastore=database"
+            ),
+            meta_workflow_run_uuids,
+            start=start,
+            time_limit=LAMBDA_LIMIT,
+            max_workers=concurrency,
+        )
+    meta_workflow_runs_to_check = {
+        uuid: meta_workflow_run
+        for uuid, meta_workflow_run in meta_workflow_runs_found.items()
+        if meta_workflow_run.get("status") not in ["deleted", "obsolete"]
+    }
+    failed_job_ids = [
+        job_id
+        for meta_workflow_run in meta_workflow_runs_to_check.values()
+        for job_id in get_failed_job_ids(meta_workflow_run)
+        if job_id
+    ]
+    descriptions = get_workflow_run_descriptions(connection.ff_keys, failed_job_ids)
+    spot_failure_markers = find_s3_objects(
+        s3_utils.s3,
+        [job_id + ".spot_failure" for job_id in failed_job_ids],
+        [log_bucket],
+        max_workers=concurrency,
+    )
+    spot_failure_job_ids = {
+        key[: -len(".spot_failure")] for key in spot_failure_markers
+    }
+
+    def reset_spot_failed_shards(meta_workflow_run_uuid):
+        shards_to_reset = get_spot_failed_shards(
+            meta_workflow_runs_to_check[meta_workflow_run_uuid],
+            descriptions,
+            spot_failure_job_ids,
+            SPOT_FAILURE_DESCRIPTIONS,
+        )
+        if shards_to_reset:
+            reset_metawfr.reset_shards(
                 meta_workflow_run_uuid,
-                add_on="frame=raw&datastore=database",
-                key=connection.ff_keys,
+                shards_to_reset,
+                connection.ff_keys,
+                valid_status=FINAL_STATUS_TO_RESET,
             )
-            meta_workflow_run_status = meta_workflow_run.get("status")
-            if meta_workflow_run_status in ["deleted", "obsolete"]:
-                continue
-            workflow_runs = meta_workflow_run.get("workflow_runs", [])
-            for workflow_run in workflow_runs:
-                workflow_run_status = workflow_run.get("status")
-                workflow_run_jobid = workflow_run.get("job_id")
-                workflow_run_shard = workflow_run.get("shard")
-                workflow_run_name = workflow_run.get("name")
-                if workflow_run_status == "failed":
-                    query = (
-                        "/search/?type=WorkflowRun&field=description"
-                        "&job_id=%s" % workflow_run_jobid
-                    )
-                    search_response = ff_utils.search_metadata(
-                        query, key=connection.ff_keys
-                    )
-                    if len(search_response) == 1:
-                        workflow_run_item = search_response[0]
-                    elif len(search_response) > 1:
-                        msg = (
-                            "Multiple WorkflowRun found for job ID: %s"
-                            % workflow_run_jobid
-                        )
-                        raise Exception(msg)
-                    else:
-                        msg = (
-                            "No WorkflowRun found for job ID: %s"
-                            % workflow_run_jobid
-                        )
-                        raise Exception(msg)
-                    workflow_run_description = workflow_run_item.get(
-                        "description"
-                    )
-                    spot_failure_descriptions = [
-                        spot_description in workflow_run_description
-                        for spot_description in SPOT_FAILURE_DESCRIPTIONS
-                    ]
-                    log_bucket_spot_failure = s3_utils.does_key_exist(
-                        key=workflow_run_jobid + ".spot_failure",
-                        bucket=log_bucket,
-                        print_error=False,
-                    )
-                    if log_bucket_spot_failure or any(spot_failure_descriptions):
-                        shard_name = workflow_run_name + ":" + str(workflow_run_shard)
-                        shards_to_reset.append(shard_name)
-            if shards_to_reset:
-                reset_metawfr.reset_shards(
-                    meta_workflow_run_uuid,
-                    shards_to_reset,
-                    connection.ff_keys,
-                    valid_status=FINAL_STATUS_TO_RESET,
-                )
-                success[meta_workflow_run_uuid] = {"shards_reset": shards_to_reset}
-        except Exception as e:
-            error[meta_workflow_run_uuid] = str(e)
+        return shards_to_reset
+
+    shards_reset, reset_error, not_started = run_concurrently(
+        reset_spot_failed_shards,
+        [uuid for uuid in meta_workflow_run_uuids if uuid in meta_workflow_runs_to_check],
+        start=start,
+        time_limit=LAMBDA_LIMIT,
+        max_workers=concurrency,
+        task_timeout=task_timeout,
+    )
+    error.update(reset_error)
+    if not_fetched or not_started:
+        action.description = "Did not complete action due to time limitations"
+    success = {
+        meta_workflow_run_uuid: {"shards_reset": shards}
+        for meta_workflow_run_uuid, shards in shards_reset.items()
+        if shards
+    }
     action.output["success"] = success
     action.output["error"] = error
     if not error:
@@ -502,13 +620,16 @@ def failed_metawfrs(connection, meta_workflow_runs=None, **kwargs):
     meta_workflow_runs_not_found = []
     if meta_workflow_runs:
         meta_workflow_runs = format_kwarg_list(meta_workflow_runs)
-        found, not_found = validate_items_existence(meta_workflow_runs, connection)
+        found, not_found = validate_items_existence(
+            meta_workflow_runs, connection, item_type="MetaWorkflowRun",
+            fields=MetaWorkflowRunsFound.FIELDS,
+        )
         meta_workflow_runs_found.add_items(found)
         meta_workflow_runs_not_found += not_found
     else:
         meta_workflow_runs_found.search_final_status(FINAL_STATUS_TO_RESET)
     msg = "%s MetaWorkflowRun(s) have failed WorkflowRuns to reset" % len(
-        meta_workflow_runs_found.uuids
+        meta_workflow_runs_found
     )
     check.summary = msg
     check.brief_output.append(msg)
@@ -522,15 +643,17 @@ def failed_metawfrs(connection, meta_workflow_runs=None, **kwargs):
         )
         check.brief_output.append(msg)
         check.full_output["not_found"] = meta_workflow_runs_not_found
-    if not meta_workflow_runs_found.uuids:
+    if not meta_workflow_runs_found:
         check.allow_action = False
         if not meta_workflow_runs_not_found:
             check.status = constants.CHECK_PASS
     return check
 
 
-@action_function()
-def reset_failed_metawfrs(connection, **kwargs):
+@action_function(concurrency=DEFAULT_MAX_WORKERS, task_timeout=MWFR_TASK_TIMEOUT)
+def reset_failed_metawfrs(
+    connection, concurrency=DEFAULT_MAX_WORKERS, task_timeout=MWFR_TASK_TIMEOUT, **kwargs
+):
     """Reset all failed WorkflowRuns on MetaWorkflowRuns."""
     start = datetime.utcnow()
     action, check_result = initialize_action(
@@ -538,25 +661,28 @@ def reset_failed_metawfrs(connection, **kwargs):
     )
     action.description = "Reset all failed WorkflowRuns on MetaWorkflowRuns"
 
-    success = []
-    error = {}
     meta_workflow_runs = check_result.get("meta_workflow_runs", {})
     meta_workflow_run_uuids = meta_workflow_runs.get("uuids", [])
     random.shuffle(meta_workflow_run_uuids)  # Ensure later ones hit within time limits
-    for meta_workflow_run_uuid in meta_workflow_run_uuids:
-        if is_past_time_limit(start, LAMBDA_LIMIT):
-            action.description = "Did not complete action due to time limitations"
-            break
-        try:
-            reset_metawfr.reset_failed(
-                meta_workflow_run_uuid,
-                connection.ff_keys,
-                valid_status=FINAL_STATUS_TO_RESET,
-            )
-            success.append(meta_workflow_run_uuid)
-        except Exception as e:
-            error[meta_workflow_run_uuid] = str(e)
-    action.output["success"] = success
+
+    def reset_failed_meta_workflow_run(meta_workflow_run_uuid):
+        reset_metawfr.reset_failed(
+            meta_workflow_run_uuid,
+            connection.ff_keys,
+            valid_status=FINAL_STATUS_TO_RESET,
+        )
+
+    success, error, not_started = run_concurrently(
+        reset_failed_meta_workflow_run,
+        meta_workflow_run_uuids,
+        start=start,
+        time_limit=LAMBDA_LIMIT,
+        max_workers=concurrency,
+        task_timeout=task_timeout,
+    )
+    if not_started:
+        action.description = "Did not complete action due to time limitations"
+    action.output["success"] = list(success)
     action.output["error"] = error
     if not error:
         action.status = constants.ACTION_PASS
@@ -733,25 +859,27 @@ def find_meta_workflow_runs_to_kill(
     meta_workflow_runs_not_found = []
     if meta_workflow_runs is not None:
         meta_workflow_runs = format_kwarg_list(meta_workflow_runs)
-        found, not_found = validate_items_existence(meta_workflow_runs, connection)
+        found, not_found = validate_items_existence(
+            meta_workflow_runs, connection, item_type="MetaWorkflowRun",
+            fields=MetaWorkflowRunsFound.FIELDS,
+        )
         meta_workflow_runs_to_kill.add_items(found)
         meta_workflow_runs_not_found += not_found
     if meta_workflows is not None:
         meta_workflows = format_kwarg_list(meta_workflows)
-        found, not_found = validate_items_existence(meta_workflows, connection)
-        for meta_workflow in found:
-            meta_workflow_uuid = meta_workflow.get("uuid")
-            query = (
-                "search/?type=MetaWorkflowRun&field=uuid&meta_workflow.uuid="
-                + meta_workflow_uuid
-                + "".join(
-                    ["&final_status=" + status for status in FINAL_STATUS_TO_KILL]
-                )
+        found, _ = validate_items_existence(
+            meta_workflows, connection, item_type="MetaWorkflow", fields=["uuid"]
+        )
+        meta_workflow_uuids = [meta_workflow.get("uuid") for meta_workflow in found]
+        for meta_workflow_uuid_chunk in paginate_list(
+            list(dict.fromkeys(meta_workflow_uuids)), 50
+        ):
+            meta_workflow_runs_to_kill.search_query(
+                get_meta_workflow_runs_query(meta_workflow_uuid_chunk, FINAL_STATUS_TO_KILL)
             )
-            meta_workflow_runs_to_kill.search_query(query)
     if meta_workflows is None and meta_workflow_runs is None:
         meta_workflow_runs_to_kill.search_final_status(FINAL_STATUS_TO_KILL)
-    uuids_to_kill = list(set(meta_workflow_runs_to_kill.uuids))
+    uuids_to_kill = meta_workflow_runs_to_kill.uuids
     msg = "%s MetaWorkflowRun(s) found to stop" % len(uuids_to_kill)
     check.summary = msg
     check.brief_output.append(msg)
@@ -775,18 +903,20 @@ def kill_meta_workflow_runs(connection, **kwargs):
     )
     action.description = "Stop MetaWorkflowfuns from further updates"
 
-    success = []
+    patched = set()
     error = {}
     meta_workflow_runs_to_patch = check_result["meta_workflow_runs"]
     patch_body = {"final_status": "stopped"}
-    for meta_workflow_run_uuid in meta_workflow_runs_to_patch:
-        try:
-            ff_utils.patch_metadata(
-                patch_body, obj_id=meta_workflow_run_uuid, key=connection.ff_keys
-            )
-            success.append(meta_workflow_run_uuid)
-        except Exception as error_msg:
-            error[meta_workflow_run_uuid] = str(error_msg)
+    with PortalClient(connection) as portal_client:
+        for meta_workflow_run_uuid, _, error_msg in portal_client.as_completed(
+            lambda uuid: portal_client.patch_metadata(patch_body, uuid),
+            meta_workflow_runs_to_patch,
+        ):
+            if error_msg:
+                error[meta_workflow_run_uuid] = str(error_msg)
+            else:
+                patched.add(meta_workflow_run_uuid)
+    success = [uuid for uuid in meta_workflow_runs_to_patch if uuid in patched]
     action.output["success"] = success
     action.output["error"] = error
     if not error:
@@ -812,7 +942,10 @@ def find_meta_workflow_runs_with_quality_metric_failure(
     if meta_workflow_runs:
         quality_metric_failed = []
         meta_workflow_runs = format_kwarg_list(meta_workflow_runs)
-        found, not_found = validate_items_existence(meta_workflow_runs, connection)
+        found, not_found = validate_items_existence(
+            meta_workflow_runs, connection, item_type="MetaWorkflowRun",
+            fields=[*MetaWorkflowRunsFound.FIELDS, "final_status"],
+        )
         for meta_workflow_run in found:
             final_status = meta_workflow_run.get("final_status")
             if final_status == "quality metric failed":
@@ -825,12 +958,12 @@ def find_meta_workflow_runs_with_quality_metric_failure(
         )
         meta_workflow_runs_found.search_query(query)
     msg = "%s MetaWorkflowRun(s) found with failed output QualityMetrics" % len(
-        meta_workflow_runs_found.uuids
+        meta_workflow_runs_found
     )
     check.summary = msg
     check.brief_output.append(msg)
     check.full_output["failing_quality_metrics"] = meta_workflow_runs_found.uuids
-    if not meta_workflow_runs_found.uuids:
+    if not meta_workflow_runs_found:
         check.status = constants.CHECK_PASS
         check.allow_action = False
     if meta_workflow_runs_not_found:
@@ -852,18 +985,20 @@ def ignore_quality_metric_failure_for_meta_workflow_run(connection, **kwargs):
     )
     action.description = "Ignore MetaWorkflowRun QC failures to continue running"
 
-    success = []
+    patched = set()
     error = {}
     meta_workflow_run_uuids = check_result.get("failing_quality_metrics", [])
-    for meta_workflow_run_uuid in meta_workflow_run_uuids:
-        patch_body = {"ignore_output_quality_metrics": True, "final_status": "running"}
-        try:
-            ff_utils.patch_metadata(
-                patch_body, meta_workflow_run_uuid, key=connection.ff_keys
-            )
-            success.append(meta_workflow_run_uuid)
-        except Exception as error_msg:
-            error[meta_workflow_run_uuid] = str(error_msg)
+    patch_body = {"ignore_output_quality_metrics": True, "final_status": "running"}
+    with PortalClient(connection) as portal_client:
+        for meta_workflow_run_uuid, _, error_msg in portal_client.as_completed(
+            lambda uuid: portal_client.patch_metadata(patch_body, uuid),
+            meta_workflow_run_uuids,
+        ):
+            if error_msg:
+                error[meta_workflow_run_uuid] = str(error_msg)
+            else:
+                patched.add(meta_workflow_run_uuid)
+    success = [uuid for uuid in meta_workflow_run_uuids if uuid in patched]
     action.output["success"] = success
     action.output["error"] = error
     if not error:
@@ -1,11 +1,6 @@
-import json
-from os import name
-import time
-import random
-from unittest import result
 from datetime import datetime
-import requests
 import re
+import time
 import html
 from typing import Optional, Dict, List, Any
 from dcicutils import ff_utils
@@ -17,9 +12,21 @@ from dcicutils import ff_utils
 from .helpers.confchecks import *
 from .helpers import wrangler_utils as wr_utils
 from .helpers import constants
-
-# use a random number to stagger checks
-random_wait = 20
+from .helpers import indexing_utils
+from .helpers import pub_utils
+from .helpers.pub_utils import normalize_date
+from .helpers.utils import (
+    PORTAL_CACHE,
+    PortalClient,
+    is_transient_error,
+    is_unprocessed_error,
+    iter_results,
+    retry_with_backoff,
+    run_concurrently,
+    DEFAULT_MAX_WORKERS,
+)
+from .helpers.wfrset_utils import LAMBDA_LIMIT
+from .helpers.rate_limiter import get_rate_limiter
 
 
 @check_function(action="tag_donors_with_released_files")
@@ -27,18 +34,21 @@ def untagged_donors_with_released_files(connection, **kwargs):
     check = CheckResult(connection, "untagged_donors_with_released_files")
     check.action = "tag_donors_with_released_files"
     check.allow_action = False
-    wait = round(random.uniform(0.1, random_wait), 1)
-    time.sleep(wait)
-    QUERY_STEM = "search/?type=File&dataset=tissue&field=donors"
+    # searches draw from the portal search budget shared with concurrently running checks
+    rate_limiter = get_rate_limiter(connection)
+    # donors are read through the cache shared in a warm Lambda, which
+    # tag_donors_with_released_files invalidates as it patches them
+    portal_cache = PORTAL_CACHE.for_run()
+    QUERY_STEM = "search/?type=File&dataset=tissue"
     status_str = "".join(f"&status={s}" for s in constants.RELEASED_FILE_STATUSES)
     query = QUERY_STEM + status_str
-    files = ff_utils.search_metadata(query, key=connection.ff_keys)
-    unique_donor_ids = list(
-        {d["uuid"] for f in files for d in f.get("donors", []) if "uuid" in d}
+    # distinct donors from a facet on the files, rather than every file record
+    unique_donor_ids = wr_utils.get_linked_uuids(
+        query, "donors", connection, rate_limiter=rate_limiter
+    )
+    donors_with_released_files, protected_donors = wr_utils.get_donors_with_protected_donors(
+        unique_donor_ids, connection, rate_limiter=rate_limiter, cache=portal_cache
     )
-    donors_with_released_files = [
-        ff_utils.get_metadata(did, key=connection.ff_keys) for did in unique_donor_ids
-    ]
     # first we are excluding donors that already have the tag and then including only those in Production study
     donors_to_tag = wr_utils.include_items_with_properties(
         wr_utils.exclude_items_with_properties(
@@ -47,13 +57,17 @@ def untagged_donors_with_released_files(connection, **kwargs):
         {"study": "Production"},
     )
     donors_to_tag.extend(
-        [d.get("protected_donor") for d in donors_to_tag if "protected_donor" in d]
+        [
+            protected_donors.get(wr_utils.get_linked_uuid(d, "protected_donor"), d.get("protected_donor"))
+            for d in donors_to_tag if "protected_donor" in d
+        ]
     )
 
     if not donors_to_tag:
         check.summary = "All donors with released files are tagged"
         check.description = f"With the tag - {constants.DONOR_W_FILES_TAG}"
         check.status = constants.CHECK_PASS
+        check.full_output = {"portal_cache": portal_cache.stats()}
         return check
 
     donor_info = [
@@ -65,44 +79,76 @@ def untagged_donors_with_released_files(connection, **kwargs):
     check.brief_output = "{} donors with released files to be tagged".format(
         len(donors_to_tag)
     )
-    check.full_output = {"info": donor_info, "uuids": uuids}
+    # Existing tags let the action patch without fetching each donor again,
+    # unless last_modified shows the donor changed since
+    tags = {d.get("uuid"): d.get("tags", []) for d in donors_to_tag if "uuid" in d}
+    last_modified = {d.get("uuid"): wr_utils.get_date_modified(d) for d in donors_to_tag if "uuid" in d}
+    check.full_output = {
+        "info": donor_info, "uuids": uuids, "tags": tags, "last_modified": last_modified,
+        "portal_cache": portal_cache.stats(),
+    }
     check.status = constants.CHECK_WARN
     check.summary = "Donors with released files need tagging"
     return check
 
 
-@action_function()
-def tag_donors_with_released_files(connection, **kwargs):
+@action_function(concurrency=DEFAULT_MAX_WORKERS)
+def tag_donors_with_released_files(connection, concurrency=DEFAULT_MAX_WORKERS, **kwargs):
+    start = datetime.utcnow()
     action = ActionResult(connection, "tag_donors_with_released_files")
     action_logs = {"patch_failure": [], "patch_success": []}
     # get the associated untagged_donors_with_released_files result
     donors_to_tag_check_result = action.get_associated_check_result(kwargs)
-    donors_to_tag = donors_to_tag_check_result.get("full_output", {}).get("uuids", [])
-    for donor_uuid in donors_to_tag:
-        try:
-            existing_tags = ff_utils.get_metadata(
-                donor_uuid, key=connection.ff_keys
-            ).get("tags", [])
-        except Exception as e:
-            action.status = constants.ACTION_WARN
-            action_logs["patch_failure"].append(
-                f"Error fetching donor {donor_uuid}: {e}"
-            )
-            continue
+    full_output = donors_to_tag_check_result.get("full_output", {})
+    donors_to_tag = full_output.get("uuids", [])
+    donor_tags = full_output.get("tags", {})
+    # Tags from the check are used unless the donor changed since (or the
+    # check result predates recording them), in which case they are fetched
+    modified_donors = set(
+        wr_utils.get_modified_item_uuids(
+            donors_to_tag, full_output.get("last_modified", {}), connection
+        )
+    ) if donors_to_tag else set()
+    # patches invalidate the donors untagged_donors_with_released_files cached
+    portal_client = PortalClient(connection, max_workers=concurrency, cache=PORTAL_CACHE)
+
+    def tag_donor(donor_uuid):
+        if donor_uuid in donor_tags and donor_uuid not in modified_donors:
+            existing_tags = donor_tags[donor_uuid]
+        else:
+            try:
+                existing_tags = retry_with_backoff(
+                    portal_client.get_metadata,
+                    donor_uuid,
+                    add_on="frame=raw&datastore=database",
+                    retry=False,
+                ).get("tags", [])
+            except Exception as e:
+                raise Exception(f"Error fetching donor {donor_uuid}: {e}")
         patch_body = {"tags": list(set(existing_tags + [constants.DONOR_W_FILES_TAG]))}
         try:
-            ff_utils.patch_metadata(
-                patch_body, obj_id=donor_uuid, key=connection.ff_keys
-            )
-            action_logs["patch_success"].append(
-                f"Successfully tagged donor {donor_uuid}"
+            retry_with_backoff(
+                portal_client.patch_metadata, patch_body, donor_uuid, retry=False
             )
         except Exception as e:
-            action.status = constants.ACTION_WARN
-            action_logs["patch_failure"].append(
-                f"Error tagging donor {donor_uuid}: {e}"
-            )
-            continue
+            raise Exception(f"Error tagging donor {donor_uuid}: {e}")
+
+    with portal_client:
+        tagged, errors, not_started = run_concurrently(
+            tag_donor,
+            donors_to_tag,
+            start=start,
+            time_limit=LAMBDA_LIMIT,
+            max_workers=concurrency,
+        )
+    action_logs["patch_success"] = [
+        f"Successfully tagged donor {donor_uuid}" for donor_uuid in tagged
+    ]
+    action_logs["patch_failure"] = list(errors.values()) + [
+        f"Did not tag donor {donor_uuid} due to time limitations" for donor_uuid in not_started
+    ]
+    if action_logs["patch_failure"]:
+        action.status = constants.ACTION_WARN
 
     if not action_logs.get("patch_failure") and len(
         action_logs.get("patch_success", [])
@@ -114,41 +160,46 @@ def tag_donors_with_released_files(connection, **kwargs):
     return action
 
 
-@check_function()
-def item_counts_by_type(connection, **kwargs):
-    def process_counts(count_str):
-        # specifically formatted for FF health page
-        ret = {}
-        split_str = count_str.split()
-        ret[split_str[0].strip(":")] = int(split_str[1])
-        ret[split_str[2].strip(":")] = int(split_str[3])
-        return ret
-
+@check_function(count_mode="probe")
+def item_counts_by_type(connection, count_mode="probe", **kwargs):
+    """
+    Compare DB and ES item counts by type.
+    count_mode: "portal" to use the portal counts endpoint only, or "probe" (default) to also
+        count ES indices directly in parallel. If the counts endpoint is slow, ES counts are
+        stored without DB counts and the check warns; if ES cannot be counted, the portal
+        counts are used.
+    """
     check = CheckResult(connection, "item_counts_by_type")
-    # add random wait
-    wait = round(random.uniform(0.1, random_wait), 1)
-    time.sleep(wait)
+    # the run's one counts request draws from the budget shared with concurrent checks
+    get_rate_limiter(connection).acquire("counts")
     # run the check
-    item_counts = {}
     warn_item_counts = {}
-    req_location = "".join([connection.ff_server, "/counts?format=json"])
-    counts_res = ff_utils.authorized_request(req_location, auth=connection.ff_keys)
-    if counts_res.status_code >= 400:
+    try:
+        if count_mode == "probe":
+            previous_counts = (check.get_primary_result() or {}).get("full_output")
+            if not isinstance(previous_counts, dict):
+                previous_counts = {}
+            item_types = [item_type for item_type in previous_counts if item_type != "ALL"]
+            item_counts, es_counts, errors = indexing_utils.probe_item_counts(
+                connection, item_types
+            )
+            check.admin_output = {"count_mode": count_mode, "errors": errors}
+        else:
+            item_counts = indexing_utils.get_portal_item_counts(connection)
+    except Exception as e:
         check.status = "ERROR"
-        check.description = (
-            "Error (bad status code %s) connecting to the counts endpoint at: %s."
-            % (counts_res.status_code, req_location)
-        )
+        check.description = str(e)
+        return check
+    if count_mode == "probe" and "portal" in errors:
+        # without DB counts, keep the ES counts (and item types to probe) but no DB/ES comparison
+        check.status = "WARN"
+        check.summary = "No DB counts from the counts endpoint"
+        check.description = "Only ES counts were taken: %s" % errors["portal"]
+        check.full_output = item_counts
         return check
-    counts_json = json.loads(counts_res.text)
-    for index in counts_json["db_es_compare"]:
-        counts = process_counts(counts_json["db_es_compare"][index])
-        item_counts[index] = counts
-        if counts["DB"] != counts["ES"]:
+    for index, counts in item_counts.items():
+        if index != "ALL" and counts["DB"] != counts["ES"]:
             warn_item_counts[index] = counts
-    # add ALL for total counts
-    total_counts = process_counts(counts_json["db_es_total"])
-    item_counts["ALL"] = total_counts
     # set fields, store result
     if not item_counts:
         check.status = "FAIL"
@@ -165,129 +216,6 @@ def item_counts_by_type(connection, **kwargs):
 
 
 ## helpers for publication metadata retrieval
-def is_rxiv_doi(doi: str) -> bool:
-    """Check DOI prefix for Rxiv servers."""
-    return any(doi.startswith(prefix) for prefix in constants.RXIV_PREFIXES)
-
-
-def get_pmid_from_doi(doi: str) -> Optional[str]:
-    """Look up PMID using DOI."""
-    eutil = f"{constants.EUTIL_ESEARCH}db=pubmed&term={doi}[DOI]&retmode=json"
-    pmid = None
-    try:
-        eutil_response = requests.get(eutil, timeout=10)
-        pmid = eutil_response.json().get("esearchresult", {}).get("idlist", [])
-    except Exception as e:
-        print(f"Error fetching PMID: {e}")
-    if pmid and len(pmid) == 1:
-        return pmid[0]
-    return None
-
-
-def get_crossref_metadata(doi: str) -> Dict[str, Any]:
-    """Retrieve metadata from Crossref using doi"""
-    try:
-        r = requests.get(f"{constants.CROSSREF_API}{doi}", timeout=10)
-        r.raise_for_status()
-        return r.json()["message"]
-    except Exception as e:
-        print(f"Error fetching Crossref metadata: {e}")
-        return {}
-
-
-def get_pubmed_metadata(pmid: str) -> Optional[Dict[str, Any]]:
-    """Retrieve metadata from PubMed using PMID."""
-    eutil = f"{constants.EUTIL_EFETCH}db=pubmed&id={pmid}&retmode=xml"
-    try:
-        response = requests.get(eutil, timeout=10)
-        response.raise_for_status()
-        return response.text
-    except Exception as e:
-        print(f"Error fetching PubMed metadata: {e}")
-        return None
-
-
-def get_rxiv_metadata(doi: str) -> Optional[Dict[str, Any]]:
-    """Retrieve metadata from bioRxiv/medRxiv."""
-    try:
-        # Extract the bioRxiv ID from DOI (e.g., 10.1101/2023.01.01.522534)
-        # rxiv_id = doi.split("/")[-1]
-        servers = constants.RXIV_PREFIXES.get(doi.split("/")[0], [])
-        for server in servers:
-            url = f"{constants.RXIV_API}/{server}/{doi}"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-
-            data = response.json()
-            if data.get("collection") and len(data["collection"]) > 0:
-                return server, data["collection"][0]
-    except Exception as e:
-        print(f"Error fetching Rxiv metadata: {e}")
-
-    return None, None
-
-
-def parse_pubmed_xml(xml_text: str) -> Dict[str, Any]:
-    """Parse PubMed XML response to extract metadata."""
-    import xml.etree.ElementTree as ET
-
-    result = {
-        "title": None,
-        "abstract": None,
-        "authors": [],
-        "journal": None,
-        "date_published": None,
-    }
-
-    try:
-        root = ET.fromstring(xml_text)
-
-        # Extract title
-        title_elem = root.find(".//ArticleTitle")
-        if title_elem is not None and title_elem.text:
-            result["title"] = title_elem.text
-
-        # Extract abstract
-        abstract_elem = root.find(".//AbstractText")
-        if abstract_elem is not None and abstract_elem.text:
-            result["abstract"] = abstract_elem.text
-
-        # Extract authors
-        authors = []
-        for author in root.findall(".//Author"):
-            last_name = author.find("LastName")
-            fore_name = author.find("ForeName")
-            if last_name is not None and fore_name is not None:
-                authors.append({"first_name": fore_name.text, "last_name": last_name.text})
-            elif last_name is not None:
-                authors.append({"last_name": last_name.text})
-        result["authors"] = authors
-
-        # Extract journal
-        journal_elem = root.find(".//Journal/Title")
-        if journal_elem is not None and journal_elem.text:
-            result["journal"] = journal_elem.text
-
-        # Extract publication date
-        pub_date = root.find(".//PubDate")
-        if pub_date is not None:
-            year = pub_date.find("Year")
-            month = pub_date.find("Month")
-            day = pub_date.find("Day")
-            if year is not None:
-                date_str = year.text
-                if month is not None:
-                    date_str += f"-{month.text}"
-                if day is not None:
-                    date_str += f"-{day.text}"
-                result["date_published"] = normalize_date(date_str)
-
-    except Exception as e:
-        print(f"Error parsing PubMed XML: {e}")
-
-    return result
-
-
 def _clean_text(text: str) -> str:
     """Clean text by removing XML/HTML tags and normalizing whitespace."""
     if not text:
@@ -389,116 +317,6 @@ def parse_crossref_metadata(crossref_data: Dict[str, Any]) -> Dict[str, Any]:
     return result
 
 
-_MONTH_NAMES: Dict[str, str] = {
-    # abbreviated
-    "jan": "01", "feb": "02", "mar": "03", "apr": "04",
-    "may": "05", "jun": "06", "jul": "07", "aug": "08",
-    "sep": "09", "oct": "10", "nov": "11", "dec": "12",
-    # full
-    "january": "01", "february": "02", "march": "03",  "april": "04",
-    "june":    "06", "july":     "07", "august": "08",
-    "september": "09", "october": "10", "november": "11", "december": "12",
-}
-
-
-def _normalize_month(month_str: str) -> Optional[str]:
-    """
-    Convert a month string to a zero-padded two-digit numeric string.
-
-    Accepts:
-        - Numeric strings: "1" -> "01", "12" -> "12"
-        - Abbreviated names: "Jan" -> "01"
-        - Full names: "January" -> "01"
-
-    Returns None if the value cannot be interpreted as a valid month.
-    """
-    if not month_str:
-        return None
-    lower = month_str.lower().strip()
-    if lower in _MONTH_NAMES:
-        return _MONTH_NAMES[lower]
-    try:
-        month_int = int(month_str)
-        if 1 <= month_int <= 12:
-            return str(month_int).zfill(2)
-    except ValueError:
-        pass
-    return None
-
-
-def normalize_date(date_value: Any) -> Optional[str]:
-    """
-    Normalize a date value from any publication source into a
-    standardized string format.
-
-    Returns:
-        'YYYY-MM-DD'  if year, month, and day are all present and valid
-        'YYYY-MM'     if year and month are present and valid
-        'YYYY'        if only year is present and valid
-        None          if the value cannot be interpreted as a date
-
-    Accepts:
-        - ISO-like strings:       "2023-01-15", "2023-1-5"
-        - Month-name strings:     "2023-Jan-15", "2023-January-5"
-        - Partial strings:        "2023-01", "2023-Jan", "2023"
-        - datetime objects
-        - None or empty string    -> None
-
-    Sources and example inputs:
-        CrossRef   : "2023-1-5"     (numeric, may lack zero-padding)
-        PubMed XML : "2023-Jan-05"  (month as 3-letter abbreviation)
-        bioRxiv    : "2023-01-15"   (typically already ISO format)
-    """
-    if date_value is None:
-        return None
-
-    # datetime object — format directly
-    if isinstance(date_value, datetime):
-        return date_value.strftime("%Y-%m-%d")
-
-    if not isinstance(date_value, str):
-        return None
-
-    date_str = date_value.strip()
-    if not date_str:
-        return None
-
-    # Split on hyphens or forward slashes
-    parts = re.split(r"[-/]", date_str)
-
-    # --- Year ---
-    try:
-        year_int = int(parts[0])
-        if not (1000 <= year_int <= 9999):
-            return None
-        year_str = str(year_int)
-    except (ValueError, IndexError):
-        return None
-
-    if len(parts) == 1:
-        return year_str
-
-    # --- Month ---
-    month_str = _normalize_month(parts[1])
-    if not month_str:
-        # month unparseable — return year only rather than malformed string
-        return year_str
-
-    if len(parts) == 2:
-        return f"{year_str}-{month_str}"
-
-    # --- Day ---
-    try:
-        day_int = int(parts[2])
-        if 1 <= day_int <= 31:
-            return f"{year_str}-{month_str}-{str(day_int).zfill(2)}"
-    except (ValueError, IndexError):
-        pass
-
-    # day unparseable — return year-month
-    return f"{year_str}-{month_str}"
-
-
 def _parse_author_name(author: str) -> Dict[str, str]:
     """
     Parse a single author string into a dictionary with last_name
@@ -702,13 +520,22 @@ def publication_values_equal(a: Any, b: Any) -> bool:
     return a == b
 
 
-def fetch_publication_info(connection, info: tuple) -> Dict[str, Any]:
+def fetch_publication_info(
+    connection,
+    info: tuple,
+    external: Optional[Dict[str, Any]] = None,
+    publications: Optional[tuple] = None,
+) -> Dict[str, Any]:
     """
     Fetch publication information from external repositories given a DOI.
 
     Args:
         connection: The database connection object.
         info: A tuple containing the operation, DOI and optional accession number.
+        external: Metadata of the DOI already fetched by pub_utils.fetch_external_metadata;
+            fetched here if not given.
+        publications: Existing publications by DOI and by accession, as returned by
+            wrangler_utils.get_publications; looked up here if not given.
 
     Returns:
         Dictionary containing publication metadata
@@ -716,20 +543,20 @@ def fetch_publication_info(connection, info: tuple) -> Dict[str, Any]:
     if info[0] == 'invalid':
         print(f"Invalid input: {info}")
         return {}
+    if publications is None:
+        publications = wr_utils.get_publications(
+            [info[1]] if info[0] != 'update' else [],
+            [info[2]] if info[0] == 'update' else [],
+            connection,
+        )
+    pubs_by_doi, pubs_by_accession = publications
     curr_pub = None
-    if info[0] == 'update' and not (
-        curr_pub := ff_utils.get_metadata(info[2], key=connection.ff_keys)
-    ):
+    if info[0] == 'update' and not (curr_pub := pubs_by_accession.get(info[2])):
         print(f"Invalid input for update operation (check your accession): {info}")
         return {}
     doi = info[1]
-    if info[0] != 'update' and (
-        duplicate_pub := ff_utils.search_metadata(
-            f"search/?type=Publication&doi={doi}",
-            key=connection.ff_keys
-        )
-    ):
-        print(f"Publication with DOI {doi} already exists: {duplicate_pub['uuid']}")
+    if info[0] != 'update' and (duplicate_pubs := pubs_by_doi.get(doi.lower())):
+        print(f"Publication with DOI {doi} already exists: {duplicate_pubs[0]['uuid']}")
         return {}
 
     pub_info = {
@@ -754,8 +581,11 @@ def fetch_publication_info(connection, info: tuple) -> Dict[str, Any]:
         print(f"Invalid DOI: {doi}")
         return {}
 
-    # Try to fetch from CrossRef (works for most DOIs)
-    crossref_response = get_crossref_metadata(doi)
+    if external is None:
+        external = pub_utils.fetch_external_metadata([doi])[doi]
+
+    # Try CrossRef (works for most DOIs)
+    crossref_response = external["crossref"]
     if crossref_response:
         crossref_metadata = parse_crossref_metadata(crossref_response)
 
@@ -763,14 +593,14 @@ def fetch_publication_info(connection, info: tuple) -> Dict[str, Any]:
         # populate pub_info from CrossRef data
         pub_info.update(crossref_metadata)
 
-    if is_rxiv_doi(doi):
+    if pub_utils.is_rxiv_doi(doi):
         print(f"Detected Rxiv preprint: {doi}")
-        rxiv_server, rxiv_response = get_rxiv_metadata(doi)
+        rxiv_server, rxiv_response = external["rxiv"]
         if rxiv_server and rxiv_response:
             rxiv_metadata = parse_rxiv_data(rxiv_response, rxiv_server)
 
     # see if we can get pubmed id from doi
-    pmid = get_pmid_from_doi(doi)
+    pmid = external["pmid"]
 
     if rxiv_metadata:
         # Merge data, preferring existing pub_info values
@@ -784,10 +614,9 @@ def fetch_publication_info(connection, info: tuple) -> Dict[str, Any]:
             pub_info["pubmed_id"] = pmid
             pub_info["repository_urls"].append(f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/")
 
-    # Fetch PubMed metadata
-    pubmed_xml = get_pubmed_metadata(pmid)
-    if pubmed_xml:
-        pubmed_metadata = parse_pubmed_xml(pubmed_xml)
+    # Merge PubMed metadata
+    pubmed_metadata = external["pubmed"]
+    if pubmed_metadata:
         # what we do with this here depends on what we have already from CrossRef/Rxiv
         if crossref_metadata and pub_info["authors"]:
             # do we want to compare as sanity check?
@@ -843,6 +672,24 @@ RECORD_PATTERN = re.compile(
 )
 
 
+def parse_record(token: str) -> tuple[str, Optional[str], Optional[str]]:
+    """
+    Validate a single 'doi' or 'doi|accession' record with RECORD_PATTERN.
+
+    Returns (operation, doi, accession) as described for parse_input_ids.
+    """
+    match = RECORD_PATTERN.match(token)
+
+    if match:
+        doi       = match.group('doi')
+        accession = match.group('accession')  # None if not present
+
+        if accession:
+            return ('update', doi, accession)
+        return ('create', doi, None)
+    return ('invalid', None, None)
+
+
 def parse_input_ids(input_string: str) -> list[tuple[str, Optional[str], Optional[str]]]:
     """
     Parse a comma-separated string into a list of tuples.
@@ -873,55 +720,175 @@ def parse_input_ids(input_string: str) -> list[tuple[str, Optional[str], Optiona
         if not token:
             continue
 
-        match = RECORD_PATTERN.match(token)
+        result.append(parse_record(token))
 
-        if match:
-            doi       = match.group('doi')
-            accession = match.group('accession')  # None if not present
+    return result
 
-            if accession:
-                result.append(('update', doi, accession))
-            else:
-                result.append(('create', doi, None))
-        else:
-            result.append(('invalid', None, None))
 
-    return result
+def read_record_chunk(
+    lines, offset: int, chunk_size: int
+) -> tuple[list[tuple[str, Optional[str], Optional[str]]], int, bool]:
+    """
+    Parse records from an input file lazily, up to a chunk of chunk_size records.
+
+    Each line holds one record, or several comma-separated ones; chunks end at a line
+    boundary so that the returned offset can be used to resume.
+
+    Parameters
+    ----------
+    lines : iterable of (str, int)
+        Lines and the byte offset following each, as given by pub_utils.iter_input_lines.
+    offset : int
+        Byte offset the lines start at.
+    chunk_size : int
+        Records to read before stopping.
+
+    Returns
+    -------
+    (records, next_offset, exhausted)
+        records     - (operation, doi, accession) tuples, as from parse_input_ids
+        next_offset - byte offset to resume reading from
+        exhausted   - True if the end of the input was reached
+    """
+    records = []
+    for line, offset in lines:
+        records.extend(parse_input_ids(line))
+        if len(records) >= chunk_size:
+            return records, offset, False
+    return records, offset, True
+
+
+def get_committed_input_cursor(connection, input_file: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the input_file cursor to resume prepare_pub_metadata from.
 
+    A chunk's cursor is committed by the check itself when the chunk has nothing to
+    write, and otherwise only once update_pub_metadata finished the chunk: the check
+    proposes it as "pending_input_cursor" and the action echoes it in its output.
+    The history is searched back past runs on other inputs (e.g. doi_acc_list) to the
+    last run on input_file; results that errored (e.g. with a traceback as output)
+    are skipped.
 
-@check_function(action="update_pub_metadata", doi_acc_list=[])
+    Returns
+    -------
+    The committed cursor of input_file, or None to start from the beginning
+    """
+    return pub_utils.find_committed_input_cursor(
+        iter_results(
+            CheckResult(connection, "prepare_pub_metadata"), limit=pub_utils.CURSOR_LOOKBACK
+        ),
+        iter_results(
+            ActionResult(connection, "update_pub_metadata"), limit=pub_utils.CURSOR_LOOKBACK
+        ),
+        input_file,
+    )
+
+
+@check_function(
+    action="update_pub_metadata", doi_acc_list=[], input_file="",
+    chunk_size=pub_utils.RECORD_CHUNK_SIZE, restart_input=False
+)
 def prepare_pub_metadata(connection, **kwargs):
     # can take as input a comma-separated list of DOIs with optional accessions 
     # for existing publications to update, in the format:
     # 10.1000/xyz123|SMHTPB1234567, 10.1000/abc456
+    # or, for large lists, input_file: an s3://bucket/key object or local file with one
+    # such record per line, worked through chunk_size records per run; each run resumes
+    # after the last chunk written by update_pub_metadata (or with nothing to write)
+    # unless restart_input is set
     check = CheckResult(connection, "prepare_pub_metadata")
     check.action = "update_pub_metadata"
     check.allow_action = False
-    wait = round(random.uniform(0.1, random_wait), 1)
-    time.sleep(wait)
+    # searches draw from the portal search budget shared with concurrently running checks
+    rate_limiter = get_rate_limiter(connection)
     id_str = kwargs.get('doi_acc_list')
-    if not id_str:
+    input_file = kwargs.get('input_file')
+    input_cursor = None
+    if input_file:
+        previous_cursor = None
+        if not kwargs.get('restart_input'):
+            previous_cursor = get_committed_input_cursor(connection, input_file)
+        if not previous_cursor:
+            previous_cursor = {"input_file": input_file, "next_offset": 0, "records_read": 0}
+        elif previous_cursor.get("exhausted"):
+            check.status = constants.CHECK_PASS
+            check.summary = f"All {previous_cursor['records_read']} records of {input_file} processed"
+            check.full_output = {"input": input_file, "input_cursor": previous_cursor}
+            return check
+        offset = previous_cursor["next_offset"]
+        s3_connection = getattr(connection, "connections", {}).get("s3")
+        s3_client = s3_connection.client if s3_connection else None
+        id_list, next_offset, exhausted = read_record_chunk(
+            pub_utils.iter_input_lines(input_file, offset, s3_client),
+            offset,
+            int(kwargs.get('chunk_size') or pub_utils.RECORD_CHUNK_SIZE),
+        )
+        input_cursor = {
+            "input_file": input_file,
+            "check_uuid": kwargs.get("uuid"),
+            "offset": offset,
+            "next_offset": next_offset,
+            "records_read": previous_cursor["records_read"] + len(id_list),
+            "exhausted": exhausted,
+        }
+        if not id_list:
+            check.status = constants.CHECK_PASS
+            check.summary = f"All {input_cursor['records_read']} records of {input_file} processed"
+            check.full_output = {"input": input_file, "input_cursor": input_cursor}
+            return check
+    elif not id_str:
         check.status = constants.CHECK_PASS
         check.summary = "No IDs provided for metadata update"
         return check
+    else:
+        id_list = parse_input_ids(id_str)
     pubs_to_post = []
     pubs_to_patch = []
     problems = []
-    id_list = parse_input_ids(id_str)
+    # resolve existing publications of all records with one bulk lookup, so known
+    # duplicates and bad accessions are skipped before any external requests
+    publications = wr_utils.get_publications(
+        [idinfo[1] for idinfo in id_list if idinfo[0] == 'create'],
+        [idinfo[2] for idinfo in id_list if idinfo[0] == 'update'],
+        connection,
+        rate_limiter=rate_limiter,
+    )
+    pubs_by_doi, pubs_by_accession = publications
+    # fetch external metadata of all distinct DOIs up front, concurrently
+    response_cache = pub_utils.get_response_cache(connection)
+    external_metadata = pub_utils.fetch_external_metadata(
+        (
+            idinfo[1] for idinfo in id_list
+            if idinfo[0] != 'invalid' and idinfo[1].startswith("10.")
+            and (idinfo[2] in pubs_by_accession if idinfo[0] == 'update'
+                 else idinfo[1].lower() not in pubs_by_doi)
+        ),
+        cache=response_cache,
+    )
     for idinfo in id_list:
-        if pub_info := fetch_publication_info(connection, idinfo):
+        if pub_info := fetch_publication_info(
+            connection, idinfo, external_metadata.get(idinfo[1]), publications
+        ):
             if pub_info[0] == 'create':
                 pubs_to_post.append(pub_info[1])
             elif pub_info[0] == 'update':
                 pubs_to_patch.append(pub_info[1])
             else:
                 problems.append(idinfo)
-    check.full_output = {"input": id_str,
+    check.full_output = {"input": input_file or id_str,
                          "parsed_idinfo": id_list,
                          "pubs_to_post": pubs_to_post,
                          "pubs_to_patch": pubs_to_patch,
-                         "problems": problems
+                         "problems": problems,
+                         "external_cache": {"hits": response_cache.hits,
+                                            "misses": response_cache.misses}
                          }
+    if input_cursor and (pubs_to_post or pubs_to_patch):
+        # committed by update_pub_metadata once the chunk is written
+        check.full_output["input_cursor"] = previous_cursor
+        check.full_output["pending_input_cursor"] = input_cursor
+    elif input_cursor:
+        check.full_output["input_cursor"] = input_cursor
     if pubs_to_post or pubs_to_patch:
         check.status = constants.CHECK_WARN
         check.summary = f"{len(pubs_to_post)} pubs to create, {len(pubs_to_patch)} pubs to update, {len(problems)} invalid records"
@@ -929,12 +896,17 @@ def prepare_pub_metadata(connection, **kwargs):
     else:
         check.status = constants.CHECK_FAIL
         check.summary = "No valid publication metadata retrieved for provided IDs"
+    if input_cursor:
+        check.summary += (
+            f" ({input_cursor['records_read']} records of {input_file} read"
+            f"{'' if input_cursor['exhausted'] else ', more to process'})"
+        )
 
     return check
 
 
-@action_function()
-def update_pub_metadata(connection, **kwargs):
+@action_function(concurrency=DEFAULT_MAX_WORKERS)
+def update_pub_metadata(connection, concurrency=DEFAULT_MAX_WORKERS, **kwargs):
     """
     Action for prepare_pub_metadata check.
 
@@ -944,7 +916,17 @@ def update_pub_metadata(connection, **kwargs):
 
     None-valued fields are stripped from POST bodies so the server schema
     validator does not see empty required/optional fields.
+
+    Writes run on a pool of `concurrency` workers, retrying transient errors
+    of PATCHes and only unprocessed POSTs, and no new writes are started past
+    the Lambda time limit. Latency of each
+    write and overall writes/sec are recorded in the output.
+
+    An input_file chunk is committed unless writes failed transiently or were
+    not started; writes that failed permanently (e.g. failed validation) are
+    listed in permanent_failures and do not hold the input back.
     """
+    start = datetime.utcnow()
     action = ActionResult(connection, "update_pub_metadata")
     action_logs = {
         "post_success": [],
@@ -959,51 +941,96 @@ def update_pub_metadata(connection, **kwargs):
 
     pubs_to_post = full_output.get("pubs_to_post", [])
     pubs_to_patch = full_output.get("pubs_to_patch", [])
+    portal_client = PortalClient(connection, max_workers=concurrency)
+    latencies = {}
 
-    # ------------------------------------------------------------------
-    # POST – create new Publication items
-    # ------------------------------------------------------------------
-    for pub_data in pubs_to_post:
+    def post_pub(pub_data):
+        """POST a new Publication item, retrying only requests the portal
+        did not process: a timed out or failed POST may still have created
+        the item, so it is not retried."""
         doi = pub_data.get("doi", "unknown")
         # Strip None/empty values so the server validator stays happy
         clean_data = {k: v for k, v in pub_data.items() if v is not None and v != []}
         try:
-            ff_utils.post_metadata(clean_data, "Publication", key=connection.ff_keys)
-            action_logs["post_success"].append(
-                f"Created publication — DOI: {doi}"
+            retry_with_backoff(
+                portal_client.post_metadata,
+                clean_data,
+                "Publication",
+                retry=False,
+                is_retryable=is_unprocessed_error,
             )
         except Exception as e:
-            action_logs["post_failure"].append(
-                f"Failed to create publication — DOI: {doi} | Error: {e}"
-            )
+            raise Exception(f"Failed to create publication — DOI: {doi} | Error: {e}") from e
+        return f"Created publication — DOI: {doi}"
 
-    # ------------------------------------------------------------------
-    # PATCH – update existing Publication items
-    # ------------------------------------------------------------------
-    for patch_data in pubs_to_patch:
+    def patch_pub(patch_data):
+        """PATCH an existing Publication item, retrying transient errors."""
         uuid = patch_data.get("uuid")
         if not uuid:
-            action_logs["patch_failure"].append(
-                f"Skipped patch — no UUID found in patch data: {patch_data}"
-            )
-            continue
-
+            raise Exception(f"Skipped patch — no UUID found in patch data: {patch_data}")
         # uuid is only needed to address the item; exclude it from the body
         patch_body = {
             k: v for k, v in patch_data.items()
             if k != "uuid" and v is not None and v != []
         }
         doi = patch_body.get("doi", uuid)
+        try:
+            retry_with_backoff(portal_client.patch_metadata, patch_body, uuid, retry=False)
+        except Exception as e:
+            raise Exception(f"Failed to update publication {uuid} — DOI: {doi} | Error: {e}") from e
+        return f"Updated publication {uuid} — DOI: {doi}"
+
+    def get_pub_data(operation):
+        kind, index = operation
+        return pubs_to_post[index] if kind == "post" else pubs_to_patch[index]
 
+    permanent_failures = set()
+
+    def write(operation):
+        kind, _ = operation
+        pub_data = get_pub_data(operation)
+        write_start = time.monotonic()
         try:
-            ff_utils.patch_metadata(patch_body, obj_id=uuid, key=connection.ff_keys)
-            action_logs["patch_success"].append(
-                f"Updated publication {uuid} — DOI: {doi}"
-            )
+            return post_pub(pub_data) if kind == "post" else patch_pub(pub_data)
         except Exception as e:
-            action_logs["patch_failure"].append(
-                f"Failed to update publication {uuid} — DOI: {doi} | Error: {e}"
-            )
+            # e.g. validation errors, which rerunning the chunk would only repeat
+            if not is_transient_error(e.__cause__ or e):
+                permanent_failures.add(operation)
+            raise
+        finally:
+            latencies[operation] = {
+                "operation": kind,
+                "item": pub_data.get("uuid" if kind == "patch" else "doi"),
+                "seconds": round(time.monotonic() - write_start, 3),
+            }
+
+    # ------------------------------------------------------------------
+    # POST new and PATCH existing Publication items concurrently
+    # ------------------------------------------------------------------
+    operations = [("post", index) for index in range(len(pubs_to_post))] + [
+        ("patch", index) for index in range(len(pubs_to_patch))
+    ]
+    writes_start = time.monotonic()
+    with portal_client:
+        written, errors, not_started = run_concurrently(
+            write, operations, start=start, time_limit=LAMBDA_LIMIT, max_workers=concurrency
+        )
+    writes_seconds = time.monotonic() - writes_start
+    for (kind, _), message in written.items():
+        action_logs[f"{kind}_success"].append(message)
+    permanent_errors = []
+    for operation, message in errors.items():
+        kind, _ = operation
+        action_logs[f"{kind}_failure"].append(message)
+        if operation in permanent_failures:
+            permanent_errors.append(message)
+    for operation in not_started:
+        kind, _ = operation
+        pub_data = get_pub_data(operation)
+        action_logs[f"{kind}_failure"].append(
+            f"Did not {kind} publication {pub_data.get('uuid') or pub_data.get('doi')} "
+            f"due to time limitations"
+        )
 
     # ------------------------------------------------------------------
     # Determine final action status
@@ -1011,6 +1038,8 @@ def update_pub_metadata(connection, **kwargs):
     total_attempted = len(pubs_to_post) + len(pubs_to_patch)
     total_success   = len(action_logs["post_success"]) + len(action_logs["patch_success"])
     total_failure   = len(action_logs["post_failure"]) + len(action_logs["patch_failure"])
+    # transient, unprocessed or not started writes, which a rerun of the chunk may complete
+    total_held_back = total_failure - len(permanent_errors)
 
     if total_attempted == 0:
         action.status  = constants.ACTION_WARN
@@ -1028,6 +1057,19 @@ def update_pub_metadata(connection, **kwargs):
             f"{total_success} succeeded, {total_failure} failed "
             f"out of {total_attempted} total operations"
         )
-
+        if permanent_errors:
+            action_logs["permanent_failures"] = permanent_errors
+            action.summary += f" ({len(permanent_errors)} permanently)"
+    if total_attempted and not total_held_back and full_output.get("pending_input_cursor"):
+        # commits the input_file chunk for the next prepare_pub_metadata run; records that
+        # failed permanently are left in permanent_failures rather than retried forever
+        action_logs["input_cursor"] = full_output["pending_input_cursor"]
+
+    action_logs["write_latency_seconds"] = [
+        latencies[operation] for operation in operations if operation in latencies
+    ]
+    action_logs["writes_per_second"] = (
+        round(len(latencies) / writes_seconds, 2) if latencies and writes_seconds else 0
+    )
     action.output = action_logs
     return action
\ No newline at end of file
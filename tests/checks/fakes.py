@@ -0,0 +1,53 @@
+import io
+from types import SimpleNamespace
+
+import requests
+
+# Local stand-ins shared by the helper tests, imported directly (not via a
+# conftest) so the tests still run with: pytest --noconftest
+
+SERVER = "https://portal.example.org"
+
+
+class FakeResponse:
+
+    def __init__(self, body=None, status_code=200, url="", text="", headers=None):
+        self.body = body
+        self.status_code = status_code
+        self.url = url
+        self.text = text
+        self.headers = headers or {}
+        self.raw = io.BytesIO(text.encode())
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+    def close(self):
+        pass
+
+
+class FakeClock:
+    """Clock that only advances when slept on or set."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_connection():
+    keys = {"key": "key", "secret": "secret", "server": SERVER}
+    return SimpleNamespace(ff_keys=keys, ff_server=SERVER + "/", fs_env="test")
@@ -0,0 +1,196 @@
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from chalicelib_smaht.checks.helpers import indexing_utils
+from chalicelib_smaht.checks.helpers.indexing_utils import (
+    add_sample,
+    counts_result_to_sample,
+    fit_rate,
+    get_es_counts,
+    probe_item_counts,
+    summarize_indexing,
+    to_index_name,
+)
+
+# TO RUN THESE TESTS LOCALLY USE: pytest --noconftest
+
+START = datetime(2024, 5, 1, 2, 0)
+
+
+def make_result(minutes, db, es, file_db=None, file_es=None):
+    counts = {"ALL": {"DB": db, "ES": es}}
+    if file_db is not None:
+        counts["File"] = {"DB": file_db, "ES": file_es}
+    return {"uuid": (START + timedelta(minutes=minutes)).isoformat(), "full_output": counts}
+
+
+def make_history(results):
+    history = []
+    for result in results:
+        history = add_sample(history, counts_result_to_sample(result))
+    return history
+
+
+class TestIndexingUtils:
+
+    def test_add_sample(self):
+        history = make_history([make_result(30, 10, 5), make_result(0, 10, 0), make_result(30, 10, 5)])
+        assert [sample["timestamp"] for sample in history] == [
+            START.isoformat(), (START + timedelta(minutes=30)).isoformat()
+        ]
+        history = add_sample(history, counts_result_to_sample(make_result(300, 10, 10)))
+        assert len(history) == 1  # older samples fall out of the window
+        assert counts_result_to_sample({"uuid": "x", "full_output": {}}) is None
+
+    def test_fit_rate(self):
+        assert fit_rate([(0, 0), (10, 20), (20, 40)]) == 2
+        assert fit_rate([(0, 5)]) is None
+
+    def test_summarize_catching_up(self):
+        history = make_history([
+            make_result(0, 1000, 400, 300, 100),
+            make_result(10, 1000, 600, 300, 300),
+            make_result(20, 1010, 810, 300, 300),
+        ])
+        summaries = summarize_indexing(history)
+        total = summaries["ALL"]
+        assert total["backlog"] == 200
+        assert total["throughput"] == 20.5
+        assert total["backlog_growth"] == -20.0
+        assert total["eta_minutes"] == 10.0
+        assert not total["stalled"]
+        assert summaries["File"]["eta_minutes"] == 0
+
+    def test_summarize_stalled(self):
+        history = make_history([
+            make_result(0, 1000, 400),
+            make_result(10, 1000, 500),
+            make_result(20, 1100, 500),
+        ])
+        # only two samples without indexing progress
+        assert not summarize_indexing(history)["ALL"]["stalled"]
+        history = add_sample(history, counts_result_to_sample(make_result(30, 1200, 500)))
+        total = summarize_indexing(history)["ALL"]
+        assert total["stalled"]
+        assert total["eta_minutes"] is None
+        assert total["backlog_growth"] > 0
+
+    def test_summarize_without_db_counts(self):
+        history = make_history([
+            make_result(0, 1000, 400),
+            make_result(10, 1000, 600),
+            make_result(20, None, 800),  # counts endpoint was slow
+        ])
+        total = summarize_indexing(history)["ALL"]
+        assert total["throughput"] == 20.0
+        assert total["backlog"] == 400  # from the latest sample with DB counts
+
+
+class NotFoundError(Exception):
+    status_code = 404
+
+
+class FakeESClient:
+
+    def __init__(self, counts, delay=0):
+        self.counts = counts
+        self.delay = delay
+
+    def count(self, index):
+        time.sleep(self.delay)
+        if index not in self.counts:
+            raise NotFoundError(index)
+        return {"count": self.counts[index]}
+
+
+def delayed(result, delay=0.2):
+    """Portal counts answering after direct ES counts finish."""
+
+    def get_counts(connection):
+        time.sleep(delay)
+        return result
+
+    return get_counts
+
+
+class TestItemCounts:
+
+    connection = mock.Mock(ff_env="smaht-test", ff_es="es", ff_server="server", ff_keys={})
+    item_types = ["File", "FileSet"]
+
+    def test_get_es_counts(self):
+        assert to_index_name("smaht-test", "FileSet") == "smaht-testfile_set"
+        client = FakeESClient({"smaht-testfile": 9, "smaht-testfile_set": 0})
+        assert get_es_counts(client, "smaht-test", self.item_types) == {"File": 9, "FileSet": 0}
+        client = FakeESClient({"smaht-testfile": 9})
+        with pytest.raises(Exception, match="smaht-testfile_set of FileSet is missing"):
+            get_es_counts(client, "smaht-test", self.item_types)
+
+    def test_probe_item_counts(self):
+        portal = {"File": {"DB": 11, "ES": 8}, "FileSet": {"DB": 3, "ES": 3}, "ALL": {"DB": 14, "ES": 11}}
+        client = FakeESClient({"smaht-testfile": 9, "smaht-testfile_set": 3})
+        with mock.patch.object(indexing_utils, "get_portal_item_counts", side_effect=delayed(portal)):
+            with mock.patch.object(indexing_utils.es_utils, "create_es_client", return_value=client):
+                counts, es_counts, errors = probe_item_counts(self.connection, self.item_types)
+        assert not errors
+        assert es_counts == {"File": 9, "FileSet": 3}
+        assert counts == {
+            "File": {"DB": 11, "ES": 9}, "FileSet": {"DB": 3, "ES": 3}, "ALL": {"DB": 14, "ES": 12}
+        }
+
+    def test_probe_item_counts_slow_portal(self):
+        client = FakeESClient({"smaht-testfile": 10, "smaht-testfile_set": 3})
+
+        def slow_counts(connection):
+            time.sleep(1)
+
+        with mock.patch.object(indexing_utils, "get_portal_item_counts", side_effect=slow_counts):
+            with mock.patch.object(indexing_utils.es_utils, "create_es_client", return_value=client):
+                counts, es_counts, errors = probe_item_counts(
+                    self.connection, self.item_types, portal_timeout=0.2
+                )
+        # no DB counts are made up from previous results, but the schema is kept
+        assert counts == {
+            "File": {"DB": None, "ES": 10}, "FileSet": {"DB": None, "ES": 3},
+            "ALL": {"DB": None, "ES": 13},
+        }
+        assert counts_result_to_sample({"uuid": START.isoformat(), "full_output": counts})
+        assert es_counts == {"File": 10, "FileSet": 3}
+        assert "Timed out" in errors["portal"]
+
+    def test_probe_item_counts_slow_es(self):
+        portal = {"File": {"DB": 11, "ES": 8}, "FileSet": {"DB": 3, "ES": 3}, "ALL": {"DB": 14, "ES": 11}}
+        client = FakeESClient({"smaht-testfile": 9, "smaht-testfile_set": 3}, delay=1)
+        started = time.monotonic()
+        with mock.patch.object(indexing_utils, "get_portal_item_counts", return_value=portal):
+            with mock.patch.object(indexing_utils.es_utils, "create_es_client", return_value=client):
+                counts, es_counts, errors = probe_item_counts(self.connection, self.item_types)
+        # returned as soon as the portal answered, without waiting on ES
+        assert time.monotonic() - started < 0.5
+        assert counts == portal
+        assert es_counts is None
+        assert not errors
+
+    def test_probe_item_counts_missing_index(self):
+        portal = {"File": {"DB": 11, "ES": 8}, "ALL": {"DB": 11, "ES": 8}}
+        client = FakeESClient({"smaht-testfile": 9})
+        with mock.patch.object(indexing_utils, "get_portal_item_counts", side_effect=delayed(portal)):
+            with mock.patch.object(indexing_utils.es_utils, "create_es_client", return_value=client):
+                counts, es_counts, errors = probe_item_counts(self.connection, self.item_types)
+        assert counts == portal
+        assert es_counts is None
+        assert "missing" in errors["es"]
+
+    def test_probe_item_counts_es_unavailable(self):
+        portal = {"File": {"DB": 11, "ES": 11}, "ALL": {"DB": 11, "ES": 11}}
+        with mock.patch.object(indexing_utils, "get_portal_item_counts", side_effect=delayed(portal)):
+            with mock.patch.object(
+                indexing_utils.es_utils, "create_es_client", side_effect=Exception("Forbidden")
+            ):
+                counts, es_counts, errors = probe_item_counts(self.connection, self.item_types)
+        assert counts == portal
+        assert es_counts is None
+        assert "Forbidden" in errors["es"]
@@ -0,0 +1,268 @@
+from types import SimpleNamespace
+from urllib.parse import unquote_plus, urlencode
+
+import pytest
+import requests
+from botocore.exceptions import ClientError
+
+from chalicelib_smaht.checks.helpers import pub_utils
+from chalicelib_smaht.checks.helpers.pub_utils import (
+    ExternalFetcher,
+    LocalCacheStore,
+    ResponseCache,
+    S3CacheStore,
+    ServiceThrottle,
+    fetch_external_metadata,
+    find_committed_input_cursor,
+    get_response_cache,
+)
+from fakes import FakeClock, FakeResponse
+
+# TO RUN THESE TESTS LOCALLY USE: pytest --noconftest
+
+RXIV_DOI = "10.1101/2023.01.01.522534"
+JOURNAL_DOI = "10.1038/s41586-023-00001-1"
+
+
+class FakeSession:
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        return self.responses.pop(0)
+
+    def close(self):
+        pass
+
+
+class FakeFetcher:
+    """Serves canned responses by URL substring, recording GETs."""
+
+    max_workers = 4
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.urls = []
+
+    def get(self, service, url, params=None, stream=False):
+        url = url + unquote_plus(urlencode(params or {}))
+        self.urls.append(url)
+        for fragment, response in self.responses.items():
+            if fragment in url:
+                response.raise_for_status()
+                response.raw.seek(0)
+                return response
+        raise requests.HTTPError("404 Error")
+
+
+def make_pubmed_xml(*articles):
+    return "<PubmedArticleSet>" + "".join(
+        f"<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article>"
+        f"<Journal><Title>Journal</Title><JournalIssue><PubDate><Year>2023</Year><Month>Jan</Month>"
+        f"</PubDate></JournalIssue></Journal><ArticleTitle>{title}</ArticleTitle>"
+        f"<AuthorList><Author><LastName>Smith</LastName><ForeName>Jane</ForeName></Author></AuthorList>"
+        f"</Article></MedlineCitation><PubmedData><ArticleIdList>"
+        f"<ArticleId IdType=\"doi\">{doi}</ArticleId></ArticleIdList></PubmedData></PubmedArticle>"
+        for pmid, doi, title in articles
+    ) + "</PubmedArticleSet>"
+
+
+class TestPubUtils:
+
+    def test_throttle_spaces_requests(self):
+        clock = FakeClock()
+        throttle = ServiceThrottle(2, clock=clock, sleep=clock.sleep)
+        for _ in range(3):
+            throttle.wait()
+        assert clock.sleeps == [0.5, 0.5]
+        throttle.defer(3)
+        throttle.wait()
+        assert clock.sleeps[-1] == 3
+
+    def test_fetcher_honors_retry_after(self):
+        sleeps = []
+        fetcher = ExternalFetcher(rate_limits={"crossref": 1000}, sleep=sleeps.append)
+        fetcher.sessions["crossref"] = FakeSession([
+            FakeResponse(status_code=429, headers={"Retry-After": "2"}),
+            FakeResponse(status_code=200, body={"message": {}}),
+        ])
+        assert fetcher.get("crossref", "https://api.crossref.org/works/x").status_code == 200
+        assert any(abs(seconds - 2) < 0.1 for seconds in sleeps)
+
+    def test_fetcher_gives_up_on_long_retry_after(self):
+        fetcher = ExternalFetcher(rate_limits={"crossref": 1000}, sleep=lambda seconds: None)
+        fetcher.sessions["crossref"] = FakeSession([
+            FakeResponse(status_code=429, headers={"Retry-After": str(pub_utils.MAX_RETRY_AFTER + 1)}),
+        ])
+        with pytest.raises(requests.HTTPError):
+            fetcher.get("crossref", "https://api.crossref.org/works/x")
+        assert len(fetcher.sessions["crossref"].urls) == 1
+
+    def test_fetch_external_metadata(self):
+        fetcher = FakeFetcher({
+            f"works/{RXIV_DOI}": FakeResponse(body={"message": {"title": ["Preprint"]}}),
+            f"biorxiv/{RXIV_DOI}": FakeResponse(body={"collection": [{"title": "Preprint"}]}),
+            "esearch": FakeResponse(body={"esearchresult": {"idlist": ["123"]}}),
+            "efetch": FakeResponse(text=make_pubmed_xml(("123", RXIV_DOI, "Preprint"))),
+        })
+        results = fetch_external_metadata([RXIV_DOI, JOURNAL_DOI, RXIV_DOI], fetcher)
+        assert list(results) == [RXIV_DOI, JOURNAL_DOI]
+        assert results[RXIV_DOI] == {
+            "crossref": {"title": ["Preprint"]},
+            "rxiv": ("biorxiv", {"title": "Preprint"}),
+            "pmid": "123",
+            "pubmed": {
+                "title": "Preprint",
+                "abstract": None,
+                "authors": [{"first_name": "Jane", "last_name": "Smith"}],
+                "journal": "Journal",
+                "date_published": "2023-01",
+            },
+        }
+        assert results[JOURNAL_DOI] == {
+            "crossref": {}, "rxiv": (None, None), "pmid": None, "pubmed": None
+        }
+        # repeated DOIs are fetched once, with one ESearch and one EFetch for both
+        assert len(fetcher.urls) == 5
+        assert f"term={RXIV_DOI}[DOI] OR {JOURNAL_DOI}[DOI]" in fetcher.urls[-2]
+
+    def test_iter_pubmed_articles(self):
+        xml = make_pubmed_xml(("1", "10.1/a", "A"), ("2", "10.1/b", "B"), ("3", "10.1/c", "C"))
+        fetcher = FakeFetcher({"efetch": FakeResponse(text=xml)})
+        articles = list(pub_utils.iter_pubmed_articles(["1", "2", "3"], fetcher, batch_size=5))
+        assert [(pmid, doi, metadata["title"]) for pmid, doi, metadata in articles] == [
+            ("1", "10.1/a", "A"), ("2", "10.1/b", "B"), ("3", "10.1/c", "C")
+        ]
+        assert len(fetcher.urls) == 1 and "id=1,2,3" in fetcher.urls[0]
+
+    def test_fetch_external_metadata_cached(self, tmp_path):
+        responses = {
+            f"works/{JOURNAL_DOI}": FakeResponse(body={"message": {"title": ["Article"]}}),
+            "esearch": FakeResponse(body={"esearchresult": {"idlist": []}}),
+        }
+        fetcher = FakeFetcher(responses)
+        first = fetch_external_metadata([JOURNAL_DOI], fetcher, ResponseCache(LocalCacheStore(str(tmp_path))))
+        fetcher = FakeFetcher(responses)
+        cache = ResponseCache(LocalCacheStore(str(tmp_path)))
+        assert fetch_external_metadata([JOURNAL_DOI], fetcher, cache) == first
+        # the CrossRef record and the PMID miss both come from the cache
+        assert fetcher.urls == []
+        assert (cache.hits, cache.misses) == (2, 0)
+
+
+class TestResponseCache:
+
+    def test_ttl_and_negative_entries(self, tmp_path):
+        clock = FakeClock()
+        cache = ResponseCache(
+            LocalCacheStore(str(tmp_path)), ttls={"crossref": 100}, negative_ttl=10, clock=clock
+        )
+        cache.put("crossref", JOURNAL_DOI, {"title": ["Article"]})
+        cache.put("pmid", JOURNAL_DOI, None)
+        assert cache.get("crossref", JOURNAL_DOI) == (True, {"title": ["Article"]})
+        assert cache.get("pmid", JOURNAL_DOI) == (True, None)
+        clock.now = 50
+        assert cache.get("crossref", JOURNAL_DOI) == (True, {"title": ["Article"]})
+        assert cache.get("pmid", JOURNAL_DOI) == (False, None)
+        clock.now = 150
+        assert cache.get("crossref", JOURNAL_DOI) == (False, None)
+
+    def test_flush_evicts_least_recently_used(self, tmp_path):
+        clock = FakeClock()
+        store = LocalCacheStore(str(tmp_path))
+        cache = ResponseCache(store, max_bytes=50, clock=clock)  # room for two entries
+        for second, doi in enumerate(["10.1/a", "10.1/b", "10.1/c"]):
+            clock.now = second
+            cache.put("crossref", doi, {"title": "x" * 10})
+        clock.now = 5
+        cache.get("crossref", "10.1/a")
+        cache.flush()
+        reloaded = ResponseCache(store, clock=clock)
+        assert reloaded.get("crossref", "10.1/a")[0]
+        assert not reloaded.get("crossref", "10.1/b")[0]
+        assert reloaded.get("crossref", "10.1/c")[0]
+        assert store.get(ResponseCache.make_name("crossref", "10.1/b")) is None
+
+    def test_s3_store_encryption(self, monkeypatch):
+        puts = []
+        s3_client = SimpleNamespace(put_object=lambda **kwargs: puts.append(kwargs))
+        s3_connection = SimpleNamespace(client=s3_client, bucket="foursight-test", encryption="key-id")
+        monkeypatch.delenv(pub_utils.LOCAL_CACHE_DIR_ENV, raising=False)
+        cache = get_response_cache(SimpleNamespace(connections={"s3": s3_connection}))
+        cache.store.put("entry", b"{}")
+        assert puts[-1]["ServerSideEncryption"] == "aws:kms"
+        assert puts[-1]["SSEKMSKeyId"] == "key-id"
+        S3CacheStore(s3_client, "foursight-test").put("entry", b"{}")
+        assert "ServerSideEncryption" not in puts[-1]
+
+
+class FakeBody:
+
+    def __init__(self, data):
+        self.data = data
+        self.closed = False
+
+    def iter_chunks(self):
+        for start in range(0, len(self.data), 7):  # chunks split lines
+            yield self.data[start:start + 7]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRecordsS3Client:
+
+    def __init__(self, data):
+        self.data = data
+        self.ranges = []
+
+    def get_object(self, Bucket, Key, Range=None):
+        self.ranges.append(Range)
+        offset = int(Range[len("bytes="):-1]) if Range else 0
+        if offset >= len(self.data):
+            raise ClientError({"Error": {"Code": "InvalidRange"}}, "GetObject")
+        return {"Body": FakeBody(self.data[offset:])}
+
+
+class TestInputLines:
+
+    records = f"{JOURNAL_DOI}\r\n{RXIV_DOI}|SMAPB1234567\n\nnot-a-doi\n".encode()
+
+    def test_local_file_resumes_at_offset(self, tmp_path):
+        path = tmp_path / "records.txt"
+        path.write_bytes(self.records)
+        lines = list(pub_utils.iter_input_lines(str(path)))
+        assert [line for line, _ in lines] == [
+            JOURNAL_DOI, f"{RXIV_DOI}|SMAPB1234567", "", "not-a-doi"
+        ]
+        assert lines[-1][1] == len(self.records)
+        resumed = list(pub_utils.iter_input_lines(str(path), lines[0][1]))
+        assert resumed == lines[1:]
+
+    def test_s3_object_ranged_reads(self):
+        s3_client = FakeRecordsS3Client(self.records)
+        lines = list(pub_utils.iter_input_lines("s3://bucket/records.txt", s3_client=s3_client))
+        assert [line for line, _ in lines][:2] == [JOURNAL_DOI, f"{RXIV_DOI}|SMAPB1234567"]
+        resumed = list(pub_utils.iter_input_lines("s3://bucket/records.txt", lines[1][1], s3_client))
+        assert resumed == lines[2:]
+        assert s3_client.ranges == [None, f"bytes={lines[1][1]}-"]
+        assert list(pub_utils.iter_input_lines("s3://bucket/records.txt", len(self.records), s3_client)) == []
+
+    def test_find_committed_input_cursor(self):
+        first = {"input_file": "s3://bucket/dois.txt", "next_offset": 100, "records_read": 2}
+        second = dict(first, check_uuid="run_2", next_offset=200, records_read=4)
+        check_results = [
+            {"full_output": {"input": "10.1000/xyz123"}},  # doi_acc_list run in between
+            {"full_output": ["Traceback (most recent call last):"]},
+            {"full_output": {"input_cursor": first, "pending_input_cursor": second}},
+            {"full_output": {"input_cursor": first}},
+        ]
+        # pending chunk not (yet) written by update_pub_metadata
+        action_results = [{"output": {"post_success": []}}]
+        assert find_committed_input_cursor(check_results, action_results, first["input_file"]) == first
+        action_results.append({"output": {"input_cursor": second}})
+        assert find_committed_input_cursor(check_results, action_results, first["input_file"]) == second
+        assert find_committed_input_cursor(check_results, action_results, "other.txt") is None
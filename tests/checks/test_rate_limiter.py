@@ -0,0 +1,112 @@
+import json
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+from chalicelib_smaht.checks.helpers.rate_limiter import (
+    LocalFileStore,
+    RateLimiter,
+    S3BucketStore,
+    get_rate_limiter,
+)
+from fakes import FakeClock
+
+# TO RUN THESE TESTS LOCALLY USE: pytest --noconftest
+
+
+class ConditionalS3Client:
+    """Local stand-in for S3 conditional GET/PUT of small objects."""
+
+    def __init__(self):
+        self.objects = {}  # key --> (body, etag)
+        self.writes = 0
+        self.encryption_args = []
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        body, etag = self.objects[Key]
+        return {"Body": SimpleNamespace(read=lambda: body), "ETag": etag}
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        self.encryption_args.append(kwargs)
+        current = self.objects.get(Key)
+        if (IfNoneMatch == "*" and current) or (IfMatch and (not current or current[1] != IfMatch)):
+            raise ClientError({"Error": {"Code": "PreconditionFailed"}}, "PutObject")
+        self.writes += 1
+        self.objects[Key] = (Body, '"etag-%s"' % self.writes)
+
+
+class TestRateLimiter:
+
+    def test_acquire_waits_for_refill(self, tmp_path):
+        clock = FakeClock(now=1000.0)
+        limiter = RateLimiter(
+            LocalFileStore(str(tmp_path)), budgets={"default": (2.0, 3)},
+            clock=clock.time, sleep=clock.sleep,
+        )
+        assert [limiter.acquire("search") for _ in range(3)] == [0, 0, 0]
+        assert limiter.acquire("search") == 0.5
+        clock.now += 10  # refill is capped at capacity
+        assert [limiter.acquire("search") for _ in range(3)] == [0, 0, 0]
+        assert limiter.acquire("search", tokens=2) == 1.0
+
+    def test_acquire_fails_open(self, tmp_path):
+        clock = FakeClock(now=1000.0)
+        limiter = RateLimiter(
+            LocalFileStore(str(tmp_path)), budgets={"default": (0.01, 1)},
+            max_wait=5, clock=clock.time, sleep=clock.sleep,
+        )
+        limiter.acquire("counts")
+        assert limiter.acquire("counts") == 0  # would wait 100s, so proceeds
+        assert clock.sleeps == []
+
+        class BrokenStore:
+            def read(self, name):
+                raise Exception("store unavailable")
+
+        assert RateLimiter(BrokenStore()).acquire("search") == 0
+
+    def test_s3_store_conditional_writes(self):
+        s3_client = ConditionalS3Client()
+        store = S3BucketStore(s3_client, "foursight-bucket")
+        assert store.read("search") == (None, None)
+        assert store.write("search", {"tokens": 1, "updated": 0}, None)
+        assert not store.write("search", {"tokens": 2, "updated": 0}, None)
+        state, version = store.read("search")
+        assert state == {"tokens": 1, "updated": 0}
+        assert store.write("search", {"tokens": 0, "updated": 1}, version)
+        assert not store.write("search", {"tokens": 5, "updated": 1}, version)  # stale ETag
+        assert json.loads(s3_client.objects["rate_limits/search"][0])["tokens"] == 0
+        assert s3_client.encryption_args[-1] == {}
+
+    def test_s3_store_encryption(self):
+        s3_client = ConditionalS3Client()
+        store = S3BucketStore(s3_client, "foursight-bucket", encryption="kms-key-id")
+        assert store.write("search", {"tokens": 1, "updated": 0}, None)
+        assert s3_client.encryption_args == [
+            {"ServerSideEncryption": "aws:kms", "SSEKMSKeyId": "kms-key-id"}
+        ]
+
+    def test_shared_budget_across_limiters(self):
+        s3_client = ConditionalS3Client()
+        clock = FakeClock(now=1000.0)
+        limiters = [
+            RateLimiter(S3BucketStore(s3_client, "bucket"), budgets={"default": (1.0, 2)},
+                        clock=clock.time, sleep=clock.sleep)
+            for _ in range(2)
+        ]
+        assert limiters[0].acquire("search") == 0
+        assert limiters[1].acquire("search") == 0
+        assert limiters[0].acquire("search") == 1.0
+
+    def test_get_rate_limiter(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("FOURSIGHT_RATE_LIMIT_DIR", str(tmp_path))
+        assert isinstance(get_rate_limiter(SimpleNamespace()).store, LocalFileStore)
+        monkeypatch.delenv("FOURSIGHT_RATE_LIMIT_DIR")
+        connection = SimpleNamespace(
+            connections={"s3": SimpleNamespace(client=ConditionalS3Client(), bucket="bucket")}
+        )
+        assert isinstance(get_rate_limiter(connection).store, S3BucketStore)
+        monkeypatch.setenv("S3_ENCRYPT_KEY_ID", "kms-key-id")
+        assert get_rate_limiter(connection).store.encryption == "kms-key-id"
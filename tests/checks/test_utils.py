@@ -0,0 +1,616 @@
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+import requests
+from botocore.exceptions import ClientError
+from dcicutils import ff_utils
+
+from chalicelib_smaht.checks.helpers.utils import (
+    LAMBDA_TIMEOUT,
+    RESULT_SAVE_MARGIN,
+    PortalCache,
+    PortalClient,
+    PortalRequestError,
+    AdaptiveChunkSize,
+    S3ObjectInfo,
+    continue_action,
+    find_s3_objects,
+    get_action_checkpoint,
+    get_last_result,
+    is_transient_error,
+    is_unprocessed_error,
+    iter_concurrently,
+    iter_results,
+    make_embed_request,
+    retry_with_backoff,
+    run_concurrently,
+    validate_items_existence,
+)
+from fakes import SERVER, FakeResponse, make_connection
+
+# TO RUN THESE TESTS LOCALLY USE: pytest --noconftest
+
+
+class FakeS3Client:
+    """Local stand-in for the boto3 S3 client calls used by the helpers."""
+
+    def __init__(self, objects, page_size=2, denied=()):
+        self.objects = objects  # {bucket: {key: (size, storage_class)}}
+        self.page_size = page_size
+        self.denied = denied  # buckets whose requests are refused
+        self.calls = []
+
+    def _check_access(self, Bucket, operation_name):
+        if Bucket in self.denied:
+            raise ClientError(
+                {"Error": {"Code": "AccessDenied", "Message": "Access Denied"}},
+                operation_name,
+            )
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None):
+        self.calls.append(("list", Bucket, Prefix))
+        self._check_access(Bucket, "ListObjectsV2")
+        keys = sorted(key for key in self.objects.get(Bucket, {}) if key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + self.page_size]
+        response = {
+            "Contents": [
+                {"Key": key, "Size": self.objects[Bucket][key][0],
+                 "StorageClass": self.objects[Bucket][key][1]}
+                for key in page
+            ],
+            "IsTruncated": start + self.page_size < len(keys),
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + self.page_size)
+        return response
+
+    def head_object(self, Bucket, Key):
+        self.calls.append(("head", Bucket, Key))
+        self._check_access(Bucket, "HeadObject")
+        if Key not in self.objects.get(Bucket, {}):
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        size, storage_class = self.objects[Bucket][Key]
+        head_info = {"ContentLength": size}
+        if storage_class != "STANDARD":
+            head_info["StorageClass"] = storage_class
+        return head_info
+
+
+class FakeCheckResult:
+    """Local stand-in for a CheckResult backed by a dict store."""
+
+    store = {}
+
+    def __init__(self, connection, name):
+        self.name = name
+        self.extension = ".json"
+
+    def get_result_by_uuid(self, uuid):
+        record = self.store.get("%s/%s.json" % (self.name, uuid))
+        return json.loads(record) if record else None
+
+    @staticmethod
+    def dumps_json(d):
+        return json.dumps(d, default=str)
+
+
+class FakeS3Connection:
+    """Local stand-in for foursight's S3 connection, sharing the
+    FakeCheckResult store.
+    """
+
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def put_object(self, key, value):
+        if self.fail:  # errors are logged, not raised
+            return None
+        FakeCheckResult.store[key] = value
+        return key, value
+
+
+class TestPortalClient:
+
+    def test_iter_concurrently(self):
+        def square_or_fail(item):
+            if item == 3:
+                raise ValueError("bad item")
+            return item * item
+
+        results = {}
+        errors = {}
+        for item, result, error in iter_concurrently(square_or_fail, range(6), max_workers=2):
+            if error:
+                errors[item] = error
+            else:
+                results[item] = result
+        assert results == {0: 0, 1: 1, 2: 4, 4: 16, 5: 25}
+        assert list(errors) == [3]
+
+    def test_iter_concurrently_should_stop(self):
+        submitted = []
+
+        def record(item):
+            submitted.append(item)
+            return item
+
+        processed = [
+            item for item, _, _ in iter_concurrently(
+                record, range(10), max_workers=1, should_stop=lambda: len(submitted) >= 3
+            )
+        ]
+        assert sorted(processed) == [0, 1, 2]
+
+    def test_run_concurrently(self):
+        def process(item):
+            time.sleep(0.01 * (5 - item))  # finish in reverse order
+            if item % 2:
+                raise Exception("odd item %s" % item)
+            return item * 10
+
+        results, errors, not_started = run_concurrently(process, [4, 3, 2, 1, 0], max_workers=5)
+        assert list(results.items()) == [(4, 40), (2, 20), (0, 0)]
+        assert list(errors.items()) == [(3, "odd item 3"), (1, "odd item 1")]
+        assert not_started == []
+
+    def test_run_concurrently_time_limit(self):
+        start = datetime.utcnow() - timedelta(seconds=10)
+        results, errors, not_started = run_concurrently(
+            lambda item: item, ["a", "b"], start=start, time_limit=5
+        )
+        assert results == {}
+        assert errors == {}
+        assert not_started == ["a", "b"]
+
+    def test_run_concurrently_task_timeout(self):
+        results, errors, not_started = run_concurrently(
+            lambda item: time.sleep(item), [0, 1], max_workers=2, task_timeout=0.2
+        )
+        assert list(results) == [0]
+        assert "Timed out" in errors[1]
+        assert not_started == []
+
+    def test_run_concurrently_lambda_deadline(self):
+        # Started just short of the Lambda timeout: the running item is
+        # abandoned at the deadline and the rest are never started
+        start = datetime.utcnow() - timedelta(
+            seconds=LAMBDA_TIMEOUT - RESULT_SAVE_MARGIN - 0.2
+        )
+        results, errors, not_started = run_concurrently(
+            lambda item: time.sleep(item), [1, 2], start=start, max_workers=1
+        )
+        assert results == {}
+        assert "Lambda time limit" in errors[1]
+        assert not_started == [2]
+
+    @patch("dcicutils.ff_utils.authorized_request")
+    def test_request_rate_limited(self, mock_request):
+        mock_request.side_effect = lambda url, **kwargs: FakeResponse(
+            {"@graph": [{"uuid": "uuid_1"}] if "from=0" in url else []}
+        )
+        rate_limiter = MagicMock()
+        portal_client = PortalClient(make_connection(), rate_limiter=rate_limiter)
+        portal_client.search_metadata("search/?type=File", page_limit=1)
+        portal_client.get_metadata("uuid_1")
+        # One search token for the two-page search; item GETs are not budgeted
+        assert mock_request.call_count == 3
+        assert rate_limiter.acquire.call_args_list == [call("search", tokens=1)]
+        rate_limiter.reset_mock()
+        queries = ["search/?type=File&uuid=uuid_%s" % idx for idx in range(3)]
+        list(portal_client.search_concurrently(queries))
+        # Concurrent searches take their tokens in one batch
+        assert rate_limiter.acquire.call_args_list == [call("search", tokens=3)]
+
+    def test_request_without_retries(self):
+        portal_client = PortalClient(make_connection())
+        portal_client.session.post = MagicMock(return_value=FakeResponse({}, status_code=400))
+        with pytest.raises(PortalRequestError) as error:
+            portal_client.request("embed", verb="POST", retry=False, data="{}")
+        assert error.value.status_code == 400
+        assert portal_client.session.post.call_count == 1
+
+    def test_make_url(self):
+        portal_client = PortalClient(make_connection())
+        assert portal_client.make_url("/search/?type=File") == SERVER + "/search/?type=File"
+        assert portal_client.make_url(SERVER + "/embed") == SERVER + "/embed"
+
+    @patch("dcicutils.ff_utils.authorized_request")
+    def test_search_metadata_paginates(self, mock_request):
+        items = [{"uuid": str(idx)} for idx in range(5)]
+
+        def paged_search(url, **kwargs):
+            params = ff_utils.get_url_params(url)
+            start = int(params["from"][0])
+            limit = int(params["limit"][0])
+            return FakeResponse({"@graph": items[start:start + limit]})
+
+        mock_request.side_effect = paged_search
+        portal_client = PortalClient(make_connection())
+        result = portal_client.search_metadata("search/?type=File", page_limit=2)
+        assert result == items
+        assert mock_request.call_count == 3
+
+    @patch("dcicutils.ff_utils.authorized_request")
+    def test_map_preserves_order(self, mock_request):
+        mock_request.side_effect = lambda url, **kwargs: FakeResponse(
+            {"@id": url[len(SERVER):]}
+        )
+        portal_client = PortalClient(make_connection())
+        result = portal_client.map(portal_client.get_metadata, ["a", "b", "c"])
+        assert result == [{"@id": "/a"}, {"@id": "/b"}, {"@id": "/c"}]
+
+
+class TestPortalCache:
+
+    def test_make_key(self):
+        assert PortalCache.make_key(SERVER + "/uuid_1/?frame=raw&datastore=database") == (
+            SERVER + "/uuid_1?datastore=database", "raw"
+        )
+        assert PortalCache.make_key(SERVER + "/search/?type=File&field=uuid") == \
+            PortalCache.make_key(SERVER.upper().replace("HTTPS", "https") + "/search?field=uuid&type=File")
+
+    def test_lru_bounds(self):
+        cache = PortalCache(max_entries=2, max_bytes=80)
+        for idx in range(3):
+            cache.put(("%s/item_%s" % (SERVER, idx), ""), {"uuid": "item_%s" % idx})
+        assert len(cache) == 2
+        assert cache.get(("%s/item_0" % SERVER, "")) is None
+        assert cache.get(("%s/item_1" % SERVER, "")) == {"uuid": "item_1"}
+        assert cache.hits == 1 and cache.misses == 1
+        cache.put(("%s/item_3" % SERVER, ""), {"uuid": "item_3", "padding": "x" * 30})
+        # item_2 is evicted as least recently used, then item_1 for the byte bound
+        assert len(cache) == 1
+        assert cache.get(("%s/item_3" % SERVER, ""))["uuid"] == "item_3"
+        assert cache.size_bytes <= 80
+        cache.put(("%s/too_big" % SERVER, ""), {"padding": "x" * 100})
+        assert len(cache) == 1
+
+    @patch("dcicutils.ff_utils.authorized_request")
+    def test_portal_client_cache(self, mock_request):
+        def respond(url, verb="GET", **kwargs):
+            if "/search/" in url:
+                return FakeResponse({"@graph": [{"uuid": "uuid_1"}]})
+            return FakeResponse({"uuid": "uuid_1", "accession": "SMADO1234567", "verb": verb})
+
+        mock_request.side_effect = respond
+        cache = PortalCache()
+        run_cache = cache.for_run()
+        portal_client = PortalClient(make_connection(), cache=run_cache)
+        item = portal_client.get_metadata("SMADO1234567")
+        item["mutated"] = True
+        assert portal_client.get_metadata("/SMADO1234567/") == {
+            "uuid": "uuid_1", "accession": "SMADO1234567", "verb": "GET"
+        }
+        portal_client.search_metadata("search/?type=Donor")
+        portal_client.search_metadata("search/?type=Donor")
+        assert mock_request.call_count == 2
+        assert run_cache.stats() == {"hits": 2, "misses": 2}
+        # database reads are always current
+        portal_client.get_metadata("SMADO1234567", add_on="datastore=database")
+        portal_client.get_metadata("SMADO1234567", add_on="datastore=database")
+        assert mock_request.call_count == 4
+        # PATCH by UUID drops the item cached by accession and searches
+        mock_request.side_effect = lambda url, verb="GET", **kwargs: FakeResponse(
+            {"@graph": [{"uuid": "uuid_1", "accession": "SMADO1234567"}]}
+        ) if verb == "PATCH" else respond(url, verb=verb)
+        PortalClient(make_connection(), cache=cache).patch_metadata({"tags": ["a"]}, "uuid_1")
+        assert len(cache) == 0
+        portal_client.get_metadata("SMADO1234567")
+        assert run_cache.stats() == {"hits": 2, "misses": 3}
+        assert cache.for_run().stats() == {"hits": 0, "misses": 0}
+
+
+class TestHelpers:
+
+    @patch("dcicutils.ff_utils.authorized_request")
+    def test_validate_items_existence(self, mock_request):
+        def get_item(url, **kwargs):
+            identifier = url[len(SERVER) + 1:].split("?")[0]
+            if identifier == "missing":
+                raise Exception("Bad status code for GET request: 404")
+            return FakeResponse({"uuid": identifier})
+
+        mock_request.side_effect = get_item
+        found, not_found = validate_items_existence(
+            ["uuid_1", "missing", "uuid_2"], make_connection()
+        )
+        assert found == [{"uuid": "uuid_1"}, {"uuid": "uuid_2"}]
+        assert not_found == ["missing"]
+
+    @patch("dcicutils.ff_utils.authorized_request")
+    def test_validate_items_existence_searches(self, mock_request):
+        uuid_1 = "5e5e3a8a-1a3b-4a39-9a3f-0a1b2c3d4e5f"
+        uuid_2 = "6f6e3a8a-1a3b-4a39-9a3f-0a1b2c3d4e5f"
+        items = [
+            {"uuid": uuid_1, "accession": "SMAMR1234567", "title": "MWFR 1", "status": "in review"},
+            {"uuid": uuid_2, "accession": "SMAMR7654321", "title": "MWFR 2", "status": "in review"},
+        ]
+        requested = []
+
+        def search_or_get(url, **kwargs):
+            requested.append(url)
+            params = ff_utils.get_url_params(url)
+            if "/search/" in url:
+                assert params["type"] == ["MetaWorkflowRun"]
+                return FakeResponse({"@graph": [
+                    {field: item[field] for field in params["field"]} for item in items
+                    if item["uuid"] in params.get("uuid", [])
+                    or item["accession"] in params.get("accession", [])
+                ]})
+            identifier = url[len(SERVER) + 1:].split("?")[0]
+            for item in items:
+                if identifier == item["uuid"]:
+                    return FakeResponse(item)
+            raise Exception("Bad status code for GET request: 404")
+
+        mock_request.side_effect = search_or_get
+        identifiers = [
+            "SMAMR7654321", "/meta-workflow-runs/%s/" % uuid_1, "missing",
+            "6f6e3a8a-0000-4a39-9a3f-0a1b2c3d4e5f",
+        ]
+        found, not_found = validate_items_existence(
+            identifiers, make_connection(), item_type="MetaWorkflowRun", fields=["uuid", "title"]
+        )
+        # Field values come from the projected searches
+        assert found == [
+            {"uuid": uuid_2, "accession": "SMAMR7654321", "title": "MWFR 2"},
+            {"uuid": uuid_1, "accession": "SMAMR1234567", "title": "MWFR 1"},
+        ]
+        assert not_found == ["missing", "6f6e3a8a-0000-4a39-9a3f-0a1b2c3d4e5f"]
+        searches = [url for url in requested if "/search/" in url]
+        # One search per identifier kind; GETs just for identifiers not found by search
+        assert len(searches) == 2
+        assert ff_utils.get_url_params(searches[0])["field"] == ["uuid", "accession", "title"]
+        gets = [url for url in requested if "/search/" not in url]
+        assert len(gets) == 2
+        assert ff_utils.get_url_params(gets[0]) == {"frame": ["object"]}
+
+        requested.clear()
+        found, not_found = validate_items_existence(
+            identifiers, make_connection(), item_type="MetaWorkflowRun", fields=["title"],
+            from_database=True,
+        )
+        # Opting in to current values GETs found items from the database too
+        assert found == [items[1], items[0]]
+        gets = [url for url in requested if "/search/" not in url]
+        assert len(gets) == 4
+        assert ff_utils.get_url_params(gets[0]) == {"frame": ["object"], "datastore": ["database"]}
+
+    @patch("dcicutils.ff_utils.authorized_request")
+    def test_make_embed_request(self, mock_request):
+        def embed(url, data=None, **kwargs):
+            return FakeResponse([{"uuid": an_id} for an_id in json.loads(data)["ids"]])
+
+        mock_request.side_effect = embed
+        ids = ["id_%s" % idx for idx in range(12)]
+        result = make_embed_request(ids, ["uuid"], make_connection())
+        assert result == [{"uuid": an_id} for an_id in ids]
+        assert make_embed_request("id_0", "uuid", make_connection()) == {"uuid": "id_0"}
+
+    @patch("dcicutils.ff_utils.authorized_request")
+    def test_make_embed_request_adapts_to_server_max(self, mock_request):
+        chunk_sizes = []
+
+        def embed(url, data=None, **kwargs):
+            ids = json.loads(data)["ids"]
+            chunk_sizes.append(len(ids))
+            if len(ids) > 7:
+                raise PortalRequestError("Bad status code for POST request: 400", 400)
+            time.sleep(0.001 * (hash(ids[0]) % 5))  # complete out of order
+            return FakeResponse([{"uuid": an_id} for an_id in ids])
+
+        mock_request.side_effect = embed
+        ids = ["id_%s" % idx for idx in range(100)]
+        embeds = make_embed_request(
+            ids, ["uuid"], make_connection(), stream=True, max_chunk_size=10
+        )
+        assert not isinstance(embeds, list)
+        assert list(embeds) == [{"uuid": an_id} for an_id in ids]
+        assert max(chunk_sizes) > 5
+        assert [size for size in chunk_sizes if size > 7]  # probed past the max
+        assert chunk_sizes[-1] <= 7
+
+        # Default chunks never exceed the 5 IDs /embed accepts
+        chunk_sizes.clear()
+        make_embed_request(ids, ["uuid"], make_connection())
+        assert max(chunk_sizes) == 5
+
+    @patch("dcicutils.ff_utils.authorized_request")
+    def test_make_embed_request_raises_other_errors(self, mock_request):
+        chunk_sizes = []
+
+        def embed(url, data=None, **kwargs):
+            chunk_sizes.append(len(json.loads(data)["ids"]))
+            raise PortalRequestError("Bad status code for POST request: 403", 403)
+
+        mock_request.side_effect = embed
+        with pytest.raises(PortalRequestError, match="403"):
+            make_embed_request(["id_%s" % idx for idx in range(5)], ["uuid"], make_connection())
+        assert chunk_sizes == [5]  # not split as a size rejection
+
+    def test_adaptive_chunk_size(self):
+        chunk_sizer = AdaptiveChunkSize(5, max_size=50, target_latency=10)
+        chunk_sizer.accept(5, 1)
+        assert chunk_sizer.size == 6
+        chunk_sizer.accept(6, 1)
+        assert chunk_sizer.reject(7) == 6
+        assert chunk_sizer.size == 6
+        chunk_sizer.accept(6, 1)
+        assert chunk_sizer.size == 6
+        chunk_sizer.accept(6, 30)
+        assert chunk_sizer.size == 3
+
+    @patch("time.sleep")
+    def test_retry_with_backoff(self, mock_sleep):
+        calls = []
+
+        def flaky(value):
+            calls.append(value)
+            if len(calls) < 3:
+                raise PortalRequestError("Bad status code for PATCH request for %s/uuid_1: 503" % SERVER, 503)
+            return value
+
+        assert retry_with_backoff(flaky, "done", attempts=3, base_delay=1) == "done"
+        assert [call[0][0] for call in mock_sleep.call_args_list] == [1, 2]
+
+        def not_found():
+            raise PortalRequestError("Bad status code for GET request for %s/uuid_500: 404" % SERVER, 404)
+
+        with pytest.raises(PortalRequestError, match="404"):
+            retry_with_backoff(not_found)
+        assert mock_sleep.call_count == 2
+        assert is_transient_error(TimeoutError("Timed out after 5 seconds"))
+        assert is_transient_error(PortalRequestError("Too many requests", 429))
+        # ff_utils has already retried errors it raises, so they are not retried again
+        assert not is_transient_error(Exception("Bad status code for GET request for url: 503"))
+
+    def test_is_unprocessed_error(self):
+        assert is_unprocessed_error(PortalRequestError("Too many requests", 429))
+        assert is_unprocessed_error(requests.ConnectTimeout("connect timed out"))
+        # the portal may have created the item before these
+        assert not is_unprocessed_error(PortalRequestError("Bad gateway", 502))
+        assert not is_unprocessed_error(requests.ReadTimeout("read timed out"))
+
+
+class TestFindS3Objects:
+
+    def test_find_s3_objects(self):
+        s3_client = FakeS3Client({
+            "outfile": {
+                "uuid_1/file_1.bam": (10, "STANDARD"),
+                "uuid_1/file_1.bam.bai": (1, "STANDARD"),
+                "uuid_1/file_1.bam.md5": (1, "STANDARD"),
+                "uuid_2/file_2.vcf": (5, "DEEP_ARCHIVE"),
+                "no_prefix.txt": (3, "GLACIER"),
+            },
+            "raw": {
+                "uuid_3/file_3.fastq.gz": (20, "STANDARD"),
+            },
+        })
+        keys = [
+            "uuid_1/file_1.bam", "uuid_1/file_1.bam.md5", "uuid_2/file_2.vcf",
+            "uuid_3/file_3.fastq.gz", "uuid_4/missing.bam", "no_prefix.txt",
+        ]
+        result = find_s3_objects(s3_client, keys, ["outfile", "raw"])
+        assert result == {
+            "uuid_1/file_1.bam": S3ObjectInfo("outfile", 10, "STANDARD"),
+            "uuid_1/file_1.bam.md5": S3ObjectInfo("outfile", 1, "STANDARD"),
+            "uuid_2/file_2.vcf": S3ObjectInfo("outfile", 5, "DEEP_ARCHIVE"),
+            "uuid_3/file_3.fastq.gz": S3ObjectInfo("raw", 20, "STANDARD"),
+            "no_prefix.txt": S3ObjectInfo("outfile", 3, "GLACIER"),
+        }
+        # one listing per prefix (uuid_1 is paginated), one HEAD for unprefixed key,
+        # and only keys not found in the first bucket are looked up in the second
+        outfile_calls = [call for call in s3_client.calls if call[1] == "outfile"]
+        raw_calls = [call for call in s3_client.calls if call[1] == "raw"]
+        assert len([call for call in outfile_calls if call[2] == "uuid_1/"]) == 2
+        assert ("head", "outfile", "no_prefix.txt") in outfile_calls
+        assert sorted(call[2] for call in raw_calls) == ["uuid_3/", "uuid_4/"]
+
+    @pytest.mark.parametrize("keys", [["uuid_1/file_1.bam"], ["no_prefix.txt"]])
+    def test_find_s3_objects_raises_on_s3_error(self, keys):
+        s3_client = FakeS3Client({"outfile": {}}, denied=("raw",))
+        with pytest.raises(ClientError):
+            find_s3_objects(s3_client, keys, ["outfile", "raw"])
+
+    def test_find_s3_objects_no_keys(self):
+        s3_client = FakeS3Client({})
+        assert find_s3_objects(s3_client, [], ["outfile"]) == {}
+        assert s3_client.calls == []
+
+
+class FakeRunResult:
+    """Local stand-in for a CheckResult history, most recent first."""
+
+    def __init__(self, results):
+        self.results = results
+
+    def get_result_history(self, start, limit):
+        history = [
+            [result["status"], None, {"uuid": result["uuid"]}, True] for result in self.results
+        ]
+        return history[start:start + limit], len(history)
+
+    def get_result_by_uuid(self, uuid):
+        return next(result for result in self.results if result["uuid"] == uuid)
+
+
+class TestGetLastResult:
+
+    def test_skips_errored_results(self):
+        results = FakeRunResult([
+            {"uuid": "3", "status": "ERROR", "full_output": ["Traceback (most recent call last):"]},
+            {"uuid": "2", "status": "WARN", "full_output": {"input_cursor": {"next_offset": 10}}},
+            {"uuid": "1", "status": "PASS", "full_output": {}},
+        ])
+        assert get_last_result(results)["uuid"] == "2"
+        assert get_last_result(results, skip_statuses=("ERROR", "WARN"))["uuid"] == "1"
+        assert get_last_result(results, limit=1) is None
+        assert [result["uuid"] for result in iter_results(results)] == ["2", "1"]
+
+
+class TestContinueAction:
+
+    @patch("chalicelib_smaht.checks.helpers.utils.CheckResult", FakeCheckResult)
+    def test_continue_action(self):
+        FakeCheckResult.store = {
+            "a_check/run_1.json": json.dumps({"uuid": "run_1", "full_output": {"items": [1, 2, 3, 4]}}),
+        }
+        app_utils = MagicMock()
+        action = SimpleNamespace(name="an_action")
+        kwargs = {
+            "check_name": "a_check", "called_by": "run_1", "uuid": "action_1",
+            "_run_info": {}, "concurrency": 4,
+        }
+        connection = make_connection()
+        connection.connections = {"s3": FakeS3Connection(), "es": None}
+        with patch.dict(sys.modules, {"chalicelib_smaht.app_utils": app_utils}):
+            checkpoint = continue_action(connection, action, kwargs, [3, 4], 2)
+        assert checkpoint["continuation"] == 1
+        assert checkpoint["cursor"] == 2
+        assert checkpoint["remaining"] == [3, 4]
+        queue_args = app_utils.app_utils_obj.queue_action.call_args
+        assert queue_args[0][:2] == ("test", "an_action")
+        params = queue_args[1]["params"]
+        assert params["check_name"] == "a_check"
+        assert params["concurrency"] == 4
+        assert "uuid" not in params and "_run_info" not in params
+        # Continuation reads the ledger from the copied check record, stored
+        # outside the check's timestamped history
+        assert params["called_by"].startswith("action_checkpoints/")
+        assert set(FakeCheckResult.store) == {
+            "a_check/run_1.json", "a_check/%s.json" % params["called_by"]
+        }
+        new_record = FakeCheckResult(None, "a_check").get_result_by_uuid(params["called_by"])
+        assert get_action_checkpoint(new_record["full_output"]) == checkpoint
+        assert new_record["uuid"] == "run_1"
+        assert get_action_checkpoint({"items": [1]}) == {}
+
+    @patch("chalicelib_smaht.checks.helpers.utils.CheckResult", FakeCheckResult)
+    def test_continue_action_checkpoint_not_stored(self):
+        FakeCheckResult.store = {"a_check/run_1.json": json.dumps({"full_output": {}})}
+        app_utils = MagicMock()
+        kwargs = {"check_name": "a_check", "called_by": "run_1"}
+        connection = make_connection()
+        connection.connections = {"s3": FakeS3Connection(fail=True), "es": None}
+        with patch.dict(sys.modules, {"chalicelib_smaht.app_utils": app_utils}):
+            with pytest.raises(Exception, match="not continued"):
+                continue_action(connection, SimpleNamespace(name="an_action"), kwargs, [1], 0)
+        app_utils.app_utils_obj.queue_action.assert_not_called()
+
+    @patch("chalicelib_smaht.checks.helpers.utils.CheckResult", FakeCheckResult)
+    def test_continue_action_limit(self):
+        checkpoint = {"continuation": 2, "origin": "run_1", "cursor": 10, "remaining": [1]}
+        FakeCheckResult.store = {
+            "a_check/run_3.json": json.dumps({"full_output": {"action_checkpoint": checkpoint}}),
+        }
+        kwargs = {"check_name": "a_check", "called_by": "run_3"}
+        action = SimpleNamespace(name="an_action")
+        assert continue_action(make_connection(), action, kwargs, [1], 0, max_continuations=2) is None
+        assert continue_action(make_connection(), action, kwargs, [], 1) is None
@@ -1,8 +1,22 @@
+from datetime import datetime, timezone
 from unittest.mock import patch
 import json
 
+import pytest
+from types import SimpleNamespace
+
 from chalicelib_smaht.checks.helpers.wfr_utils import (
+    MetaWorkflowRunsFound,
     get_latest_md5_mwf,
+    get_md5_mwfrs_for_files,
+    get_job_ids_modified_since,
+    get_job_ids_with_new_logs,
+    get_latest_watermarks,
+    get_meta_workflow_runs_query,
+    get_running_job_ids,
+    get_spot_failed_shards,
+    get_workflow_run_descriptions,
+    select_changed_meta_workflow_runs,
     paginate_list
 )
 
@@ -22,6 +36,13 @@ class TestWfrUtils:
     def search_metadata_md5_mwf_multiple(self, query, key):
         return self.test_metadata["md5_mwf_multiple"]
 
+    def search_metadata_md5_mwfrs(self, query, key):
+        # Mimic the multi-valued search on input file UUIDs
+        return [
+            mwfr for mwfr in self.test_metadata["md5_mwfrs"]
+            if "input.files.file.uuid=" + mwfr["input"][0]["files"][0]["file"]["uuid"] in query
+        ]
+
 
     @patch('dcicutils.ff_utils.search_metadata')
     def test_get_lastest_md5_mwf(self, mock_search_metadata):
@@ -34,6 +55,155 @@ class TestWfrUtils:
         mwf = get_latest_md5_mwf(None)
         assert mwf['uuid'] == "mwf_2"
 
+    @patch('dcicutils.ff_utils.search_metadata')
+    def test_get_md5_mwfrs_for_files(self, mock_search_metadata):
+        self.load_metadata()
+        mock_search_metadata.side_effect = self.search_metadata_md5_mwfrs
+        mwfrs_by_file = get_md5_mwfrs_for_files(None, ["file_1", "file_2", "file_3"], chunk_size=2)
+        assert mock_search_metadata.call_count == 2
+        query = mock_search_metadata.call_args_list[0][0][0]
+        assert "&input.files.file.uuid=file_1&input.files.file.uuid=file_2" in query
+        assert [mwfr["uuid"] for mwfr in mwfrs_by_file["file_1"]] == ["mwfr_1"]
+        assert [mwfr["uuid"] for mwfr in mwfrs_by_file["file_2"]] == ["mwfr_2", "mwfr_3"]
+        assert mwfrs_by_file["file_3"] == []
+        assert "file_9" not in mwfrs_by_file
+
+    def test_select_changed_meta_workflow_runs(self):
+        self.load_metadata()
+        running_mwfrs = self.test_metadata["running_mwfrs"]
+        assert get_running_job_ids(running_mwfrs) == {"job_2", "job_3", "job_5"}
+        selected = select_changed_meta_workflow_runs(running_mwfrs, {"job_1", "job_3"})
+        # mwfr_3 has no running WorkflowRuns, so its final status needs an update
+        assert [mwfr["uuid"] for mwfr in selected] == ["mwfr_2", "mwfr_3"]
+
+    def test_get_job_ids_with_new_logs(self):
+        since = datetime(2024, 1, 1, 12, 0)
+        old, new = datetime(2024, 1, 1, 11, tzinfo=timezone.utc), datetime(2024, 1, 1, 13, tzinfo=timezone.utc)
+        log_objects = [
+            {"Key": "aaa.log", "LastModified": new},
+            {"Key": "job_1.log", "LastModified": old},
+            {"Key": "job_2.log", "LastModified": old},
+            {"Key": "job_2.postrun.json", "LastModified": new},
+            {"Key": "job_4.log", "LastModified": new},
+            {"Key": "job_9.log", "LastModified": new},
+            {"Key": "kkk.log", "LastModified": new},
+        ]
+
+        class LogBucketClient:
+            def __init__(self):
+                self.calls = []
+
+            def list_objects_v2(self, Bucket, Prefix, StartAfter, ContinuationToken=None):
+                self.calls.append((Prefix, StartAfter, ContinuationToken))
+                keys = [obj for obj in log_objects if obj["Key"].startswith(Prefix) and obj["Key"] > StartAfter]
+                start = int(ContinuationToken or 0)
+                response = {"Contents": keys[start:start + 2], "IsTruncated": start + 2 < len(keys)}
+                if response["IsTruncated"]:
+                    response["NextContinuationToken"] = str(start + 2)
+                return response
+
+        client = LogBucketClient()
+        changed = get_job_ids_with_new_logs(client, "log-bucket", ["job_1", "job_2", "job_3", "job_4"], since)
+        assert changed == {"job_2", "job_4"}
+        # one listing of the shared prefix, stopped past the last job
+        assert client.calls == [("j", "job_1", None), ("j", "job_1", "2"), ("j", "job_1", "4")]
+
+    @patch('dcicutils.ff_utils.search_metadata')
+    def test_get_job_ids_modified_since(self, mock_search_metadata):
+        mock_search_metadata.return_value = [
+            {"job_id": "job_1", "last_modified": {"date_modified": "2024-01-01T11:59:00.000000+00:00"}},
+            {"job_id": "job_2", "last_modified": {"date_modified": "2024-01-01T08:30:00.000000-05:00"}},
+            {"job_id": "job_3"},
+            {"last_modified": {"date_modified": "2024-01-01T13:00:00+00:00"}},
+        ]
+        job_ids = get_job_ids_modified_since(None, datetime(2024, 1, 1, 12, 0))
+        assert job_ids == {"job_2", "job_3"}
+        query = mock_search_metadata.call_args[0][0]
+        assert query == (
+            "/search/?type=WorkflowRun&field=job_id&field=last_modified.date_modified"
+            "&last_modified.date_modified.from=2024-01-01"
+        )
+
+    @patch('dcicutils.ff_utils.search_metadata')
+    def test_get_workflow_run_descriptions(self, mock_search_metadata):
+        mock_search_metadata.return_value = [
+            {"job_id": "job_1", "description": "Spot instance interrupted"},
+            {"job_id": "job_2"},
+        ]
+        descriptions = get_workflow_run_descriptions(None, ["job_1", "job_2", "job_1", "job_3"])
+        assert mock_search_metadata.call_count == 1
+        assert "&job_id=job_1&job_id=job_2&job_id=job_3" in mock_search_metadata.call_args[0][0]
+        assert descriptions == {
+            "job_1": ["Spot instance interrupted"], "job_2": [""], "job_3": []
+        }
+
+    def test_get_spot_failed_shards(self):
+        mwfr = {
+            "workflow_runs": [
+                {"name": "align", "shard": 0, "job_id": "job_1", "status": "failed"},
+                {"name": "align", "shard": 1, "job_id": "job_2", "status": "failed"},
+                {"name": "align", "shard": 2, "job_id": "job_3", "status": "failed"},
+                {"name": "sort", "shard": 0, "job_id": "job_4", "status": "completed"},
+            ]
+        }
+        descriptions = {"job_1": ["spot interrupted"], "job_2": ["other"], "job_3": ["other"]}
+        shards = get_spot_failed_shards(mwfr, descriptions, {"job_3"}, ["spot interrupted"])
+        assert shards == ["align:0", "align:2"]
+        descriptions["job_2"] = []
+        with pytest.raises(Exception, match="No WorkflowRun found for job ID: job_2"):
+            get_spot_failed_shards(mwfr, descriptions, set(), ["spot interrupted"])
+
+    @patch('dcicutils.ff_utils.search_metadata')
+    def test_meta_workflow_runs_found(self, mock_search_metadata):
+        uuid_1 = "5e5e3a8a-1a3b-4a39-9a3f-0a1b2c3d4e5f"
+        uuid_2 = "6f6e3a8a-1a3b-4a39-9a3f-0a1b2c3d4e5f"
+        mock_search_metadata.return_value = iter([
+            {"uuid": uuid_1, "title": "MWFR 1"},
+            {"uuid": uuid_2, "title": "MWFR 2"},
+            {"uuid": uuid_1, "title": "MWFR 1"},
+        ])
+        found = MetaWorkflowRunsFound(SimpleNamespace(ff_keys=None))
+        found.search_final_status(["running", "failed"])
+        query = mock_search_metadata.call_args[0][0]
+        assert query == (
+            "/search/?type=MetaWorkflowRun&final_status=running&final_status=failed"
+            "&field=uuid&field=title"
+        )
+        assert mock_search_metadata.call_args[1]["is_generator"] is True
+        found.add_items([{"uuid": uuid_2, "title": "MWFR 2"}, {"title": "No UUID"}, {"uuid": None}])
+        assert len(found) == 2
+        assert found.uuids == [uuid_1, uuid_2]
+        assert found.titles == ["MWFR 1", "MWFR 2"]
+        assert list(found) == [(uuid_1, "MWFR 1"), (uuid_2, "MWFR 2")]
+        assert uuid_2 in found
+        assert "not-a-uuid" not in found
+
+        mock_search_metadata.return_value = iter([])
+        found.search_query("search/?type=MetaWorkflowRun&field=uuid&final_status=stopped")
+        assert mock_search_metadata.call_args[0][0].endswith("&field=uuid&final_status=stopped&field=title")
+
+    def test_get_latest_watermarks(self):
+        check_output = {"watermark": "2024-01-02T00:00:00.000000", "last_full_sweep": None}
+        action_output = {
+            "watermark": "2024-01-03T00:00:00.000000",
+            "last_full_sweep": "2024-01-01T00:00:00.000000",
+        }
+        traceback = ["Traceback (most recent call last):", "..."]
+        assert get_latest_watermarks(check_output, action_output, traceback) == (
+            "2024-01-03T00:00:00.000000",
+            "2024-01-01T00:00:00.000000",
+        )
+        assert get_latest_watermarks(check_output, None) == ("2024-01-02T00:00:00.000000", None)
+        assert get_latest_watermarks({}, traceback) == (None, None)
+
+    def test_get_meta_workflow_runs_query(self):
+        uuid_1, uuid_2 = "mwf_1", "mwf_2"
+        query = get_meta_workflow_runs_query([uuid_1, uuid_2], ["running", "failed"])
+        assert query == (
+            "/search/?type=MetaWorkflowRun&meta_workflow.uuid=%s&meta_workflow.uuid=%s"
+            "&final_status=running&final_status=failed" % (uuid_1, uuid_2)
+        )
+
     def test_paginate_list(self):
         list = [1, 2, 3, 4, 5, 6, 7, 8, 9]
         p_list = paginate_list(list, 4)
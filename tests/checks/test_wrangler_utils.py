@@ -0,0 +1,160 @@
+from unittest.mock import patch
+
+import pytest
+
+from chalicelib_smaht.checks.helpers import wrangler_utils as wr_utils
+from fakes import FakeResponse, make_connection
+
+# TO RUN THESE TESTS LOCALLY USE: pytest --noconftest
+
+DONOR_1 = "5e5e3a8a-1a3b-4a39-9a3f-0a1b2c3d4e5f"
+DONOR_2 = "6f6e3a8a-1a3b-4a39-9a3f-0a1b2c3d4e5f"
+
+
+class TestWranglerUtils:
+
+    @patch("dcicutils.ff_utils.authorized_request")
+    def test_get_donors_with_protected_donors(self, mock_request):
+        donor_uuids = ["5e5e3a8a-1a3b-4a39-9a3f-0a1b2c3d%04d" % idx for idx in range(20)]
+        protected_uuid = "7a7e3a8a-1a3b-4a39-9a3f-0a1b2c3d4e5f"
+        items = {
+            donor_uuid: {
+                "uuid": donor_uuid, "@id": "/donors/%s/" % donor_uuid, "accession": "SMADO%07d" % idx,
+                "study": "Production", "tags": [], "external_id": "D%s" % idx,
+                "protected_donor": {"uuid": protected_uuid} if idx < 2 else None,
+                "last_modified": {"date_modified": "2024-01-01T00:00:00+00:00"},
+                "description": "not requested",
+            }
+            for idx, donor_uuid in enumerate(donor_uuids)
+        }
+        items[protected_uuid] = {
+            "uuid": protected_uuid, "@id": "/protected-donors/%s/" % protected_uuid,
+            "accession": "SMADO9999999", "external_id": "P1",
+        }
+        requested = []
+
+        def search(url, **kwargs):
+            requested.append(url)
+            assert "/search/" in url  # no per-donor GETs
+            params = wr_utils.ff_utils.get_url_params(url)
+            graph = []
+            for item_uuid in params.get("uuid", []):
+                item = items[item_uuid]
+                projected = {}
+                for field in params["field"]:
+                    name = field.split(".")[0]
+                    if item.get(name) is not None:
+                        projected[name] = item[name]
+                graph.append(projected)
+            return FakeResponse({"@graph": graph})
+
+        mock_request.side_effect = search
+        found, protected_found = wr_utils.get_donors_with_protected_donors(
+            donor_uuids, make_connection()
+        )
+        # one projected search per item type
+        assert len(requested) == 2
+        fields = wr_utils.ff_utils.get_url_params(requested[0])["field"]
+        assert set(wr_utils.DONOR_FIELDS) <= set(fields)
+        assert [donor["uuid"] for donor in found] == donor_uuids
+        assert found[0]["@id"] == "/donors/%s/" % donor_uuids[0]
+        assert "description" not in found[0]
+        assert protected_found[protected_uuid]["@id"] == "/protected-donors/%s/" % protected_uuid
+
+    def test_include_exclude_items_with_properties(self):
+        donors = [
+            {"uuid": "donor_1", "study": "Production"},
+            {"uuid": "donor_2", "study": "Production", "tags": ["has_released_files"]},
+            {"uuid": "donor_3", "study": "Benchmarking"},
+        ]
+        untagged = wr_utils.exclude_items_with_properties(donors, {"tags": "has_released_files"})
+        assert wr_utils.include_items_with_properties(untagged, {"study": "Production"}) == [donors[0]]
+
+    @patch.object(wr_utils.PortalClient, "iter_search")
+    @patch("dcicutils.ff_utils.authorized_request")
+    def test_get_linked_uuids_from_facet(self, mock_request, mock_search):
+        mock_request.return_value = FakeResponse({
+            "@graph": [],
+            "facets": [{
+                "field": "donors.uuid",
+                "terms": [
+                    {"key": DONOR_1, "doc_count": 1200},
+                    {"key": DONOR_2, "doc_count": 3},
+                    {"key": "No value", "doc_count": 7},
+                ],
+            }],
+        })
+        donor_uuids = wr_utils.get_linked_uuids(
+            "search/?type=File&status=released", "donors", make_connection()
+        )
+        assert donor_uuids == [DONOR_1, DONOR_2]
+        assert "&limit=0&additional_facet=donors.uuid" in mock_request.call_args[0][0]
+        mock_search.assert_not_called()
+
+    @patch.object(wr_utils.PortalClient, "iter_search")
+    @patch("dcicutils.ff_utils.authorized_request")
+    @pytest.mark.parametrize("truncated_facet", [
+        {"field": "donors.uuid", "terms": [{"key": DONOR_1, "doc_count": 1}], "other_doc_count": 10},
+        {"field": "donors.uuid", "terms": [{"key": DONOR_1, "doc_count": 1}] * wr_utils.FACET_TERMS_LIMIT},
+    ])
+    def test_get_linked_uuids_fallback(self, mock_request, mock_search, truncated_facet):
+        mock_request.return_value = FakeResponse({"@graph": [], "facets": [truncated_facet]})
+        mock_search.return_value = iter([
+            {"donors": [{"uuid": DONOR_2}]},
+            {"donors": [{"uuid": DONOR_1}, {"uuid": DONOR_2}]},
+            {},
+        ])
+        donor_uuids = wr_utils.get_linked_uuids(
+            "search/?type=File&status=released", "donors", make_connection()
+        )
+        assert donor_uuids == [DONOR_2, DONOR_1]
+        assert mock_search.call_args[0][0].endswith("&field=donors.uuid")
+
+    @patch("dcicutils.ff_utils.authorized_request")
+    def test_get_modified_item_uuids(self, mock_request):
+        donor_uuids = ["5e5e3a8a-1a3b-4a39-9a3f-0a1b2c3d%04d" % idx for idx in range(5)]
+        dates_modified = {
+            donor_uuids[0]: "2024-01-01T00:00:00",
+            donor_uuids[1]: "2024-02-01T00:00:00",
+            donor_uuids[2]: "2024-01-01T00:00:00",
+        }
+        requested = []
+
+        def search(url, **kwargs):
+            requested.append(url)
+            assert "/search/" in url  # no per-item GETs
+            return FakeResponse({"@graph": [
+                {"uuid": item_uuid, "last_modified": {"date_modified": "2024-01-01T00:00:00"}}
+                for item_uuid in wr_utils.ff_utils.get_url_params(url)["uuid"]
+                if item_uuid != donor_uuids[2]  # no longer found
+            ]})
+
+        mock_request.side_effect = search
+        modified = wr_utils.get_modified_item_uuids(donor_uuids, dates_modified, make_connection())
+        # changed, not found, and without a recorded timestamp
+        assert modified == donor_uuids[1:]
+        assert len(requested) == 1
+        params = wr_utils.ff_utils.get_url_params(requested[0])
+        assert params["field"] == ["uuid", "last_modified.date_modified"]
+        assert params["uuid"] == donor_uuids[:3]
+
+    @patch("chalicelib_smaht.checks.helpers.wrangler_utils.validate_items_existence")
+    def test_get_publications(self, mock_validate):
+        by_doi = [
+            {"uuid": "pub_1", "accession": "SMAPB1111111", "doi": "10.1101/2023.01.01.1"},
+            {"uuid": "pub_2", "accession": "SMAPB2222222", "doi": "10.1038/ABC"},
+        ]
+        mock_validate.return_value = ([{"uuid": "pub_3", "accession": "SMAPB3333333"}], [])
+        with patch.object(wr_utils.PortalClient, "search_metadata", return_value=by_doi) as mock_search:
+            pubs_by_doi, pubs_by_accession = wr_utils.get_publications(
+                ["10.1101/2023.01.01.1", "10.1038/abc", "10.1101/2023.01.01.1"],
+                ["SMAPB2222222", "SMAPB3333333"],
+                make_connection(),
+            )
+        query = mock_search.call_args[0][0]
+        assert query.count("&doi=") == 2 and "&doi=10.1101%2F2023.01.01.1" in query
+        assert "&field=authors" in query
+        # only accessions not found by DOI are searched
+        assert mock_validate.call_args[0][0] == ["SMAPB3333333"]
+        assert pubs_by_doi == {"10.1101/2023.01.01.1": [by_doi[0]], "10.1038/abc": [by_doi[1]]}
+        assert set(pubs_by_accession) == {"SMAPB1111111", "SMAPB2222222", "SMAPB3333333"}